@@ -2,8 +2,12 @@ import csv
 import json
 import openai
 import os
+import asyncio
 from dotenv import load_dotenv 
 from manual_clean import clean_csv
+from llm_client import chat_completion, achat_completion, get_llm_cache
+from pipeline import run_ordered
+from batch_api import run_batch_job
 
 # Load environment variables
 load_dotenv()
@@ -11,6 +15,11 @@ openai.api_key = os.getenv("OPENAI_API_KEY")
 
 INPUT_CSV = "filtered_exports"
 OUTPUT_CSV = "cleaned_category"
+CLEANING_CONCURRENCY = int(os.getenv("CLEANING_CONCURRENCY", "8"))  # rows sent to the LLM at once
+# 1 = submit all rows through the OpenAI Batch API instead of live calls
+BATCH_API_MODE = os.getenv("BATCH_API_MODE", "0") == "1"
+CLEANING_MODEL = "gpt-3.5-turbo"
+FIELDNAMES = ["Source URL", "Insight", "Summary", "Year", "Brand", "Metric", "Metric Category", "Value","Unit","Country"]
 
 def build_prompt(source_url, insight, year):
     print(f"[INFO] Building prompt for Source URL: {source_url}, Insight: {insight[:50]}, Year: {year}")
@@ -43,11 +52,8 @@ def extract_structured_data(source_url, insight_text, year):
     try:
         print(f"[INFO] Extracting structured data for Insight: {insight_text[:50]}")
         prompt = build_prompt(source_url, insight_text, year)
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}]
-        )
-        reply = response['choices'][0]['message']['content'].strip()
+        # Rows that were already structured in an earlier run come from the LLM cache
+        reply = chat_completion(prompt, model=CLEANING_MODEL, validate=json.loads)
         return json.loads(reply)
     except openai.error.OpenAIError as e:
         print(f"[ERROR] OpenAI API Error for insight: {insight_text[:50]}... | Error: {e}")
@@ -55,7 +61,58 @@ def extract_structured_data(source_url, insight_text, year):
         print(f"[ERROR] Unexpected error for insight: {insight_text[:50]}... | Error: {e}")
     return None
 
-def process_csv():
+async def extract_structured_data_async(source_url, insight_text, year):
+    try:
+        prompt = build_prompt(source_url, insight_text, year)
+        reply = await achat_completion(prompt, model=CLEANING_MODEL, validate=json.loads)
+        return json.loads(reply)
+    except openai.error.OpenAIError as e:
+        print(f"[ERROR] OpenAI API Error for insight: {insight_text[:50]}... | Error: {e}")
+    except Exception as e:
+        print(f"[ERROR] Unexpected error for insight: {insight_text[:50]}... | Error: {e}")
+    return None
+
+def to_output_row(structured):
+    return {
+        "Source URL": structured.get("Source URL", ""),
+        "Insight": structured.get("Insight", ""),
+        "Summary": structured.get("Summary", ""),
+        "Year": structured.get("Year", ""),
+        "Brand": structured.get("Brand", ""),
+        "Metric": structured.get("Metric", ""),
+        "Metric Category": structured.get("Metric Category", ""),
+        "Value": structured.get("Value", ""),
+        "Unit": structured.get("Unit", ""),
+        "Country": structured.get("Country", "")
+    }
+
+async def process_file_async(input_file_path, output_file_path, concurrency=CLEANING_CONCURRENCY):
+    """
+    Structures every row of one category CSV with up to `concurrency` LLM
+    calls in flight. Rows are written in input order; a row that fails is
+    logged and skipped without affecting the others.
+    """
+    filename = os.path.basename(input_file_path)
+    with open(input_file_path, mode='r', encoding='utf-8') as infile:
+        rows = list(csv.DictReader(infile))
+
+    with open(output_file_path, mode='w', newline='', encoding='utf-8') as outfile:
+        writer = csv.DictWriter(outfile, fieldnames=FIELDNAMES)
+        writer.writeheader()
+
+        async def structure(row):
+            return await extract_structured_data_async(row.get("Source URL", ""), row["Insight"], row["Year"])
+
+        def write_row(index, row, structured):
+            if structured:
+                writer.writerow(to_output_row(structured))
+                print(f"[INFO] Successfully processed row {index + 1}/{len(rows)} in {filename}.")
+            else:
+                print(f"[WARNING] Failed to process row {index + 1}/{len(rows)} in {filename}.")
+
+        await run_ordered(rows, structure, write_row, concurrency=concurrency)
+
+async def process_csv_async(concurrency=CLEANING_CONCURRENCY):
     print("[INFO] Starting CSV processing...")
 
     # ## Updated to process all CSV files in a folder and save each separately ##
@@ -65,45 +122,56 @@ def process_csv():
             output_file_path = os.path.join(OUTPUT_CSV, filename)  # Save with same name
 
             print(f"[INFO] Processing file: {filename}")
+            await process_file_async(input_file_path, output_file_path, concurrency)
 
-            with open(input_file_path, mode='r', encoding='utf-8') as infile, \
-                 open(output_file_path, mode='w', newline='', encoding='utf-8') as outfile:
-
-                reader = csv.DictReader(infile)
-                fieldnames = ["Source URL", "Insight", "Summary", "Year", "Brand", "Metric", "Metric Category", "Value","Unit","Country"]
-                writer = csv.DictWriter(outfile, fieldnames=fieldnames)
-                writer.writeheader()
-
-                row_count = 0
-                for row in reader:
-                    row_count += 1
-                    print(f"[INFO] Processing row {row_count} in {filename}...")
-
-                    source_url = row.get("Source URL", "")
-                    structured = extract_structured_data(source_url, row["Insight"], row["Year"])
-
-                    if structured:
-                        writer.writerow({
-                            "Source URL": structured.get("Source URL", ""),
-                            "Insight": structured.get("Insight", ""),
-                            "Summary": structured.get("Summary", ""),
-                            "Year": structured.get("Year", ""),
-                            "Brand": structured.get("Brand", ""),
-                            "Metric": structured.get("Metric", ""),
-                            "Metric Category": structured.get("Metric Category", ""),
-                            "Value": structured.get("Value", ""),
-                            "Unit": structured.get("Unit", ""),
-                            "Country": structured.get("Country", "")
-                        })
-                        print(f"[INFO] Successfully processed row {row_count} in {filename}.")
-                    else:
-                        print(f"[WARNING] Failed to process row {row_count} in {filename}.")
+    get_llm_cache().report()
+    print("[INFO] CSV processing completed.")
+
+def process_csv(concurrency=CLEANING_CONCURRENCY):
+    asyncio.run(process_csv_async(concurrency))
+
+def process_csv_batch(job_name="batch_category_cleaning"):
+    """
+    Offline mode: sends the rows of every category CSV as one OpenAI Batch
+    API job, waits for it and writes each output file in the original row
+    order. Re-running with the same `job_name` resumes a submitted job.
+    """
+    print("[INFO] Starting CSV processing (Batch API)...")
+    files = {}
+    jobs = []
+    for filename in os.listdir(INPUT_CSV):
+        if filename.endswith(".csv"):
+            with open(os.path.join(INPUT_CSV, filename), mode='r', encoding='utf-8') as infile:
+                files[filename] = list(csv.DictReader(infile))
+            for row_number, row in enumerate(files[filename], start=1):
+                prompt = build_prompt(row.get("Source URL", ""), row["Insight"], row["Year"])
+                jobs.append((f"{filename}::{row_number}", prompt))
+
+    replies = run_batch_job(jobs, CLEANING_MODEL, job_name, validate=json.loads)
+
+    for filename, rows in files.items():
+        with open(os.path.join(OUTPUT_CSV, filename), mode='w', newline='', encoding='utf-8') as outfile:
+            writer = csv.DictWriter(outfile, fieldnames=FIELDNAMES)
+            writer.writeheader()
+            written = 0
+            for row_number in range(1, len(rows) + 1):
+                try:
+                    structured = json.loads(replies[f"{filename}::{row_number}"])
+                except (KeyError, ValueError) as e:
+                    print(f"[WARNING] Failed to process row {row_number} in {filename}: {e}")
+                    continue
+                writer.writerow(to_output_row(structured))
+                written += 1
+        print(f"[INFO] {filename}: {written}/{len(rows)} rows structured.")
 
     print("[INFO] CSV processing completed.")
 
 
 if __name__ == "__main__":
-    process_csv()
+    if BATCH_API_MODE:
+        process_csv_batch()
+    else:
+        process_csv()
 
     # ## Clean each output CSV file individually ##
     for filename in os.listdir(OUTPUT_CSV):
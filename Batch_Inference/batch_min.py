@@ -3,9 +3,17 @@ import openai
 import json
 import csv
 import os
-from bs4 import BeautifulSoup
+import hashlib
+from text_cleaning import clean_text
 from dotenv import load_dotenv
 from crawl4ai import AsyncWebCrawler 
+from pipeline import DomainThrottle, get_domain, run_pipeline
+from page_cache import PageCache
+from llm_client import achat_completion, count_tokens, get_llm_cache
+from chunking import chunk_budget, chunk_text
+from relevance import RelevanceFilter
+from batch_api import run_batch_job
+from output_writer import InsightWriter
 
 # Load environment variables
 load_dotenv()
@@ -15,6 +23,9 @@ openai.api_key = os.getenv("OPENAI_API_KEY")
 CSV_FILE = "insights_output.csv"
 TXT_FILE = "insights_output.txt"
 CHECKPOINT_FILE = "checkpoint.json"
+# 1 = submit all chunks through the OpenAI Batch API instead of live calls
+BATCH_API_MODE = os.getenv("BATCH_API_MODE", "0") == "1"
+MODEL = "gpt-4"
 
 with open(CSV_FILE, "w", newline='', encoding='utf-8') as csvfile:
     writer = csv.writer(csvfile)
@@ -34,16 +45,15 @@ def load_links_from_json(filepath="Germany_links_0_100.json"):
 
 # Pre-clean HTML content
 def pre_clean_html(raw_html):
-    soup = BeautifulSoup(raw_html, "html.parser")
-    for tag in soup(["nav", "footer", "aside", "script", "style"]):
-        tag.decompose()
-    text = soup.get_text(separator="\n")
-    return "\n".join(line.strip() for line in text.splitlines() if line.strip())
+    # Markdown takes a line-based fast path; HTML is parsed with lxml (process pool for big pages)
+    return clean_text(raw_html)
 
 
-# Split long content into chunks
-def split_text(text, chunk_size=5000):
-    return [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+# Split long content into token-sized chunks that keep sentences, headings and tables whole
+def split_text(text, max_tokens=None):
+    if max_tokens is None:
+        max_tokens = chunk_budget(MODEL, count_tokens(build_prompt(""), MODEL))
+    return chunk_text(text, max_tokens, model=MODEL)
 
 
 # Prompt for extracting insights
@@ -86,77 +96,33 @@ Now analyze and extract from the following content:
 """
 
 
-# Save extracted insights to CSV and TXT
-async def save_insights(insights_json: str, url: str):
-    # Save raw to TXT
-    with open(TXT_FILE, "a", encoding='utf-8') as f:
-        f.write(f"\n[Source] {url}\n{insights_json}\n{'-'*80}\n")
+# Queue extracted insights for the CSV and TXT; on_flushed runs once they are on disk
+def save_insights(writer, insights_json: str, url: str, on_flushed=None):
+    # Raw reply for the TXT
+    text = f"\n[Source] {url}\n{insights_json}\n{'-'*80}\n"
 
-    # Parse and save to CSV
+    # Parse into CSV rows
+    rows = []
     try:
         data = json.loads(insights_json)
-        with open(CSV_FILE, "a", newline='', encoding='utf-8') as csvfile:
-            writer = csv.writer(csvfile)
-            for category, insights in data.items():
-                for item in insights:
-                    if isinstance(item, dict):
-                        insight_text = item.get("insight", "")
-                        year = item.get("year", "")
-                    else:
-                        insight_text = item
-                        year = ""
-                    writer.writerow([url, category, insight_text, year])
+        for category, insights in data.items():
+            for item in insights:
+                if isinstance(item, dict):
+                    insight_text = item.get("insight", "")
+                    year = item.get("year", "")
+                else:
+                    insight_text = item
+                    year = ""
+                rows.append([url, category, insight_text, year])
     except Exception as e:
         print(f"[WARN] Could not parse insights JSON from {url}: {e}")
+    writer.write(rows, text, on_flushed)
 
 
-# === RETRY LOGIC ===
-import random
-import time
-
-def retry_with_backoff(max_retries=5, base_delay=1, max_delay=60):
-    def decorator(func):
-        async def wrapper(*args, **kwargs):
-            retries = 0
-            delay = base_delay
-            while retries < max_retries:
-                try:
-                    return await func(*args, **kwargs)
-                except Exception as e:
-                    if "limit" in str(e).lower() or "timeout" in str(e).lower() or "server error" in str(e).lower():
-                        print(f"[RETRY] {e}. Retrying in {delay}s (attempt {retries + 1}/{max_retries})...")
-                        await asyncio.sleep(delay)
-                        retries += 1
-                        delay = min(delay * 2 + random.uniform(0, 1), max_delay)
-                    else:
-                        print(f"[FATAL] {e}")
-                        break
-            return None  # Return None if all retries fail
-        return wrapper
-    return decorator
-
-
-@retry_with_backoff(max_retries=5, base_delay=1, max_delay=60)
-async def extract_insights_from_chunk(url, chunk_index, text_chunk):
+# Rate limits and retries are handled by the shared limiter in llm_client
+async def extract_insights_from_chunk(text_chunk):
     prompt = build_prompt(text_chunk)
-    try:
-        response = await openai.ChatCompletion.acreate(
-            model="gpt-4",
-            messages=[{"role": "user", "content": prompt}],
-            timeout=30
-        )
-        return {
-            "url": url,
-            "chunk_index": chunk_index,
-            "insights": response['choices'][0]['message']['content'].strip()
-        }
-    except Exception as e:
-        print(f"[ERROR] Failed chunk: {url}, chunk {chunk_index} - {e}")
-        return {
-            "url": url,
-            "chunk_index": chunk_index,
-            "insights": ""
-        }
+    return await achat_completion(prompt, model=MODEL, validate=json.loads, timeout=30)
 
 
 # Load checkpoint
@@ -173,62 +139,121 @@ def save_checkpoint(processed_chunks, filepath=CHECKPOINT_FILE):
         json.dump(list(processed_chunks), f, indent=2)
 
 
+# Crawl, clean and chunk every link and hand the chunks to extract_fn / write_fn
+async def run_crawl_pipeline(links, extract_fn, write_fn, skip_chunk, workers):
+    throttle = DomainThrottle()
+    # Chunks without KPI signals (menus, cookie banners, history) never reach the model
+    relevance = RelevanceFilter(model=MODEL, prompt_overhead=count_tokens(build_prompt(""), MODEL))
+    # Resumes read pages from the cache instead of crawling them again
+    cache = PageCache()
+
+    # Crawling, cleaning and LLM calls run as separate stages, so chunks are
+    # processed while later pages are still downloading
+    async with AsyncWebCrawler() as crawler:
+        async def fetch(url):
+            domain = get_domain(url)
+            await throttle.acquire(domain)
+            try:
+                result = await crawler.arun(url=url)
+            finally:
+                throttle.release(domain)
+            return result.markdown, getattr(result, "response_headers", None)
+
+        async def crawl(url):
+            return await cache.fetch(url, fetch)
+
+        await run_pipeline(
+            links,
+            crawl_fn=crawl,
+            clean_fn=pre_clean_html,
+            chunk_fn=split_text,
+            extract_fn=extract_fn,
+            write_fn=write_fn,
+            workers=workers,
+            skip_chunk=skip_chunk,
+            chunk_filter=relevance.keep,
+        )
+    cache.close()
+    relevance.report()
+
+
 # Main logic
 async def main():
     links = load_links_from_json()
-    all_chunks_with_url = []
 
-    BATCH_SIZE = 5  # Adjust based on your OpenAI rate limits
+    BATCH_SIZE = 5  # LLM calls in flight at once, adjust based on your OpenAI rate limits
 
-    # Step 1: Collect all chunks across URLs
-    async with AsyncWebCrawler() as crawler:
-        for idx, (country, url) in enumerate(links):
-            try:
-                print(f"[INFO] ({idx+1}/{len(links)}) Crawling: {url}")
-                result = await crawler.arun(url=url)
-                raw_text = result.markdown
-                clean_text = pre_clean_html(raw_text)
-                limited_text = clean_text[:15000]
-                chunks = split_text(limited_text, chunk_size=5000)
+    # Chunks that already made it into the CSV are skipped on resume
+    processed_chunks = load_checkpoint()
+    print(f"\n[RESUME] Found {len(processed_chunks)} already processed chunks.\n")
+
+    def skip_chunk(url, chunk_index):
+        return f"{url}||{chunk_index}" in processed_chunks
+
+    # Chunks enter the checkpoint only once their rows are flushed to the CSV
+    def checkpoint(keys):
+        processed_chunks.update(keys)
+        save_checkpoint(processed_chunks)
+
+    writer = InsightWriter(CSV_FILE, TXT_FILE)
+
+    async def write_page(url, results):
+        keys = []
+        for chunk_index, insights in results:
+            if insights:
+                save_insights(writer, insights, url)
+                keys.append(f"{url}||{chunk_index}")
+        writer.after_flush(lambda: checkpoint(keys))
 
-                for i, chunk in enumerate(chunks):
-                    all_chunks_with_url.append((url, i, chunk))
+    await run_crawl_pipeline(links, extract_insights_from_chunk, write_page, skip_chunk, {"extract": BATCH_SIZE})
+    writer.close()
+    get_llm_cache().report()
+
+    print("\n✅ All processing complete!")
 
-            except Exception as e:
-                print(f"[ERROR] Failed crawling {url}: {e}")
 
-    # Step 2: Load already processed chunks
+# Offline mode: one Batch API job for every chunk, merged back by custom ID
+async def main_batch():
+    links = load_links_from_json()
     processed_chunks = load_checkpoint()
+    print(f"\n[RESUME] Found {len(processed_chunks)} already processed chunks.\n")
 
-    # Step 3: Filter out already processed
-    filtered_chunks = [
-        (url, idx, chunk) 
-        for url, idx, chunk in all_chunks_with_url 
-        if f"{url}||{idx}" not in processed_chunks
-    ]
-    print(f"\n[RESUME] Found {len(all_chunks_with_url) - len(filtered_chunks)} / {len(all_chunks_with_url)} already processed.\n")
+    def skip_chunk(url, chunk_index):
+        return f"{url}||{chunk_index}" in processed_chunks
 
-    # Step 4: Process in batches
-    for i in range(0, len(filtered_chunks), BATCH_SIZE):
-        batch = filtered_chunks[i:i+BATCH_SIZE]
-        print(f"\n[INFO] Processing batch {i//BATCH_SIZE + 1} of {len(filtered_chunks)//BATCH_SIZE + 1}...\n")
+    # Instead of calling the LLM, the extract stage just passes the chunk on
+    def keep_chunk(text_chunk):
+        return text_chunk
 
-        tasks = [
-            extract_insights_from_chunk(url, idx, chunk)
-            for url, idx, chunk in batch
-        ]
+    jobs = []
+    chunk_ids = {}
 
-        results = await asyncio.gather(*tasks)
+    def queue_page(url, results):
+        for chunk_index, text_chunk in results:
+            custom_id = "chunk-" + hashlib.sha1(f"{url}||{chunk_index}".encode("utf-8")).hexdigest()
+            chunk_ids[custom_id] = (url, chunk_index)
+            jobs.append((custom_id, build_prompt(text_chunk)))
 
-        for result in results:
-            if result and result["insights"]:
-                await save_insights(result["insights"], result["url"])
-                processed_chunks.add(f"{result['url']}||{result['chunk_index']}")
+    await run_crawl_pipeline(links, keep_chunk, queue_page, skip_chunk, {"extract": 1})
+    print(f"[BATCH] Collected {len(jobs)} chunks from {len(links)} links.")
 
-        save_checkpoint(processed_chunks)
+    # Polling blocks for hours, keep it off the event loop
+    replies = await asyncio.to_thread(run_batch_job, jobs, MODEL, "batch_min", json.loads)
 
-    print("\n✅ All processing complete!")
+    writer = InsightWriter(CSV_FILE, TXT_FILE)
+    for custom_id, insights in replies.items():
+        url, chunk_index = chunk_ids[custom_id]
+        if insights:
+            save_insights(writer, insights, url)
+            processed_chunks.add(f"{url}||{chunk_index}")
+    writer.close()
+    save_checkpoint(processed_chunks)
+
+    print(f"\n✅ Batch processing complete! {len(replies)}/{len(jobs)} chunks merged.")
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    if BATCH_API_MODE:
+        asyncio.run(main_batch())
+    else:
+        asyncio.run(main())
@@ -0,0 +1,225 @@
+import os
+import json
+import time
+import requests
+from dotenv import load_dotenv
+from llm_client import get_llm_cache
+
+# Load environment variables
+load_dotenv()
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# Point this at a local stub server to try the batch flow without the real API
+OPENAI_API_BASE = os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1").rstrip("/")
+
+BATCH_JOBS_DIR = "batch_jobs"
+BATCH_POLL_SECONDS = int(os.getenv("BATCH_POLL_SECONDS", "60"))
+MAX_REQUESTS_PER_BATCH = 50000   # OpenAI limit per input file
+
+FINISHED_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+def _headers():
+    return {"Authorization": f"Bearer {OPENAI_API_KEY}"}
+
+
+def build_request(custom_id, prompt, model, **body):
+    """One line of a batch input file: a chat completion request tagged with `custom_id`."""
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": "/v1/chat/completions",
+        "body": {"model": model, "messages": [{"role": "user", "content": prompt}], **body},
+    }
+
+
+def write_requests_jsonl(batch_requests, path):
+    with open(path, "w", encoding="utf-8") as f:
+        for request in batch_requests:
+            f.write(json.dumps(request, ensure_ascii=False) + "\n")
+
+
+def upload_file(path):
+    with open(path, "rb") as f:
+        response = requests.post(
+            f"{OPENAI_API_BASE}/files",
+            headers=_headers(),
+            data={"purpose": "batch"},
+            files={"file": (os.path.basename(path), f, "application/jsonl")},
+        )
+    response.raise_for_status()
+    return response.json()["id"]
+
+
+def create_batch(input_file_id, metadata=None):
+    response = requests.post(
+        f"{OPENAI_API_BASE}/batches",
+        headers=_headers(),
+        json={
+            "input_file_id": input_file_id,
+            "endpoint": "/v1/chat/completions",
+            "completion_window": "24h",
+            "metadata": metadata or {},
+        },
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+def get_batch(batch_id):
+    response = requests.get(f"{OPENAI_API_BASE}/batches/{batch_id}", headers=_headers())
+    response.raise_for_status()
+    return response.json()
+
+
+def download_file(file_id):
+    response = requests.get(f"{OPENAI_API_BASE}/files/{file_id}/content", headers=_headers())
+    response.raise_for_status()
+    return response.text
+
+
+def _is_valid(validate, reply):
+    if validate is None:
+        return True
+    try:
+        validate(reply)
+        return True
+    except Exception:
+        return False
+
+
+def _state_path(job_name):
+    return os.path.join(BATCH_JOBS_DIR, f"{job_name}.json")
+
+
+def _load_state(job_name):
+    path = _state_path(job_name)
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return None
+
+
+def _save_state(job_name, state):
+    path = _state_path(job_name)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def submit_batches(batch_requests, job_name):
+    """
+    Writes the requests to JSONL files under batch_jobs/, uploads them and
+    creates one batch per file. Each created batch is saved with the
+    custom IDs it holds in batch_jobs/<job_name>.json, so an interrupted run
+    resumes polling the submitted parts and only submits the requests that
+    are in none of them, instead of paying for the same work twice.
+    """
+    os.makedirs(BATCH_JOBS_DIR, exist_ok=True)
+    state = _load_state(job_name) or {"job_name": job_name, "created_at": time.time(), "batch_ids": [], "parts": []}
+    if "parts" not in state:
+        # Written before submitted custom IDs were recorded: only complete submissions were saved
+        print(f"[BATCH] Resuming job '{job_name}' with {len(state['batch_ids'])} submitted batches.")
+        return state
+    submitted = {custom_id for part in state["parts"] for custom_id in part["custom_ids"]}
+    missing = [request for request in batch_requests if request["custom_id"] not in submitted]
+    if state["batch_ids"]:
+        print(f"[BATCH] Resuming job '{job_name}' with {len(state['batch_ids'])} submitted batches, "
+              f"{len(missing)} requests still to submit.")
+
+    for start in range(0, len(missing), MAX_REQUESTS_PER_BATCH):
+        part = len(state["parts"])
+        part_requests = missing[start:start + MAX_REQUESTS_PER_BATCH]
+        path = os.path.join(BATCH_JOBS_DIR, f"{job_name}_part{part}.jsonl")
+        write_requests_jsonl(part_requests, path)
+        file_id = upload_file(path)
+        batch = create_batch(file_id, metadata={"job": job_name, "part": str(part)})
+        state["batch_ids"].append(batch["id"])
+        state["parts"].append({"batch_id": batch["id"],
+                               "custom_ids": [request["custom_id"] for request in part_requests]})
+        print(f"[BATCH] Submitted {len(part_requests)} requests as batch {batch['id']}.")
+        _save_state(job_name, state)
+    return state
+
+
+def wait_for_batches(batch_ids, poll_seconds=BATCH_POLL_SECONDS):
+    """Polls until every batch reached a final status and returns their latest descriptions."""
+    batches = {}
+    while True:
+        for batch_id in batch_ids:
+            if batch_id in batches and batches[batch_id]["status"] in FINISHED_STATUSES:
+                continue
+            batches[batch_id] = get_batch(batch_id)
+            counts = batches[batch_id].get("request_counts") or {}
+            print(f"[BATCH] {batch_id}: {batches[batch_id]['status']} "
+                  f"({counts.get('completed', 0)}/{counts.get('total', 0)} done, {counts.get('failed', 0)} failed)")
+        if all(batch["status"] in FINISHED_STATUSES for batch in batches.values()):
+            return list(batches.values())
+        time.sleep(poll_seconds)
+
+
+def collect_results(batches):
+    """
+    Downloads the output files of finished batches and returns
+    {custom_id: reply text}. Failed requests are reported and left out;
+    expired batches still contribute the requests that did complete.
+    """
+    results = {}
+    for batch in batches:
+        if batch.get("output_file_id"):
+            for line in download_file(batch["output_file_id"]).splitlines():
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                response = item.get("response") or {}
+                if response.get("status_code") == 200:
+                    body = response["body"]
+                    results[item["custom_id"]] = body["choices"][0]["message"]["content"].strip()
+                else:
+                    print(f"[BATCH] Request {item['custom_id']} failed: {item.get('error') or response}")
+        if batch.get("error_file_id"):
+            errors = [line for line in download_file(batch["error_file_id"]).splitlines() if line.strip()]
+            print(f"[BATCH] {batch['id']} reported {len(errors)} failed requests.")
+        if batch["status"] != "completed":
+            print(f"[BATCH] {batch['id']} ended as '{batch['status']}'.")
+    return results
+
+
+def run_batch_job(jobs, model, job_name, validate=None, poll_seconds=BATCH_POLL_SECONDS, **body):
+    """
+    Runs prompts through the Batch API and returns {custom_id: reply text}.
+
+    Args:
+        jobs (list): (custom_id, prompt) pairs.
+        model (str): OpenAI model name.
+        job_name (str): Name of the job state file, reuse it to resume.
+        validate (callable): Optional check (e.g. json.loads); replies that fail it are not cached.
+        poll_seconds (int): Seconds between status checks.
+        **body: Extra request body fields (e.g. temperature).
+
+    Prompts already answered in the LLM cache are not submitted, and every
+    reply that comes back is stored in the cache for later live runs.
+    """
+    cache = get_llm_cache()
+    results = {}
+    pending = []
+    prompts = {}
+    for custom_id, prompt in jobs:
+        cached = cache.get(model, prompt)
+        if cached is not None:
+            results[custom_id] = cached
+        else:
+            pending.append(build_request(custom_id, prompt, model, **body))
+            prompts[custom_id] = prompt
+    print(f"[BATCH] {len(results)} prompts answered from the LLM cache, {len(pending)} to submit.")
+
+    if pending:
+        state = submit_batches(pending, job_name)
+        batches = wait_for_batches(state["batch_ids"], poll_seconds)
+        for custom_id, reply in collect_results(batches).items():
+            results[custom_id] = reply
+            if custom_id in prompts and _is_valid(validate, reply):
+                cache.put(model, prompts[custom_id], reply)
+        # The job is done, a later run with the same name starts a fresh submission
+        os.replace(_state_path(job_name), _state_path(job_name) + ".done")
+    cache.report()
+    return results
@@ -0,0 +1,94 @@
+import os
+import sys
+import json
+import time
+import random
+from bs4 import BeautifulSoup
+from page_cache import PageCache
+from text_cleaning import clean_text, looks_like_html, lxml
+
+# Stored link sets whose cached pages are benchmarked
+LINK_FILES = ["Germany_links_0_100.json", "i4.json", "links/india.json", "links/India_links_150_250.json"]
+
+
+def legacy_pre_clean_html(raw_html):
+    """pre_clean_html as it was before text_cleaning.py, kept as the baseline."""
+    soup = BeautifulSoup(raw_html, "html.parser")
+    for tag in soup(["nav", "footer", "aside", "script", "style"]):
+        tag.decompose()
+    text = soup.get_text(separator="\n")
+    return "\n".join(line.strip() for line in text.splitlines() if line.strip())
+
+
+def load_cached_pages(link_files, limit=None):
+    """Markdown of every page from the link files that is in the page cache."""
+    cache = PageCache()
+    pages = []
+    for path in link_files:
+        if not os.path.exists(path):
+            continue
+        with open(path, "r") as f:
+            data = json.load(f)
+        for urls in data.values():
+            for url in urls:
+                entry = cache.get(url)
+                if entry is not None:
+                    pages.append(entry["markdown"])
+                if limit and len(pages) >= limit:
+                    return pages
+    return pages
+
+
+def synthetic_pages(count=20, seed=7):
+    """Annual-report-like markdown and HTML pages for when the page cache is empty."""
+    rng = random.Random(seed)
+    words = ["revenue", "grew", "margin", "FY23", "crore", "volume", "rural", "demand", "brand", "share"]
+    pages = []
+    for i in range(count):
+        lines = []
+        for _ in range(rng.randint(2000, 6000)):
+            sentence = " ".join(rng.choice(words) for _ in range(12))
+            lines.append(f"  {sentence} {rng.randint(1, 99)}% &amp; ₹{rng.randint(10, 9999)} cr  ")
+            if rng.random() < 0.05:
+                lines.append(f"## Section {rng.randint(1, 50)}")
+            if rng.random() < 0.1:
+                lines.append("")
+        if i % 4 == 0:
+            body = "".join(f"<p>{line}</p>\n" for line in lines)
+            pages.append(f"<html><body><nav><a href='/'>Home</a></nav>{body}"
+                         f"<script>var x = 1;</script><footer>© 2024</footer></body></html>")
+        else:
+            pages.append("\n".join(lines))
+    return pages
+
+
+def bench(fn, pages):
+    start = time.perf_counter()
+    outputs = [fn(page) for page in pages]
+    return time.perf_counter() - start, outputs
+
+
+if __name__ == "__main__":
+    # python bench_cleaning.py [max pages]
+    limit = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    pages = load_cached_pages(LINK_FILES, limit)
+    source = "page cache"
+    if not pages:
+        pages = synthetic_pages()
+        source = "synthetic pages (page cache is empty)"
+    size_mb = sum(len(page) for page in pages) / (1024 * 1024)
+    print(f"Benchmarking {len(pages)} {source}, {size_mb:.1f} MB, lxml {'on' if lxml else 'off'}")
+
+    groups = {
+        "markdown": [page for page in pages if not looks_like_html(page)],
+        "html": [page for page in pages if looks_like_html(page)],
+        "all": pages,
+    }
+    for kind, group in groups.items():
+        if not group:
+            continue
+        legacy_seconds, legacy_outputs = bench(legacy_pre_clean_html, group)
+        new_seconds, new_outputs = bench(clean_text, group)
+        same = sum(1 for a, b in zip(legacy_outputs, new_outputs) if a == b)
+        print(f"{kind:8} ({len(group)} pages): legacy {legacy_seconds:.2f}s, text_cleaning {new_seconds:.2f}s, "
+              f"speedup {legacy_seconds / new_seconds:.1f}x, identical output for {same}/{len(group)}")
@@ -0,0 +1,131 @@
+import os
+import re
+import time
+import hashlib
+import sqlite3
+import threading
+from dotenv import load_dotenv
+from pipeline import get_domain
+from url_index import normalize_url
+
+# Load environment variables
+load_dotenv()
+
+BOILERPLATE_PATH = os.getenv("BOILERPLATE_PATH", ".boilerplate.sqlite")
+BOILERPLATE_MIN_PAGES = int(os.getenv("BOILERPLATE_MIN_PAGES", "3"))        # 0 = keep every block
+BOILERPLATE_MIN_SHARE = float(os.getenv("BOILERPLATE_MIN_SHARE", "0.5"))    # share of the domain's pages
+
+WHITESPACE_RE = re.compile(r"\s+")
+# Tables and headings carry the data and its context; they are never dropped
+PROTECTED_RE = re.compile(r"^\s*(\||#)")
+
+# SQLite limit on host parameters per statement
+_IN_BATCH = 500
+
+
+def fingerprint(block):
+    """Hash of a text block, ignoring case and whitespace."""
+    normalized = WHITESPACE_RE.sub(" ", block).strip().lower()
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+class BoilerplateStore:
+    """
+    Learns which text blocks a website repeats on every page (menus,
+    cookie notices, sidebars, footers) and drops them.
+
+    Every page is split into lines; each line's fingerprint is counted
+    once per page and domain. A line that appeared on at least `min_pages`
+    pages and at least `min_share` of the domain's pages is boilerplate.
+    Counts persist in SQLite, so what one run learned about a domain is
+    applied to its first pages in the next run as well.
+
+    Args:
+        path (str): SQLite file holding the fingerprints.
+        min_pages (int): Pages a block must appear on before it is dropped (0 disables).
+        min_share (float): Share of the domain's pages a block must appear on.
+    """
+    def __init__(self, path=BOILERPLATE_PATH, min_pages=BOILERPLATE_MIN_PAGES, min_share=BOILERPLATE_MIN_SHARE):
+        self.path = path
+        self.min_pages = min_pages
+        self.min_share = min_share
+        self.lines_dropped = 0
+        self.chars_dropped = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS blocks (
+                domain TEXT,
+                fingerprint TEXT,
+                pages INTEGER,
+                PRIMARY KEY (domain, fingerprint)
+            )
+        """)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url_key TEXT PRIMARY KEY,
+                domain TEXT,
+                seen_at REAL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS pages_domain ON pages (domain)")
+        self._db.commit()
+
+    def _learn(self, url, domain, fingerprints):
+        """Counts the page's blocks for its domain, once per URL."""
+        inserted = self._db.execute(
+            "INSERT OR IGNORE INTO pages VALUES (?, ?, ?)", (normalize_url(url), domain, time.time())
+        ).rowcount
+        if inserted:
+            self._db.executemany(
+                "INSERT INTO blocks VALUES (?, ?, 1) "
+                "ON CONFLICT (domain, fingerprint) DO UPDATE SET pages = pages + 1",
+                [(domain, fp) for fp in fingerprints]
+            )
+
+    def _counts(self, domain, fingerprints):
+        fingerprints = list(fingerprints)
+        counts = {}
+        for start in range(0, len(fingerprints), _IN_BATCH):
+            batch = fingerprints[start:start + _IN_BATCH]
+            rows = self._db.execute(
+                f"SELECT fingerprint, pages FROM blocks WHERE domain = ? AND fingerprint IN "
+                f"({','.join('?' * len(batch))})",
+                [domain] + batch
+            ).fetchall()
+            counts.update(rows)
+        return counts
+
+    def strip(self, url, text):
+        """Records the page's blocks and returns the text without its domain's boilerplate lines."""
+        if self.min_pages <= 0 or not text:
+            return text
+        domain = get_domain(url)
+        lines = text.splitlines()
+        line_fps = [fingerprint(line) if line.strip() and not PROTECTED_RE.match(line) else None for line in lines]
+        unique = {fp for fp in line_fps if fp}
+        with self._lock:
+            self._learn(url, domain, unique)
+            domain_pages = self._db.execute(
+                "SELECT COUNT(*) FROM pages WHERE domain = ?", (domain,)
+            ).fetchone()[0]
+            counts = self._counts(domain, unique)
+            self._db.commit()
+        threshold = max(self.min_pages, self.min_share * domain_pages)
+        kept = []
+        for line, fp in zip(lines, line_fps):
+            if fp and counts.get(fp, 0) >= threshold:
+                self.lines_dropped += 1
+                self.chars_dropped += len(line)
+                continue
+            kept.append(line)
+        return "\n".join(kept)
+
+    def report(self):
+        print(f"[BOILERPLATE] Dropped {self.lines_dropped} repeated lines "
+              f"(~{self.chars_dropped // 4} tokens) seen across pages of the same website")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
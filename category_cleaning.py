@@ -2,8 +2,14 @@ import csv
 import json
 import openai
 import os
+import asyncio
+import pandas as pd
 from dotenv import load_dotenv 
 from manual_clean import clean_csv
+from llm_client import chat_completion, achat_completion, count_tokens, get_llm_cache
+from pipeline import run_ordered
+from insight_store import STRUCTURED_COLUMNS
+from kpi_parser import KPI_PARSER, KPI_PARSER_MIN_CONFIDENCE, confident_rows, parse_insights
 
 # Load environment variables
 load_dotenv()
@@ -11,6 +17,10 @@ openai.api_key = os.getenv("OPENAI_API_KEY")
 
 INPUT_CSV = r"C:\Users\user\OneDrive\Desktop\Crawl4AI\LLMkpiHunter\filtered_exports\India_1-120 links"
 OUTPUT_CSV = "cleaned_category"
+CLEANING_CONCURRENCY = int(os.getenv("CLEANING_CONCURRENCY", "8"))  # requests sent to the LLM at once
+BATCH_TOKEN_BUDGET = int(os.getenv("BATCH_TOKEN_BUDGET", "2500"))   # prompt tokens per batched request, 0 = one row per request
+BATCH_MAX_ROWS = int(os.getenv("BATCH_MAX_ROWS", "25"))             # keeps the JSON reply short enough to stay intact
+CLEANING_MODEL = "gpt-3.5-turbo"
 
 def build_prompt(source_url, insight, year):
     print(f"[INFO] Building prompt for Source URL: {source_url}, Insight: {insight[:50]}, Year: {year}")
@@ -39,15 +49,106 @@ Your task is to extract and return structured data in the following exact JSON f
 ❗Return only valid JSON. No markdown, no explanation, no headings — only JSON.
 """
 
+def build_batch_prompt(rows):
+    """
+    One prompt for several insights. `rows` is a list of
+    (row_id, source_url, insight, year); the model answers with a JSON array
+    holding one object per Row ID.
+    """
+    items = "\n".join(
+        json.dumps({"Row ID": row_id, "Insight": insight, "Year": year}, ensure_ascii=False)
+        for row_id, source_url, insight, year in rows
+    )
+    return f"""
+You are an expert FMCG analyst. Below are several raw insights, one JSON object per line:
+
+{items}
+
+For every insight, extract structured data and generate a concise summary based on the Insight.
+Return a JSON array with exactly one object per Row ID, in this exact format:
+
+[
+  {{
+    "Row ID": "The Row ID of the insight, copied unchanged",
+    "Summary": "A concise, clear summary generated from the Insight",
+    "Year": "Year of the insight (strictly cleaned, e.g., '2023' or 'FY23')",
+    "Brand": "Brand name mentioned (if any)",
+    "Metric": "What is being measured (e.g., sales revenue, market share, inventory level — cleaned)",
+    "Metric Category": "The broader KPI category this metric falls under",
+    "Value": "Mentioned value (strictly numeric or numeric + % if applicable)",
+    "Unit": "Unit of measurement (e.g., USD, INR, EUR, '%', 'units')",
+    "Country": "Mentioned country/region, or 'Germany' if implied, else null"
+  }}
+]
+
+❗Return only the valid JSON array. No markdown, no explanation, no headings — only JSON.
+"""
+
+def pack_rows(rows, token_budget=BATCH_TOKEN_BUDGET, max_rows=BATCH_MAX_ROWS):
+    """
+    Greedily groups rows so each batched prompt stays under `token_budget`
+    prompt tokens (and `max_rows` rows). With a budget of 0 every row is its
+    own batch.
+    """
+    if token_budget <= 0:
+        return [[row] for row in rows]
+    preamble = count_tokens(build_batch_prompt([]), CLEANING_MODEL)
+    batches, current, used = [], [], preamble
+    for row in rows:
+        row_id, source_url, insight, year = row
+        cost = count_tokens(json.dumps({"Row ID": row_id, "Insight": insight, "Year": year}, ensure_ascii=False), CLEANING_MODEL)
+        if current and (used + cost > token_budget or len(current) >= max_rows):
+            batches.append(current)
+            current, used = [], preamble
+        current.append(row)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+def _parse_batch_reply(reply):
+    items = json.loads(reply)
+    if not isinstance(items, list):
+        raise ValueError("batched reply is not a JSON array")
+    return {str(item.get("Row ID")): item for item in items if isinstance(item, dict)}
+
+async def extract_structured_batch(rows):
+    """
+    Structures a batch of (row_id, source_url, insight, year) rows with one
+    request. Rows the model dropped or garbled are retried one by one with
+    the single-row prompt. Returns the structured dicts in row order
+    (None where even the retry failed).
+    """
+    if len(rows) == 1:
+        row_id, source_url, insight, year = rows[0]
+        return [await extract_structured_data_async(source_url, insight, year)]
+
+    by_id = {}
+    try:
+        reply = await achat_completion(build_batch_prompt(rows), model=CLEANING_MODEL, validate=_parse_batch_reply)
+        by_id = _parse_batch_reply(reply)
+    except Exception as e:
+        print(f"[ERROR] Batched request for {len(rows)} rows failed, retrying them one by one | Error: {e}")
+
+    results = []
+    for row_id, source_url, insight, year in rows:
+        structured = by_id.get(str(row_id))
+        if structured and structured.get("Metric") is not None:
+            # The batched reply does not echo these back, fill them from the row
+            structured["Source URL"] = source_url
+            structured["Insight"] = insight
+            results.append(structured)
+        else:
+            print(f"[WARNING] Row {row_id} missing from batched reply, falling back to a single-row call.")
+            results.append(await extract_structured_data_async(source_url, insight, year))
+    return results
+
 def extract_structured_data(source_url, insight_text, year):
     try:
         print(f"[INFO] Extracting structured data for Insight: {insight_text[:50]}")
         prompt = build_prompt(source_url, insight_text, year)
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}]
-        )
-        reply = response['choices'][0]['message']['content'].strip()
+        # Rows that were already structured in an earlier run come from the LLM cache
+        reply = chat_completion(prompt, model=CLEANING_MODEL, validate=json.loads)
         return json.loads(reply)
     except openai.error.OpenAIError as e:
         print(f"[ERROR] OpenAI API Error for insight: {insight_text[:50]}... | Error: {e}")
@@ -55,7 +156,130 @@ def extract_structured_data(source_url, insight_text, year):
         print(f"[ERROR] Unexpected error for insight: {insight_text[:50]}... | Error: {e}")
     return None
 
-def process_csv():
+async def extract_structured_data_async(source_url, insight_text, year):
+    try:
+        prompt = build_prompt(source_url, insight_text, year)
+        reply = await achat_completion(prompt, model=CLEANING_MODEL, validate=json.loads)
+        return json.loads(reply)
+    except openai.error.OpenAIError as e:
+        print(f"[ERROR] OpenAI API Error for insight: {insight_text[:50]}... | Error: {e}")
+    except Exception as e:
+        print(f"[ERROR] Unexpected error for insight: {insight_text[:50]}... | Error: {e}")
+    return None
+
+def parse_rows_locally(rows, category=None, country=None, min_confidence=KPI_PARSER_MIN_CONFIDENCE):
+    """
+    Runs the rule-based KPI parser over (row_id, source_url, insight, year)
+    rows. Returns one entry per row: the structured dict when the row was
+    parsed with at least `min_confidence` and has a brand and metric, else
+    None (the row goes to the LLM). Rows that name no country get `country`.
+    """
+    if not rows:
+        return []
+    df = pd.DataFrame(rows, columns=["Row ID", "Source URL", "Insight", "Year"])
+    parsed = parse_insights(df, category, country)
+    confident = confident_rows(parsed, min_confidence).tolist()
+    parsed = parsed[STRUCTURED_COLUMNS].astype(object).where(parsed[STRUCTURED_COLUMNS].notna(), None)
+    return [record if ok else None for record, ok in zip(parsed.to_dict("records"), confident)]
+
+async def structure_rows_async(rows, label, write_row, concurrency=CLEANING_CONCURRENCY,
+                               token_budget=BATCH_TOKEN_BUDGET, category=None, country=None):
+    """
+    Structures (row_id, source_url, insight, year) rows and passes each
+    structured row to `write_row` (a dict with STRUCTURED_COLUMNS), in
+    input order.
+
+    Rows the rule-based KPI parser reads with enough confidence need no LLM
+    call. The rest are packed into batched prompts of up to `token_budget`
+    tokens, with up to `concurrency` requests in flight. Parsed rows are
+    written as soon as the LLM rows before them are. A row that fails is
+    logged and skipped without affecting the others.
+    """
+    total = len(rows)
+    local = parse_rows_locally(rows, category, country) if KPI_PARSER else [None] * total
+    # Input positions of the rows left for the LLM
+    pending = [position for position, structured in enumerate(local) if structured is None]
+    if KPI_PARSER:
+        print(f"[PARSER] {total - len(pending)} rows in {label} structured locally, {len(pending)} left for the LLM.")
+    llm_rows = [rows[position] for position in pending]
+    batches = pack_rows(llm_rows, token_budget)
+    print(f"[INFO] {len(llm_rows)} rows in {label} packed into {len(batches)} requests.")
+
+    next_row = 0
+    sent = 0
+
+    def write_parsed(until):
+        nonlocal next_row
+        while next_row < until:
+            if local[next_row] is not None:
+                write_row(local[next_row])
+            next_row += 1
+
+    def write_batch(index, batch, results):
+        nonlocal next_row, sent
+        positions = pending[sent:sent + len(batch)]
+        sent += len(batch)
+        for position, (row_id, *_), structured in zip(positions, batch, results or [None] * len(batch)):
+            write_parsed(position)
+            next_row = position + 1
+            if structured:
+                write_row({column: structured.get(column, "") for column in STRUCTURED_COLUMNS})
+                print(f"[INFO] Successfully processed row {row_id}/{total} in {label}.")
+            else:
+                print(f"[WARNING] Failed to process row {row_id}/{total} in {label}.")
+
+    await run_ordered(batches, extract_structured_batch, write_batch, concurrency=concurrency)
+    write_parsed(total)
+
+async def process_file_async(input_file_path, output_file_path, concurrency=CLEANING_CONCURRENCY,
+                             token_budget=BATCH_TOKEN_BUDGET):
+    """Structures every row of one category CSV into `output_file_path`."""
+    filename = os.path.basename(input_file_path)
+    with open(input_file_path, mode='r', encoding='utf-8') as infile:
+        rows = [
+            (str(row_id), row.get("Source URL", ""), row["Insight"], row["Year"])
+            for row_id, row in enumerate(csv.DictReader(infile), start=1)
+        ]
+
+    with open(output_file_path, mode='w', newline='', encoding='utf-8') as outfile:
+        writer = csv.DictWriter(outfile, fieldnames=STRUCTURED_COLUMNS)
+        writer.writeheader()
+        # Category files are named after their category, e.g. Total_Sales_Performance.csv
+        category = os.path.splitext(filename)[0].replace("_", " ")
+        await structure_rows_async(rows, filename, writer.writerow, concurrency, token_budget, category)
+
+async def process_store_async(store, categories, run, concurrency=CLEANING_CONCURRENCY):
+    """
+    Structures the 'insights' rows of one run in the insight store, one
+    country / category partition at a time, into the 'structured' dataset.
+    Only the three columns the prompts use are read.
+    """
+    print(f"[INFO] Starting insight store processing for run {run}...")
+    for country in store.partitions("insights", "country", run=run):
+        for category in categories:
+            df = store.read("insights", columns=["Source URL", "Insight", "Year"],
+                            country=country, category=category, run=run)
+            if df.empty:
+                continue
+            rows = [
+                (str(row_id), source_url, insight, year)
+                for row_id, (source_url, insight, year) in enumerate(df.itertuples(index=False), start=1)
+            ]
+            structured = []
+            # Partition values are directory-safe names ('United_Kingdom'); rows naming no country get it
+            row_country = None if country == "unknown" else country.replace("_", " ")
+            await structure_rows_async(rows, f"{country}/{category}", structured.append, concurrency,
+                                       category=category, country=row_country)
+            store.append("structured", pd.DataFrame(structured, columns=STRUCTURED_COLUMNS),
+                         country=country, run=run, category=category)
+
+    get_llm_cache().report()
+    print("[INFO] Insight store processing completed.")
+
+def process_store(store, categories, run, concurrency=CLEANING_CONCURRENCY):
+    asyncio.run(process_store_async(store, categories, run, concurrency))
+
+async def process_csv_async(concurrency=CLEANING_CONCURRENCY):
     print("[INFO] Starting CSV processing...")
 
     # ## Updated to process all CSV files in a folder and save each separately ##
@@ -65,42 +289,14 @@ def process_csv():
             output_file_path = os.path.join(OUTPUT_CSV, filename)  # Save with same name
 
             print(f"[INFO] Processing file: {filename}")
+            await process_file_async(input_file_path, output_file_path, concurrency)
 
-            with open(input_file_path, mode='r', encoding='utf-8') as infile, \
-                 open(output_file_path, mode='w', newline='', encoding='utf-8') as outfile:
-
-                reader = csv.DictReader(infile)
-                fieldnames = ["Source URL", "Insight", "Summary", "Year", "Brand", "Metric", "Metric Category", "Value","Unit", "Country"]
-                writer = csv.DictWriter(outfile, fieldnames=fieldnames)
-                writer.writeheader()
-
-                row_count = 0
-                for row in reader:
-                    row_count += 1
-                    print(f"[INFO] Processing row {row_count} in {filename}...")
-
-                    source_url = row.get("Source URL", "")
-                    structured = extract_structured_data(source_url, row["Insight"], row["Year"])
-
-                    if structured:
-                        writer.writerow({
-                            "Source URL": structured.get("Source URL", ""),
-                            "Insight": structured.get("Insight", ""),
-                            "Summary": structured.get("Summary", ""),
-                            "Year": structured.get("Year", ""),
-                            "Brand": structured.get("Brand", ""),
-                            "Metric": structured.get("Metric", ""),
-                            "Metric Category": structured.get("Metric Category", ""),
-                            "Value": structured.get("Value", ""), 
-                            "Unit": structured.get("Unit", ""),
-                            "Country": structured.get("Country", "")
-                        })
-                        print(f"[INFO] Successfully processed row {row_count} in {filename}.")
-                    else:
-                        print(f"[WARNING] Failed to process row {row_count} in {filename}.")
-
+    get_llm_cache().report()
     print("[INFO] CSV processing completed.")
 
+def process_csv(concurrency=CLEANING_CONCURRENCY):
+    asyncio.run(process_csv_async(concurrency))
+
 
 if __name__ == "__main__":
     process_csv()
@@ -1,37 +1,185 @@
 import os
+import io
+import json
+import hashlib
 import pandas as pd
+from dotenv import load_dotenv
 
-def export_category_data(input_csv: str, category_name: str, output_folder: str = "filtered_exports"):
+# Load environment variables
+load_dotenv()
+
+CATEGORY_CHUNK_ROWS = int(os.getenv("CATEGORY_CHUNK_ROWS", "100000"))      # rows parsed at a time
+CATEGORY_INCREMENTAL = os.getenv("CATEGORY_INCREMENTAL", "0") == "1"       # 1 = only rows added since the last run
+PARTITION_STATE_FILE = ".partition_state.json"
+
+# Bytes at the start of the input that identify it; if they change the file was rewritten
+FINGERPRINT_BYTES = 4096
+
+
+def category_filename(category_name):
+    return category_name.replace(" ", "_") + ".csv"
+
+
+class FileWindow(io.RawIOBase):
+    """Read-only view of a binary file that ends at byte `end`."""
+    def __init__(self, f, end):
+        self.f = f
+        self.end = end
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        remaining = self.end - self.f.tell()
+        if remaining <= 0:
+            return 0
+        data = self.f.read(min(len(buffer), remaining))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def complete_rows_end(f, size):
+    """Offset just past the last newline before `size`, so a row still being written is left for later."""
+    position = size
+    while position > 0:
+        start = max(0, position - 65536)
+        f.seek(start)
+        block = f.read(position - start)
+        newline = block.rfind(b"\n")
+        if newline != -1:
+            return start + newline + 1
+        position = start
+    return 0
+
+
+def file_fingerprint(f, length):
+    f.seek(0)
+    return hashlib.sha1(f.read(length)).hexdigest()
+
+
+def offset_state(f, end):
+    """State entry for a file read up to byte `end`: the offset plus a fingerprint of its start."""
+    fingerprint_bytes = min(FINGERPRINT_BYTES, end)
+    return {"offset": end, "fingerprint_bytes": fingerprint_bytes, "fingerprint": file_fingerprint(f, fingerprint_bytes)}
+
+
+def can_resume(f, previous, end):
+    """True when `previous` (an offset_state entry) still describes the start of the file, so reading can go on from its offset."""
+    return (previous is not None and previous["offset"] <= end
+            and file_fingerprint(f, previous["fingerprint_bytes"]) == previous["fingerprint"])
+
+
+def load_state(path):
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            return json.load(f)
+    return {}
+
+
+def save_state(path, state):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def export_categories(input_csv: str, categories, output_folder: str = "filtered_exports",
+                      chunksize: int = CATEGORY_CHUNK_ROWS, incremental: bool = CATEGORY_INCREMENTAL):
     """
-    Extracts rows matching a specific category from a CSV and saves them
-    in a new CSV file inside the specified folder.
+    Splits a CSV into one file per category in a single pass.
+
+    The input is parsed once, `chunksize` rows at a time, and every chunk's
+    rows are appended to their category's file, so memory stays bounded
+    however large insights_output.csv grows.
+
+    In incremental mode the byte offset reached is kept in the output
+    folder, and the next call only parses the rows appended after it and
+    appends them to the category files. If the input was rewritten
+    (shorter than before, or its first bytes changed) everything is
+    partitioned again.
 
     Parameters:
     - input_csv (str): Path to the input CSV file
-    - category_name (str): The exact category value to filter
-    - output_folder (str): Folder to save the filtered output
-    """
+    - categories (list): Category values to export (None = every category found)
+    - output_folder (str): Folder to save the filtered outputs
+    - chunksize (int): Rows parsed at a time
+    - incremental (bool): Only process rows added since the last call
 
-    # Ensure the output folder exists
+    Returns:
+    - dict: Rows exported per category in this call
+    """
     os.makedirs(output_folder, exist_ok=True)
+    state_path = os.path.join(output_folder, PARTITION_STATE_FILE)
+    state = load_state(state_path)
+    # One offset per input and category list: a call for other categories starts from scratch
+    key = os.path.abspath(input_csv) + "|" + ("*" if categories is None else ",".join(sorted(categories)))
+    counts = {category: 0 for category in categories or []}
 
     try:
-        # Load the CSV data
-        df = pd.read_csv(input_csv)
-
-        # Filter by category
-        filtered_df = df[df["Category"] == category_name]
+        with open(input_csv, "rb") as f:
+            end = complete_rows_end(f, os.fstat(f.fileno()).st_size)
+            previous = state.get(key) if incremental else None
+            resume = can_resume(f, previous, end)
 
-        # Define output path
-        filename_safe = category_name.replace(" ", "_") + ".csv"
-        output_path = os.path.join(output_folder, filename_safe)
+            f.seek(0)
+            header = pd.read_csv(f, nrows=0).columns.tolist()
+            # Category files started in this call; outside incremental mode they are rewritten
+            started = set()
+            if resume:
+                print(f"[INFO] Partitioning rows after byte {previous['offset']} of '{input_csv}'")
+                f.seek(previous["offset"])
+            else:
+                for category in categories or []:
+                    pd.DataFrame(columns=header).to_csv(
+                        os.path.join(output_folder, category_filename(category)), index=False
+                    )
+                    started.add(category)
+                f.seek(0)
+            window = io.BufferedReader(FileWindow(f, end))
+            reader = pd.read_csv(
+                window,
+                dtype=str,
+                keep_default_na=False,
+                chunksize=chunksize,
+                header=None if resume else 0,
+                names=header if resume else None,
+            )
+            for chunk in reader:
+                for category, rows in chunk.groupby("Category", sort=False):
+                    if categories is not None and category not in counts:
+                        continue
+                    output_path = os.path.join(output_folder, category_filename(category))
+                    if resume or category in started:
+                        rows.to_csv(output_path, mode="a", header=not os.path.exists(output_path), index=False)
+                    else:
+                        rows.to_csv(output_path, index=False)
+                        started.add(category)
+                    counts[category] = counts.get(category, 0) + len(rows)
 
-        # Save filtered data
-        filtered_df.to_csv(output_path, index=False)
-        print(f"[SUCCESS] Exported {len(filtered_df)} rows to '{output_path}'")
+            state[key] = offset_state(f, end)
+        save_state(state_path, state)
+        for category, count in counts.items():
+            print(f"[SUCCESS] Exported {count} rows to '{os.path.join(output_folder, category_filename(category))}'")
 
     except Exception as e:
         print(f"[ERROR] Failed to export category data: {e}")
+    return counts
+
+
+def export_category_data(input_csv: str, category_name: str, output_folder: str = "filtered_exports"):
+    """
+    Extracts rows matching a specific category from a CSV and saves them
+    in a new CSV file inside the specified folder. For several categories
+    use `export_categories`, which reads the input only once.
+
+    Parameters:
+    - input_csv (str): Path to the input CSV file
+    - category_name (str): The exact category value to filter
+    - output_folder (str): Folder to save the filtered output
+    """
+    export_categories(input_csv, [category_name], output_folder, incremental=False)
+
+
 if __name__ == "__main__":
     # Example usage
     input_csv_file = "insights_output.csv"
@@ -50,6 +198,5 @@ if __name__ == "__main__":
         "Brand-wise Sales"
     ]
 
-    # Loop through all categories and export their data
-    for category in categories:
-        export_category_data(input_csv_file, category)
\ No newline at end of file
+    # One pass over the input exports every category
+    export_categories(input_csv_file, categories)
@@ -0,0 +1,146 @@
+import os
+import re
+from dotenv import load_dotenv
+from llm_client import count_tokens, EXPECTED_REPLY_TOKENS
+
+# Load environment variables
+load_dotenv()
+
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "0"))                  # 0 = as large as the model context allows
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "150"))  # text repeated between neighbouring chunks
+MAX_CHUNK_TOKENS = 12000   # bigger chunks get thinner extractions, keep calls below this even on 128k models
+
+MODEL_CONTEXT_TOKENS = {
+    "gpt-4o-mini": 128000,
+    "gpt-4o": 128000,
+    "gpt-4-turbo": 128000,
+    "gpt-4": 8192,
+    "gpt-3.5-turbo": 16385,
+}
+
+HEADING_RE = re.compile(r"^(#{1,6}\s|[A-Z][A-Z0-9 &,\-]{3,60}$)")
+TABLE_ROW_RE = re.compile(r"^\s*\|")
+SENTENCE_END_RE = re.compile(r"(?<=[.!?;])\s+")
+
+
+def chunk_budget(model, prompt_overhead=0, reply_tokens=EXPECTED_REPLY_TOKENS):
+    """
+    Tokens one chunk may use so that prompt + chunk + reply fit the model.
+    CHUNK_TOKENS in .env overrides the computed size.
+    """
+    if CHUNK_TOKENS:
+        return CHUNK_TOKENS
+    context = MODEL_CONTEXT_TOKENS.get(model, 8192)
+    return max(500, min(MAX_CHUNK_TOKENS, context - prompt_overhead - reply_tokens))
+
+
+def split_blocks(text):
+    """
+    Groups lines into blocks that should stay together: a heading, a run of
+    markdown table rows, or a paragraph line. Returns (kind, text) pairs with
+    kind in 'heading', 'table', 'text'.
+    """
+    blocks = []
+    table = []
+    for line in text.splitlines():
+        if TABLE_ROW_RE.match(line):
+            table.append(line)
+            continue
+        if table:
+            blocks.append(("table", "\n".join(table)))
+            table = []
+        if not line.strip():
+            continue
+        kind = "heading" if HEADING_RE.match(line.strip()) else "text"
+        blocks.append((kind, line))
+    if table:
+        blocks.append(("table", "\n".join(table)))
+    return blocks
+
+
+def _split_oversized(kind, text, max_tokens, model):
+    """Breaks a block larger than a chunk: tables by rows (header repeated), text by sentences, then words."""
+    if kind == "table":
+        rows = text.splitlines()
+        header = rows[:2] if len(rows) > 2 and set(rows[1].replace("|", "").strip()) <= set("-: ") else rows[:1]
+        pieces, current = [], list(header)
+        for row in rows[len(header):]:
+            if len(current) > len(header) and count_tokens("\n".join(current + [row]), model) > max_tokens:
+                pieces.append("\n".join(current))
+                current = list(header)
+            current.append(row)
+        pieces.append("\n".join(current))
+        return [("table", piece) for piece in pieces]
+
+    parts = SENTENCE_END_RE.split(text)
+    if len(parts) == 1:
+        parts = text.split(" ")
+    pieces, current = [], ""
+    for part in parts:
+        candidate = f"{current} {part}".strip()
+        if current and count_tokens(candidate, model) > max_tokens:
+            pieces.append(current)
+            current = part
+        else:
+            current = candidate
+    if current:
+        pieces.append(current)
+    # A single "word" can still be huge (e.g. base64); cut it by characters as a last resort
+    result = []
+    for piece in pieces:
+        if count_tokens(piece, model) > max_tokens:
+            step = max_tokens * 3
+            result.extend(piece[i:i + step] for i in range(0, len(piece), step))
+        else:
+            result.append(piece)
+    return [(kind, piece) for piece in result]
+
+
+def chunk_text(text, max_tokens, overlap_tokens=CHUNK_OVERLAP_TOKENS, model="gpt-4o-mini"):
+    """
+    Splits text into chunks of at most `max_tokens` tokens without cutting
+    through sentences, headings or tables.
+
+    Blocks are packed greedily. A new chunk prefers to start at a heading
+    once the current one is half full, and starts with the last
+    `overlap_tokens` worth of blocks from the previous chunk so facts near a
+    boundary keep their context.
+
+    Args:
+        text (str): Cleaned page text.
+        max_tokens (int): Token limit per chunk.
+        overlap_tokens (int): Tokens of trailing context carried into the next chunk.
+        model (str): Model whose tokenizer is used for counting.
+
+    Returns:
+        list[str]: The chunks, in page order.
+    """
+    blocks = []
+    for kind, block in split_blocks(text):
+        tokens = count_tokens(block, model)
+        if tokens > max_tokens:
+            for piece_kind, piece in _split_oversized(kind, block, max_tokens, model):
+                blocks.append((piece_kind, piece, count_tokens(piece, model)))
+        else:
+            blocks.append((kind, block, tokens))
+
+    chunks = []
+    current, used = [], 0
+    for kind, block, tokens in blocks:
+        full = used + tokens > max_tokens
+        section_break = kind == "heading" and used > max_tokens // 2
+        if current and (full or section_break):
+            chunks.append("\n".join(b for _, b, _ in current))
+            # Carry the tail of the finished chunk over as context
+            carried, carried_tokens = [], 0
+            for previous in reversed(current):
+                if carried_tokens + previous[2] > overlap_tokens or carried_tokens + previous[2] + tokens > max_tokens:
+                    break
+                carried.insert(0, previous)
+                carried_tokens += previous[2]
+            current, used = carried, carried_tokens
+        current.append((kind, block, tokens))
+        used += tokens
+    if current:
+        chunks.append("\n".join(b for _, b, _ in current))
+    return chunks
@@ -3,6 +3,7 @@ import json
 import openai
 import os
 from dotenv import load_dotenv
+from llm_client import chat_completion
 
 # Load environment variables
 load_dotenv()
@@ -46,11 +47,8 @@ def extract_structured_data(source_url, insight_text, year):
     try:
         print(f"[INFO] Extracting structured data for Insight: {insight_text[:50]}")
         prompt = build_prompt(source_url, insight_text, year)
-        response = openai.ChatCompletion.create(
-            model="gpt-4",
-            messages=[{"role": "user", "content": prompt}]
-        )
-        reply = response['choices'][0]['message']['content'].strip()
+        # Paced by the shared OpenAI rate limiter and answered from the LLM cache when possible
+        reply = chat_completion(prompt, model="gpt-4", validate=json.loads)
         return json.loads(reply)
     except openai.error.OpenAIError as e:
         print(f"[ERROR] OpenAI API Error for insight: {insight_text[:50]}... | Error: {e}")
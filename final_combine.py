@@ -1,15 +1,23 @@
 import pandas as pd
 import glob
 import os
+from manual_clean import clean_frame
+from insight_store import STRUCTURED_COLUMNS, TYPED_COLUMNS
+from fuzzy_dedup import deduplicate
 
 def combine_and_deduplicate_csv(folder_path, output_file):
     """
-    Combines all CSV files in a folder and removes duplicate rows
-    based on Country, Year, Brand, Metric, and Value.
+    Combines all CSV files in a folder and removes duplicate rows: the same
+    Country, Year, Brand, Metric and Value after normalization, or the same
+    fact paraphrased (see fuzzy_dedup.py). Kept rows list the Source URLs of
+    the rows merged into them.
 
     Args:
         folder_path (str): Path to the folder containing CSV files.
         output_file (str): Path to save the combined cleaned CSV.
+
+    Returns:
+        pd.DataFrame: The deduplicated rows, or None on error.
     """
     try:
         # Get all CSV files in the folder
@@ -26,13 +34,43 @@ def combine_and_deduplicate_csv(folder_path, output_file):
         # Combine all dataframes
         combined_df = pd.concat(df_list, ignore_index=True)
 
-        # Drop duplicate rows based on the specified columns
-        deduplicated_df = combined_df.drop_duplicates(subset=['Country', 'Year', 'Brand', 'Metric', 'Value'])
+        # Drop exact and paraphrased duplicates
+        deduplicated_df = deduplicate(combined_df)
 
         # Save to output file
         deduplicated_df.to_csv(output_file, index=False)
         print(f"Combined and cleaned file saved to: {output_file}")
+        return deduplicated_df
 
     except Exception as e:
         print(f"Error occurred: {e}")
+        return None
+
+
+def combine_and_deduplicate_store(store, output_file, run, country=None):
+    """
+    Same as combine_and_deduplicate_csv for the 'structured' rows of one run
+    in the insight store: one read of the run's partitions, cleaned with
+    manual_clean.clean_frame, deduplicated and saved as CSV.
+
+    Args:
+        store (InsightStore): Store holding the structured rows.
+        output_file (str): Path to save the combined cleaned CSV.
+        run (str): Run whose rows are combined.
+        country (str): Only this country's rows (None = every country in the run).
 
+    Returns:
+        pd.DataFrame: The deduplicated rows, or None on error.
+    """
+    try:
+        df = store.read("structured", columns=STRUCTURED_COLUMNS + TYPED_COLUMNS,
+                        country=country, run=run)
+        cleaned_df = clean_frame(df)
+        deduplicated_df = deduplicate(cleaned_df)
+        deduplicated_df.to_csv(output_file, index=False)
+        print(f"Combined and cleaned {len(deduplicated_df)} of {len(df)} store rows saved to: {output_file}")
+        return deduplicated_df
+
+    except Exception as e:
+        print(f"Error occurred: {e}")
+        return None
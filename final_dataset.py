@@ -0,0 +1,250 @@
+import io
+import os
+import csv
+import sys
+import sqlite3
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from insight_store import STRUCTURED_COLUMNS, TYPED_COLUMNS
+from fuzzy_dedup import (DEDUP_BANDS, DEDUP_NUM_PERM, DEDUP_SIMILARITY, SOURCE_SEPARATOR, MinHasher,
+                         dedup_keys, deduplicate, lsh_buckets, similarity, values_match)
+
+# Load environment variables
+load_dotenv()
+
+FINAL_DATASET = os.getenv("FINAL_DATASET", "1") == "1"                       # 0 = per-run outputs only
+FINAL_DATASET_PATH = os.getenv("FINAL_DATASET_PATH", "Final_Data/FMCG_all.csv")
+FINAL_INDEX_PATH = os.getenv("FINAL_INDEX_PATH", "Final_Data/.final_index.sqlite")
+FINAL_REBUILD_CHUNK_ROWS = 50000
+
+# Column order of the consolidated dataset; columns a batch lacks stay empty
+FINAL_COLUMNS = ["Row ID"] + STRUCTURED_COLUMNS + TYPED_COLUMNS + ["Source URLs"]
+
+
+class FinalDataset:
+    """
+    One consolidated, append-only dataset of every country and run.
+
+    A batch (e.g. one run's combined rows) is deduplicated within itself,
+    then checked against a persistent SQLite index of the rows already in
+    the dataset: exact keys by primary key, paraphrases through the stored
+    LSH buckets and MinHash signatures (see fuzzy_dedup.py). Only new facts
+    are appended to the CSV, so a merge costs O(batch rows) and never
+    reloads the history. Source URLs of duplicates are added to the
+    matching row's provenance in the index.
+
+    The CSV size is recorded with every index commit; rows appended by a
+    merge that died before its commit are cut off on the next open. If the
+    index is missing or does not match the CSV it is rebuilt from the CSV.
+
+    Args:
+        path (str): Consolidated CSV.
+        index_path (str): SQLite file holding the dedup index.
+    """
+    def __init__(self, path=FINAL_DATASET_PATH, index_path=FINAL_INDEX_PATH):
+        self.path = path
+        self.index_path = index_path
+        self.hasher = MinHasher(DEDUP_NUM_PERM)
+        self.added = 0
+        self.merged = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(index_path, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS rows (
+                row_id INTEGER PRIMARY KEY,
+                value REAL,
+                signature BLOB
+            );
+            CREATE TABLE IF NOT EXISTS exact_keys (key TEXT PRIMARY KEY, row_id INTEGER);
+            CREATE TABLE IF NOT EXISTS lsh (
+                block TEXT,
+                band INTEGER,
+                bucket BLOB,
+                row_id INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS lsh_bucket ON lsh (block, band, bucket);
+            CREATE TABLE IF NOT EXISTS sources (
+                row_id INTEGER,
+                url TEXT,
+                PRIMARY KEY (row_id, url)
+            );
+        """)
+        self._db.commit()
+        self._recover()
+
+    def _meta(self, key, default=None):
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _size(self):
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def _recover(self):
+        committed = self._meta("dataset_size")
+        size = self._size()
+        if committed is None:
+            if size:
+                print(f"[FINAL] No index for {self.path}, building it from the dataset")
+                self.rebuild()
+            return
+        committed = int(committed)
+        if size > committed:
+            print(f"[FINAL] {self.path} has rows from an interrupted merge, truncating them")
+            with open(self.path, "r+b") as f:
+                f.truncate(committed)
+        elif size < committed:
+            print(f"[FINAL] {self.path} is smaller than its index expects, rebuilding the index")
+            self.rebuild()
+
+    def rebuild(self):
+        """
+        Re-indexes the dataset CSV from scratch, reading it in chunks. Source
+        URLs of duplicates merged after a row was written exist only in the
+        index, so a rebuild keeps just the URLs in the CSV.
+        """
+        for table in ("meta", "rows", "exact_keys", "lsh", "sources"):
+            self._db.execute(f"DELETE FROM {table}")
+        if os.path.exists(self.path):
+            for chunk in pd.read_csv(self.path, dtype=str, keep_default_na=False, chunksize=FINAL_REBUILD_CHUNK_ROWS):
+                chunk["Value Num"] = pd.to_numeric(chunk["Value Num"], errors="coerce")
+                self._index(chunk, chunk["Row ID"].astype(int).tolist())
+        self._db.execute("INSERT OR REPLACE INTO meta VALUES ('dataset_size', ?)", (str(self._size()),))
+        self._db.commit()
+
+    def _index(self, df, row_ids):
+        """Adds rows that are in the dataset to the index (no commit)."""
+        blocks, exact, values = dedup_keys(df)
+        signatures = self.hasher.signatures(df["Insight"].fillna("").tolist())
+        for position, row_id in enumerate(row_ids):
+            value = None if pd.isna(values[position]) else float(values[position])
+            self._db.execute("INSERT OR REPLACE INTO rows VALUES (?, ?, ?)",
+                             (row_id, value, signatures[position].tobytes()))
+            self._db.execute("INSERT OR IGNORE INTO exact_keys VALUES (?, ?)", (exact[position], row_id))
+            self._db.executemany(
+                "INSERT INTO lsh VALUES (?, ?, ?, ?)",
+                [(blocks[position], band, bucket, row_id)
+                 for band, bucket in lsh_buckets(signatures[position], DEDUP_BANDS)]
+            )
+            urls = str(df["Source URLs"].iloc[position]) if "Source URLs" in df.columns else ""
+            self._add_sources(row_id, urls.split(SOURCE_SEPARATOR))
+
+    def _add_sources(self, row_id, urls):
+        self._db.executemany("INSERT OR IGNORE INTO sources VALUES (?, ?)",
+                             [(row_id, url) for url in urls if url])
+
+    def _find(self, block, exact, value, signature):
+        """Row ID of an indexed row stating the same fact, or None."""
+        row = self._db.execute("SELECT row_id FROM exact_keys WHERE key = ?", (exact,)).fetchone()
+        if row:
+            return row[0]
+        candidates = set()
+        for band, bucket in lsh_buckets(signature, DEDUP_BANDS):
+            candidates.update(row_id for (row_id,) in self._db.execute(
+                "SELECT row_id FROM lsh WHERE block = ? AND band = ? AND bucket = ?", (block, band, bucket)
+            ))
+        for row_id in sorted(candidates):
+            stored_value, stored_signature = self._db.execute(
+                "SELECT value, signature FROM rows WHERE row_id = ?", (row_id,)
+            ).fetchone()
+            stored_value = float("nan") if stored_value is None else stored_value
+            stored_signature = np.frombuffer(stored_signature, dtype=np.uint64)
+            if values_match(value, stored_value) and similarity(signature, stored_signature) >= DEDUP_SIMILARITY:
+                return row_id
+        return None
+
+    def append(self, df, label="batch"):
+        """
+        Merges a batch into the dataset. Returns (rows appended, rows that
+        matched a row already in the dataset or in the batch).
+        """
+        if df is None or df.empty:
+            return 0, 0
+        # Output of final_combine is already deduplicated and carries its merged 'Source URLs'
+        batch = df if "Source URLs" in df.columns else deduplicate(df)
+        if "Source URLs" not in batch.columns:
+            batch = batch.assign(**{"Source URLs": batch["Source URL"].fillna("").astype(str)})
+        batch = batch.reset_index(drop=True)
+        blocks, exact, values = dedup_keys(batch)
+        signatures = self.hasher.signatures(batch["Insight"].fillna("").tolist())
+
+        next_id = (self._db.execute("SELECT MAX(row_id) FROM rows").fetchone()[0] or 0) + 1
+        new_positions, new_ids = [], []
+        pending = {}   # exact key -> row ID of a new row in this batch
+        for position in range(len(batch)):
+            urls = str(batch["Source URLs"].iloc[position]).split(SOURCE_SEPARATOR)
+            match = pending.get(exact[position]) or self._find(blocks[position], exact[position],
+                                                               values[position], signatures[position])
+            if match is not None:
+                self._add_sources(match, urls)
+                continue
+            new_positions.append(position)
+            new_ids.append(next_id)
+            pending[exact[position]] = next_id
+            next_id += 1
+
+        new_rows = batch.iloc[new_positions].copy()
+        new_rows["Row ID"] = new_ids
+        new_rows = new_rows.reindex(columns=FINAL_COLUMNS)
+        self._write(new_rows)
+        self._index(new_rows.reset_index(drop=True), new_ids)
+        self._db.execute("INSERT OR REPLACE INTO meta VALUES ('dataset_size', ?)", (str(self._size()),))
+        self._db.commit()
+
+        merged = len(df) - len(new_rows)
+        self.added += len(new_rows)
+        self.merged += merged
+        print(f"[FINAL] {label}: {len(new_rows)} new rows appended to {self.path}, {merged} duplicates merged")
+        return len(new_rows), merged
+
+    def _write(self, rows):
+        if rows.empty:
+            return
+        buffer = io.StringIO()
+        rows.to_csv(buffer, index=False, header=not self._size(), quoting=csv.QUOTE_MINIMAL)
+        with open(self.path, "ab") as f:
+            f.write(buffer.getvalue().encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def sources(self, row_id):
+        """Every Source URL merged into a row, including those of later duplicates."""
+        return [url for (url,) in self._db.execute(
+            "SELECT url FROM sources WHERE row_id = ? ORDER BY rowid", (row_id,)
+        )]
+
+    def report(self):
+        total = self._db.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+        print(f"[FINAL] {self.added} rows added, {self.merged} duplicates merged; {total} rows in {self.path}")
+
+    def close(self):
+        self._db.close()
+
+
+def merge_into_final_dataset(df, label="batch"):
+    """Appends a combined batch to the consolidated dataset, skipping facts it already holds."""
+    dataset = FinalDataset()
+    try:
+        dataset.append(df, label)
+        dataset.report()
+    finally:
+        dataset.close()
+
+
+if __name__ == "__main__":
+    # python final_dataset.py add Final_Data/FMCG_India.csv ...  -> merges earlier per-country outputs
+    # python final_dataset.py sources <Row ID>                    -> every source URL of one row
+    command, args = (sys.argv[1], sys.argv[2:]) if len(sys.argv) > 1 else ("", [])
+    dataset = FinalDataset()
+    if command == "add":
+        for path in args:
+            dataset.append(pd.read_csv(path), os.path.basename(path))
+        dataset.report()
+    elif command == "sources":
+        for url in dataset.sources(int(args[0])):
+            print(url)
+    else:
+        print("usage: python final_dataset.py add <csv> ... | sources <row id>")
+    dataset.close()
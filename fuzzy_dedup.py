@@ -0,0 +1,216 @@
+import os
+import re
+import sys
+import zlib
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from insight_store import parse_year
+from kpi_parser import BRAND_LOOKUP, COUNTRY_LOOKUP
+
+# Load environment variables
+load_dotenv()
+
+FUZZY_DEDUP = os.getenv("FUZZY_DEDUP", "1") == "1"                          # 0 = exact duplicates only
+DEDUP_SIMILARITY = float(os.getenv("DEDUP_SIMILARITY", "0.5"))              # insight text Jaccard to count as the same
+DEDUP_NUM_PERM = int(os.getenv("DEDUP_NUM_PERM", "64"))                     # MinHash permutations
+DEDUP_BANDS = int(os.getenv("DEDUP_BANDS", "16"))                           # LSH bands (rows per band = perms / bands)
+DEDUP_VALUE_TOLERANCE = float(os.getenv("DEDUP_VALUE_TOLERANCE", "0.01"))   # relative difference of equal values
+SOURCE_SEPARATOR = " | "
+
+# Columns the exact duplicates were defined on before; they stay the blocking key
+KEY_COLUMNS = ['Country', 'Year', 'Brand', 'Metric', 'Value']
+
+WORD_RE = re.compile(r"[a-z0-9%₹$€£.]+")
+COMPANY_SUFFIX_RE = re.compile(r"\b(ltd|limited|inc|plc|pvt|private|co|corp|corporation|company|group|ag|gmbh|se)\b\.?")
+NON_WORD_RE = re.compile(r"[^a-z0-9]+")
+
+# Mersenne prime for the universal hash family of the MinHash permutations
+_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+def _canonical(values, lookup):
+    """Lower-cased names mapped through an alias table, company suffixes and punctuation removed."""
+    lowered = values.fillna("").astype(str).str.lower().str.strip()
+    mapped = lowered.map(lambda name: lookup.get(name, "").lower())
+    cleaned = lowered.str.replace(COMPANY_SUFFIX_RE, "", regex=True).str.replace(NON_WORD_RE, " ", regex=True).str.strip()
+    return mapped.where(mapped != "", cleaned)
+
+
+def block_keys(df):
+    """
+    Normalized Country / Year / Brand per row, so 'HUL' and 'Hindustan
+    Unilever', or 'FY23' and '2023', fall into the same block.
+    """
+    country = _canonical(df["Country"], COUNTRY_LOOKUP)
+    brand = _canonical(df["Brand"], BRAND_LOOKUP)
+    year = parse_year(df["Year"].astype("string")).astype("string").fillna(
+        df["Year"].fillna("").astype(str).str.lower().str.strip()
+    )
+    return country + "|" + year + "|" + brand
+
+
+def value_numbers(df):
+    """Numeric values per row: the normalized 'Value Num' when present, else a plain parse of 'Value'."""
+    if "Value Num" in df.columns:
+        return pd.to_numeric(df["Value Num"], errors="coerce").astype(float)
+    return pd.to_numeric(df["Value"].astype(str).str.replace(",", "", regex=False), errors="coerce").astype(float)
+
+
+def dedup_keys(df):
+    """
+    (block key, exact key, value) arrays per row: rows are only compared
+    within a block, and rows sharing an exact key are duplicates outright.
+    """
+    blocks = block_keys(df).to_numpy()
+    values = value_numbers(df).to_numpy()
+    metrics = _canonical(df["Metric"], {}).to_numpy()
+    exact = blocks + "|" + metrics + "|" + pd.Series(values).round(6).map(str).to_numpy()
+    return blocks, exact, values
+
+
+def shingles(text, size=2):
+    """Hashes of the word bigrams of a text (single words for one-word texts)."""
+    words = WORD_RE.findall(str(text).lower())
+    if len(words) < size:
+        grams = words or [""]
+    else:
+        grams = [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+    return np.array(sorted({zlib.crc32(gram.encode("utf-8")) for gram in grams}), dtype=np.uint64)
+
+
+class MinHasher:
+    """MinHash signatures with `num_perm` seeded universal hash permutations."""
+    def __init__(self, num_perm=DEDUP_NUM_PERM, seed=1):
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, 1 << 31, size=num_perm).astype(np.uint64)
+        self.b = rng.randint(0, 1 << 31, size=num_perm).astype(np.uint64)
+
+    def signature(self, hashes):
+        # (num_perm, n_shingles) permuted hashes, minimum per permutation
+        permuted = (np.outer(self.a, hashes) + self.b[:, None]) % _PRIME & _MAX_HASH
+        return permuted.min(axis=1)
+
+    def signatures(self, texts):
+        """One row of `num_perm` hashes per text."""
+        if not texts:
+            return np.empty((0, len(self.a)), dtype=np.uint64)
+        return np.vstack([self.signature(shingles(text)) for text in texts])
+
+
+def lsh_buckets(signature, bands=DEDUP_BANDS):
+    """(band, bucket bytes) pairs of one signature; similar texts share at least one."""
+    rows_per_band = max(1, len(signature) // bands)
+    return [(band, signature[band * rows_per_band:(band + 1) * rows_per_band].tobytes()) for band in range(bands)]
+
+
+def similarity(signature_a, signature_b):
+    """Estimated Jaccard similarity of two MinHash signatures."""
+    return float((signature_a == signature_b).mean())
+
+
+class _UnionFind:
+    def __init__(self, size):
+        self.parent = np.arange(size)
+
+    def find(self, i):
+        root = i
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[i] != root:
+            self.parent[i], i = root, self.parent[i]
+        return root
+
+    def union(self, i, j):
+        root_i, root_j = self.find(i), self.find(j)
+        if root_i != root_j:
+            # The earlier row stays the representative, like drop_duplicates(keep='first')
+            self.parent[max(root_i, root_j)] = min(root_i, root_j)
+
+
+def values_match(a, b, tolerance=DEDUP_VALUE_TOLERANCE):
+    if np.isnan(a) or np.isnan(b):
+        return np.isnan(a) and np.isnan(b)
+    return abs(a - b) <= tolerance * max(abs(a), abs(b), 1e-9)
+
+
+def fuzzy_deduplicate(df, min_similarity=DEDUP_SIMILARITY, num_perm=DEDUP_NUM_PERM, bands=DEDUP_BANDS,
+                      value_tolerance=DEDUP_VALUE_TOLERANCE):
+    """
+    Merges rows that state the same fact in different words.
+
+    1. Blocking: rows are only compared within the same normalized
+       Country / Year / Brand, and must have the same value (within
+       `value_tolerance`). Rows that also share the normalized metric are
+       duplicates outright, as with the old exact key.
+    2. Within a block, MinHash signatures of the insight text are split into
+       `bands` LSH bands; rows sharing a band bucket are candidates, and a
+       candidate pair is merged when its estimated Jaccard similarity is at
+       least `min_similarity`. The cost grows with the number of rows and
+       bucket collisions, never with all pairs.
+
+    Every group keeps its first row, with the distinct Source URLs of all
+    merged rows in 'Source URLs' and their number in 'Merged Rows'.
+    """
+    if df.empty:
+        return df.assign(**{"Source URLs": pd.Series(dtype=str), "Merged Rows": pd.Series(dtype=int)})
+    df = df.reset_index(drop=True)
+    blocks, exact, values = dedup_keys(df)
+    groups = _UnionFind(len(df))
+
+    # Same normalized block, metric and value: duplicates without looking at the text
+    exact_key = pd.Series(exact)
+    for _, members in exact_key.groupby(exact_key, sort=False).groups.items():
+        first = members[0]
+        for other in members[1:]:
+            groups.union(first, other)
+
+    # Paraphrases: LSH over the insight text, bucketed per block
+    hasher = MinHasher(num_perm)
+    signatures = hasher.signatures(df["Insight"].fillna("").tolist())
+    buckets = {}
+    for index in range(len(df)):
+        for band, bucket in lsh_buckets(signatures[index], bands):
+            buckets.setdefault((blocks[index], band, bucket), []).append(index)
+    compared = set()
+    for members in buckets.values():
+        if len(members) < 2:
+            continue
+        for position, i in enumerate(members):
+            for j in members[position + 1:]:
+                if (i, j) in compared or groups.find(i) == groups.find(j):
+                    continue
+                compared.add((i, j))
+                if not values_match(values[i], values[j], value_tolerance):
+                    continue
+                if similarity(signatures[i], signatures[j]) >= min_similarity:
+                    groups.union(i, j)
+
+    roots = np.array([groups.find(i) for i in range(len(df))])
+    urls = df["Source URL"].fillna("").astype(str) if "Source URL" in df.columns else pd.Series("", index=df.index)
+    provenance = urls.groupby(roots).agg(lambda group: SOURCE_SEPARATOR.join(dict.fromkeys(url for url in group if url)))
+    sizes = pd.Series(roots).value_counts()
+    kept = df.loc[np.unique(roots)].copy()
+    kept["Source URLs"] = provenance.reindex(kept.index).to_numpy()
+    kept["Merged Rows"] = sizes.reindex(kept.index).to_numpy()
+    print(f"[DEDUP] {len(df)} rows -> {len(kept)} ({len(compared)} candidate pairs compared)")
+    return kept
+
+
+def deduplicate(df):
+    """Fuzzy deduplication, or the exact KEY_COLUMNS match with FUZZY_DEDUP=0."""
+    if FUZZY_DEDUP:
+        return fuzzy_deduplicate(df)
+    return df.drop_duplicates(subset=KEY_COLUMNS)
+
+
+if __name__ == "__main__":
+    # python fuzzy_dedup.py Final_Data/FMCG_India.csv -> rows merged and example groups
+    for path in sys.argv[1:]:
+        df = pd.read_csv(path)
+        result = fuzzy_deduplicate(df)
+        merged = result[result["Merged Rows"] > 1]
+        print(f"{path}: {len(df)} rows, {len(result)} after fuzzy dedup, {len(merged)} merged groups")
+        with pd.option_context("display.max_colwidth", 60, "display.width", 200):
+            print(merged[["Brand", "Year", "Metric", "Value", "Merged Rows", "Source URLs"]].head(20).to_string())
@@ -4,6 +4,7 @@ import csv
 import time
 import requests
 from dotenv import load_dotenv
+from rate_limiter import get_limiter
 
 # Load API key
 load_dotenv()
@@ -42,20 +43,47 @@ Extract and format the structured data in this exact JSON format:
 Return only valid JSON. No extra text or markdown.
 """
 
-# Gemini API caller with retry
-def extract_with_gemini(source_url, insight, year, retries=2, delay=5):
+# Gemini API caller with retry, paced by the shared rate limiter
+def extract_with_gemini(source_url, insight, year, retries=4):
     prompt = build_prompt(source_url, insight, year)
     payload = { "contents": [ { "parts": [ { "text": prompt } ] } ] }
     headers = { "Content-Type": "application/json" }
-    
-    # Adding a delay before making the request to avoid hitting rate limits
-    time.sleep(delay)
+    limiter = get_limiter("gemini")
+    estimated_tokens = len(prompt) // 4 + 300
 
     for attempt in range(retries + 1):
+        # Waits only as long as the requests/tokens-per-minute budget requires
+        limiter.acquire_sync(estimated_tokens)
         try:
             response = requests.post(GEMINI_URL, headers=headers, json=payload)
-            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            limiter.release(estimated_tokens, success=False)
+            print(f"[ERROR] API call failed (Attempt {attempt + 1}/{retries + 1}): {e}")
+            time.sleep(min(60, 2 ** attempt))
+            continue
+
+        if response.status_code == 429:
+            limiter.release(estimated_tokens, success=False)
+            limiter.on_rate_limited(response.headers)
+            print(f"[WARNING] Rate limited (Attempt {attempt + 1}/{retries + 1}).")
+            continue
+
+        limiter.update_from_headers(response.headers)
+        if not response.ok:
+            limiter.release(estimated_tokens, success=False)
+            print(f"[ERROR] API call failed (Attempt {attempt + 1}/{retries + 1}): HTTP {response.status_code} {response.text[:200]}")
+            if response.status_code < 500:
+                break  # Bad request or key, retrying will not help
+            time.sleep(min(60, 2 ** attempt))
+            continue
+
+        try:
             output = response.json()
+        except ValueError:
+            output = {}
+        limiter.release(estimated_tokens, output.get("usageMetadata", {}).get("totalTokenCount"))
+
+        try:
             text_response = output["candidates"][0]["content"]["parts"][0]["text"] 
             
             # Clean the Gemini response if it's wrapped in markdown
@@ -72,12 +100,9 @@ def extract_with_gemini(source_url, insight, year, retries=2, delay=5):
         except json.JSONDecodeError as e:
             print(f"[ERROR] JSON parsing failed:\n{e}\nRaw response: {text_response}")
             break
-        except requests.exceptions.RequestException as e:
-            print(f"[ERROR] API call failed (Attempt {attempt + 1}/{retries}): {e}")
-            if attempt < retries:
-                time.sleep(delay)
-            else:
-                break
+        except (KeyError, IndexError) as e:
+            print(f"[ERROR] Unexpected response format: {e}\nRaw response: {output}")
+            break
     return None
 
 # Main CSV processor
@@ -117,8 +142,6 @@ def process_csv():
                 failed_writer.writerow(row)
                 print(f"[WARNING] ✖ Row {idx} failed. Saved to failed_rows.csv.")
 
-            time.sleep(2)  # Avoid hitting rate limits
-
 # Run the processor
 if __name__ == "__main__":
     process_csv()
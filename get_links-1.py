@@ -7,18 +7,25 @@ import time
 import random
 from datetime import datetime
 from dotenv import load_dotenv
-from openai import AsyncOpenAI
-from bs4 import BeautifulSoup
-import tiktoken
+from rate_limiter import get_limiter
+from search_store import SearchStore
+from query_plan import QueryPlanner
+from url_index import URLIndex
 
 # Load environment variables
 load_dotenv()
 BING_SUBSCRIPTION_KEY = os.getenv("BING_SEARCH_V7_SUBSCRIPTION_KEY")
-BING_ENDPOINT = os.getenv("BING_SEARCH_V7_ENDPOINT").rstrip('/')
+# Point this at a local stub server to try link collection without the real API
+BING_ENDPOINT = os.getenv("BING_SEARCH_V7_ENDPOINT", "https://api.bing.microsoft.com").rstrip('/')
 BING_SEARCH_URL = f"{BING_ENDPOINT}/v7.0/search"
+MAX_CONCURRENT_SEARCHES = int(os.getenv("MAX_CONCURRENT_SEARCHES", "8"))
+SEARCH_RETRIES = 4
+SEARCH_BATCH_ROUNDS = 4   # queries picked per planning step = MAX_CONCURRENT_SEARCHES * this
 
-def generate_industry_search_queries(industry, country):
-    """Generates Bing search queries with year-wise loop and trusted sources."""
+QUERY_TEMPLATES = ["report", "insights", "sales performance", "market trends", "analysis"]
+
+def generate_query_plan(industry, country):
+    """Generates (query, template, source, year) tuples with year-wise loop and trusted sources."""
     years = list(range(2015, 2025))
     sources = [ 
         
@@ -38,60 +45,121 @@ def generate_industry_search_queries(industry, country):
         # "Deloitte", "Accenture", "Capgemini", "AT Kearney", "Bain Net Promoter Benchmarks"
     
     
-    queries = []
+    plan = []
     for year in years:
         for source in sources:
-            queries.append(f"{industry} {source} report {year} {country}")
-            queries.append(f"{industry} {source} insights {year} {country}")
-            queries.append(f"{industry} {source} sales performance {year} {country}")
-            queries.append(f"{industry} {source} market trends {year} {country}")
-            queries.append(f"{industry} {source} analysis {year} {country}")
-    return queries
+            for template in QUERY_TEMPLATES:
+                plan.append((f"{industry} {source} {template} {year} {country}", template, source, year))
+    return plan
 
-async def bing_search(session, query, count=1):
-    """Search Bing using the Bing Search API and return a list of URLs."""
-    headers = {"Ocp-Apim-Subscription-Key": BING_SUBSCRIPTION_KEY}
+def generate_industry_search_queries(industry, country):
+    """Generates Bing search queries with year-wise loop and trusted sources."""
+    return [query for query, _, _, _ in generate_query_plan(industry, country)]
+
+async def bing_search(session, query, count=1, retries=SEARCH_RETRIES):
+    """
+    Search Bing using the Bing Search API and return a list of URLs.
+    Returns None when the search failed, so it is not recorded as done.
+    """
+    headers = {"Ocp-Apim-Subscription-Key": BING_SUBSCRIPTION_KEY or ""}
     params = {"q": query, "count": count, "mkt": "en-US"}
-    
-    try:
-        async with session.get(BING_SEARCH_URL, headers=headers, params=params) as response:
-            response.raise_for_status()
-            search_results = await response.json()
-            urls = []
-            if "webPages" in search_results:
-                urls = [result["url"] for result in search_results["webPages"]["value"]]
-            print(f"Bing returned {len(urls)} URLs for '{query}'")
-            return urls
-    except Exception as e:
-        print(f"Bing search error for '{query}': {e}")
-        return []
+    limiter = get_limiter("bing")
+
+    for attempt in range(retries):
+        await limiter.acquire()
+        try:
+            async with session.get(BING_SEARCH_URL, headers=headers, params=params) as response:
+                if response.status == 429:
+                    limiter.release(success=False)
+                    limiter.on_rate_limited(response.headers)
+                    continue
+                response.raise_for_status()
+                search_results = await response.json()
+        except Exception as e:
+            limiter.release(success=False)
+            print(f"Bing search error for '{query}': {e}")
+            status = getattr(e, "status", None)
+            if status and 400 <= status < 500:
+                return None
+            await asyncio.sleep(min(30, 2 ** attempt + random.uniform(0, 1)))
+            continue
+        limiter.release()
+        urls = []
+        if "webPages" in search_results:
+            urls = [result["url"] for result in search_results["webPages"]["value"]]
+        print(f"Bing returned {len(urls)} URLs for '{query}'")
+        return urls
+    print(f"Bing search gave up on '{query}' after {retries} attempts")
+    return None
+
+async def search_all(session, store, plan, LOCATION, count=1, concurrency=MAX_CONCURRENT_SEARCHES):
+    """
+    Runs the planned queries not yet in the store, `concurrency` at a time,
+    and stores each result as soon as it arrives. Stored results are fed to
+    the planner first, then queries are picked in small batches so templates,
+    sources and years that stopped bringing new URLs are skipped.
+    Returns {query: urls} for every query that has a result.
+    """
+    planner = QueryPlanner(plan)
+    queries = [query for query, _, _, _ in plan]
+    results = store.done(queries, count)
+    for query in queries:
+        if query in results:
+            planner.record(query, results[query])
+    print(f"{LOCATION}: {len(results)} queries already done, {len(planner.pending)} planned")
+    semaphore = asyncio.Semaphore(concurrency)
+    failed = 0
+
+    async def run(query):
+        nonlocal failed
+        async with semaphore:
+            urls = await bing_search(session, query, count)
+        if urls is None:
+            failed += 1
+            planner.drop(query)
+            return
+        store.put(query, count, LOCATION, urls)
+        results[query] = urls
+        planner.record(query, urls)
+
+    while True:
+        batch = planner.next_batch(concurrency * SEARCH_BATCH_ROUNDS)
+        if not batch:
+            break
+        await asyncio.gather(*(run(query) for query in batch))
+    if failed:
+        print(f"⚠️ {LOCATION}: {failed} queries failed, run again to retry them")
+    planner.report(LOCATION)
+    return results
 
 async def get_links(topic, LOCATIONs, file_name, count=1):
     current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     print(f"\nStarting research: {topic} at {current_time}\n")
     
     all_urls = {}
+    store = SearchStore()
+    url_index = URLIndex()
     async with aiohttp.ClientSession() as session:
         for LOCATION in LOCATIONs:
-            urls = []
-            queries = generate_industry_search_queries(topic, LOCATION)
+            plan = generate_query_plan(topic, LOCATION)
+            # The same query string can come out of the generator twice, search it once
+            queries = list(dict.fromkeys(query for query, _, _, _ in plan))
             print(f"Generated {len(queries)} queries for {LOCATION}")
 
-            for query in queries:
-                result = await bing_search(session, query, count)
-                if result:
-                    urls.extend(result)
-
-                # 🛑 Add random small delay between requests to avoid Bing API rate limits
-                # await asyncio.sleep(random.uniform(1.5, 3.0))  # Sleep between 1.5 and 3 seconds randomly
-
-            all_urls[LOCATION] = list(set(urls))
+            results = await search_all(session, store, plan, LOCATION, count)
+            # Keep first-seen order so the links file is stable between runs. The URL index drops
+            # variants of the same link and links already collected for other countries or runs.
+            urls = [url for query in queries for url in results.get(query, [])]
+            all_urls[LOCATION] = url_index.register(urls, LOCATION, os.path.basename(file_name))
             print(f"✅ {LOCATION}: Total unique URLs collected: {len(all_urls[LOCATION])}")
 
             # Save partial results after each LOCATION ✅
             with open(file_name, "w") as f:
                 json.dump(all_urls, f, indent=4)
             print(f"📂 Saved progress after {LOCATION}\n")
+    store.close()
+    url_index.report()
+    url_index.close()
 
 if __name__ == "__main__":
     topic = "FMCG"
@@ -0,0 +1,205 @@
+import io
+import os
+import re
+import sys
+import time
+import uuid
+import pandas as pd
+from dotenv import load_dotenv
+from category_filter import FileWindow, can_resume, complete_rows_end, load_state, offset_state, save_state
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # the stages keep exchanging CSV files
+    pa = None
+
+# Load environment variables
+load_dotenv()
+
+INSIGHT_STORE_DIR = os.getenv("INSIGHT_STORE_DIR", "insight_store")
+INSIGHT_STORE = os.getenv("INSIGHT_STORE", "1") == "1" and pa is not None   # 0 = always use the CSV stages
+RUN_ID = os.getenv("RUN_ID") or time.strftime("%Y%m%d-%H%M%S")
+IMPORT_STATE_FILE = ".import_state.json"
+
+# Hive-style directories: <dataset>/country=<..>/category=<..>/run=<..>/part-<id>.parquet
+PARTITION_COLUMNS = ["country", "category", "run"]
+# Partition values are always read back as strings (a RUN_ID of '5' must not become an int)
+_PARTITIONING = None
+if pa is not None:
+    _PARTITIONING = ds.partitioning(pa.schema([(name, pa.string()) for name in PARTITION_COLUMNS]), flavor="hive")
+
+# Raw rows from insights_output.csv
+RAW_COLUMNS = ["Source URL", "Category", "Insight", "Year"]
+# Rows structured by category_cleaning.py
+STRUCTURED_COLUMNS = ["Source URL", "Insight", "Summary", "Year", "Brand", "Metric",
+                      "Metric Category", "Value", "Unit", "Country"]
+# Typed columns added on write
+TYPED_COLUMNS = ["Year Num", "Value Num", "Currency", "Is Percent", "Value USD"]
+
+YEAR_RE = re.compile(r"(?:19|20)\d{2}")
+FISCAL_YEAR_RE = re.compile(r"\bFY\s*'?(\d{2})\b", re.IGNORECASE)
+
+
+def partition_value(value):
+    """Directory-safe partition value ('Market Share & ASP' -> 'Market_Share_&_ASP')."""
+    return str(value).strip().replace(" ", "_").replace("/", "_") or "unknown"
+
+
+def parse_year(years):
+    """
+    First calendar year in each Year string as a nullable integer column:
+    '2023' and 'Q3 2024' read directly, 'FY23' / "FY'23" as 2023.
+    """
+    years = years.fillna("").astype(str)
+    full = years.str.extract(f"({YEAR_RE.pattern})", expand=False)
+    fiscal = years.str.extract(FISCAL_YEAR_RE, expand=False)
+    fiscal = ("20" + fiscal).where(fiscal.notna())
+    return pd.to_numeric(full.fillna(fiscal), errors="coerce").astype("Int16")
+
+
+def typed_frame(df):
+    """
+    Adds the typed columns: 'Year Num' (Int16) and, for structured rows, the
+    normalized 'Value Num', 'Currency', 'Is Percent' and 'Value USD'.
+    """
+    df = df.copy()
+    for column in df.columns:
+        if column not in PARTITION_COLUMNS:
+            df[column] = df[column].astype("string")
+    if "Year" in df.columns:
+        df["Year Num"] = parse_year(df["Year"])
+    if "Value" in df.columns:
+        # Imported here: value_normalization -> kpi_parser imports this module's column lists
+        from value_normalization import normalize_values
+        df = normalize_values(df)
+    if "Unit" in df.columns:
+        # Few distinct units: dictionary-encoded in Parquet
+        df["Unit"] = df["Unit"].astype("category")
+    return df
+
+
+class InsightStore:
+    """
+    Parquet dataset holding the insights between the pipeline stages, in
+    place of the CSV files each stage used to re-read and rewrite.
+
+    Every dataset ('insights', 'structured', ...) is partitioned by
+    country, category and run, so a stage reads only the partitions and
+    columns it needs, with typed Year / Value / Unit columns instead of
+    strings parsed again on every read. Needs pyarrow.
+
+    Args:
+        root (str): Directory holding the datasets.
+    """
+    def __init__(self, root=INSIGHT_STORE_DIR):
+        if pa is None:
+            raise RuntimeError("pyarrow is not installed: pip install pyarrow")
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, dataset):
+        return os.path.join(self.root, dataset)
+
+    def append(self, dataset, df, country=None, run=RUN_ID, category=None):
+        """
+        Writes `df` as new files under `dataset`. The country and category
+        partitions are `country` / `category`, or the rows' own 'country' /
+        'Category' columns when they are None. Returns the number of rows written.
+        """
+        if df.empty:
+            return 0
+        df = typed_frame(df)
+        df["country"] = partition_value(country) if country is not None else df["country"].fillna("unknown").map(partition_value)
+        df["category"] = partition_value(category) if category is not None else df["Category"].fillna("unknown").map(partition_value)
+        df["run"] = partition_value(run)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        pq.write_to_dataset(
+            table,
+            self._path(dataset),
+            partition_cols=PARTITION_COLUMNS,
+            basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+        )
+        return len(df)
+
+    def read(self, dataset, columns=None, country=None, category=None, run=None):
+        """
+        Rows of `dataset` as a DataFrame, limited to the given partitions
+        (None = all) and `columns` (None = all). Partitions that do not
+        match are never opened.
+        """
+        path = self._path(dataset)
+        if not os.path.exists(path):
+            return pd.DataFrame(columns=columns or [])
+        data = ds.dataset(path, format="parquet", partitioning=_PARTITIONING)
+        expression = None
+        for name, value in (("country", country), ("category", category), ("run", run)):
+            if value is None:
+                continue
+            condition = ds.field(name) == partition_value(value)
+            expression = condition if expression is None else expression & condition
+        if columns is not None:
+            # Files written before a column was added simply lack it
+            columns = [column for column in columns if column in data.schema.names]
+        table = data.to_table(columns=columns, filter=expression)
+        return table.to_pandas()
+
+    def partitions(self, dataset, name, **filters):
+        """Distinct values of partition `name` ('country', 'category' or 'run') in `dataset`."""
+        df = self.read(dataset, columns=[name], **filters)
+        return sorted(df[name].astype(str).unique()) if not df.empty else []
+
+    def import_csv(self, csv_path, countries, run=RUN_ID, dataset="insights", default_country="unknown"):
+        """
+        Loads the rows of insights_output.csv added since the last import
+        into `dataset`, each under the country its Source URL was searched
+        for (`countries` maps URL -> country). The byte offset reached is
+        kept in the store's .import_state.json (as for the category export),
+        so every run partition holds only that run's new rows; a rewritten
+        CSV is imported again in full. Returns the number of rows.
+        """
+        state_path = os.path.join(self.root, IMPORT_STATE_FILE)
+        state = load_state(state_path)
+        key = os.path.abspath(csv_path) + "|" + dataset
+        with open(csv_path, "rb") as f:
+            end = complete_rows_end(f, os.fstat(f.fileno()).st_size)
+            previous = state.get(key)
+            resume = can_resume(f, previous, end)
+            f.seek(0)
+            header = pd.read_csv(f, nrows=0).columns.tolist()
+            start = previous["offset"] if resume else 0
+            if resume and start == end:
+                df = pd.DataFrame(columns=header)
+            else:
+                f.seek(start)
+                df = pd.read_csv(io.BufferedReader(FileWindow(f, end)), dtype=str, keep_default_na=False,
+                                 header=None if resume else 0, names=header if resume else None)
+            df = df[RAW_COLUMNS]
+            df["country"] = df["Source URL"].map(countries).fillna(default_country)
+            rows = self.append(dataset, df, run=run)
+            state[key] = offset_state(f, end)
+        save_state(state_path, state)
+        print(f"[STORE] Imported {rows} new rows from {csv_path} (from byte {start}) into {self._path(dataset)} (run {run})")
+        return rows
+
+    def export_csv(self, dataset, csv_path, columns=None, **filters):
+        """Writes the selected rows of `dataset` to a CSV file, for the stages and people that read CSV."""
+        df = self.read(dataset, columns=columns, **filters)
+        if columns is None:
+            df = df.drop(columns=PARTITION_COLUMNS)
+        df.to_csv(csv_path, index=False)
+        return len(df)
+
+
+if __name__ == "__main__":
+    # python insight_store.py <dataset> [country] [category] [run] -> row counts per partition
+    if pa is None:
+        raise SystemExit("pyarrow is not installed: pip install pyarrow")
+    args = sys.argv[1:] + [None] * 4
+    dataset, country, category, run = args[:4]
+    df = InsightStore().read(dataset or "insights", country=country, category=category, run=run)
+    if df.empty:
+        print("No rows")
+    else:
+        print(df.groupby(PARTITION_COLUMNS, observed=True).size().to_string())
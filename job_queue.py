@@ -0,0 +1,196 @@
+import os
+import time
+import sqlite3
+import threading
+import multiprocessing
+from dotenv import load_dotenv
+from rate_limiter import DEFAULT_LIMITS, get_limiter
+
+# Load environment variables
+load_dotenv()
+
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", ".job_queue.sqlite")
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "600"))   # a job leased longer than this is handed out again
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))         # leases per job before it is marked failed
+
+
+class JobQueue:
+    """
+    SQLite-backed work queue shared by several worker processes.
+
+    A worker leases a job for `lease_seconds`, renews the lease while it is
+    still working on it, and acks it when done. If the worker crashes the
+    lease runs out and another worker picks the job up again; after
+    `max_attempts` leases the job is marked failed.
+
+    Args:
+        name (str): Queue name, so several link files can share one database.
+        path (str): SQLite file holding the jobs.
+        lease_seconds (float): How long a lease lasts without renewal.
+        max_attempts (int): Leases per job before it is given up.
+    """
+    def __init__(self, name, path=JOB_QUEUE_PATH, lease_seconds=JOB_LEASE_SECONDS,
+                 max_attempts=JOB_MAX_ATTEMPTS):
+        self.name = name
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        # Autocommit mode, so lease() can open its own BEGIN IMMEDIATE transaction
+        self._db = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                queue TEXT,
+                payload TEXT,
+                status TEXT,
+                attempts INTEGER DEFAULT 0,
+                lease_owner TEXT,
+                lease_expires REAL,
+                error TEXT,
+                updated_at REAL,
+                UNIQUE (queue, payload)
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (queue, status, lease_expires)")
+
+    def enqueue(self, payloads):
+        """Adds jobs; payloads already in the queue (pending, done or failed) are left alone."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            before = self._db.total_changes
+            self._db.executemany(
+                "INSERT OR IGNORE INTO jobs (queue, payload, status, updated_at) VALUES (?, ?, 'pending', ?)",
+                [(self.name, payload, now) for payload in payloads]
+            )
+            added = self._db.total_changes - before
+            self._db.execute("COMMIT")
+        return added
+
+    def lease(self, owner):
+        """
+        Leases the next pending job, or a leased one whose lease expired.
+        Returns (job_id, payload), or None when nothing is available right now.
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                # Jobs whose last lease ran out after their final attempt are given up
+                self._db.execute(
+                    "UPDATE jobs SET status = 'failed', error = 'lease expired', updated_at = ? "
+                    "WHERE queue = ? AND status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                    (now, self.name, now, self.max_attempts)
+                )
+                row = self._db.execute(
+                    "SELECT id, payload FROM jobs WHERE queue = ? AND "
+                    "(status = 'pending' OR (status = 'leased' AND lease_expires < ?)) "
+                    "ORDER BY id LIMIT 1",
+                    (self.name, now)
+                ).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE jobs SET status = 'leased', attempts = attempts + 1, lease_owner = ?, "
+                        "lease_expires = ?, updated_at = ? WHERE id = ?",
+                        (owner, now + self.lease_seconds, now, row[0])
+                    )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return row
+
+    def renew(self, job_ids, owner):
+        """Extends the leases `owner` still holds on `job_ids`."""
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                "UPDATE jobs SET lease_expires = ? WHERE id = ? AND lease_owner = ? AND status = 'leased'",
+                [(now + self.lease_seconds, job_id, owner) for job_id in job_ids]
+            )
+
+    def ack(self, job_id, owner):
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = 'done', updated_at = ? WHERE id = ? AND lease_owner = ?",
+                (time.time(), job_id, owner)
+            )
+
+    def fail(self, job_id, owner, error=""):
+        """Returns the job to the queue, or marks it failed once it used up its attempts."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "lease_owner = NULL, error = ?, updated_at = ? WHERE id = ? AND lease_owner = ?",
+                (self.max_attempts, str(error)[:500], time.time(), job_id, owner)
+            )
+
+    def settle(self, job_id, owner, error, after_flush):
+        """
+        Settles a job whose URL left the pipeline. A failed one goes back to
+        the queue right away (see fail); a successful one is acked through
+        `after_flush(callback)`, so it only counts as done once its rows are
+        on disk and a crash before that re-runs it instead of losing them.
+        """
+        if error is None:
+            after_flush(lambda: self.ack(job_id, owner))
+        else:
+            self.fail(job_id, owner, error)
+
+    def counts(self):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT status, COUNT(*) FROM jobs WHERE queue = ? GROUP BY status", (self.name,)
+            ).fetchall()
+        return dict(rows)
+
+    def unfinished(self):
+        """Number of jobs still pending or leased (by this or another worker)."""
+        counts = self.counts()
+        return counts.get("pending", 0) + counts.get("leased", 0)
+
+    def report(self):
+        counts = self.counts()
+        print(f"[QUEUE] {self.name}: {counts.get('done', 0)} done, {counts.get('failed', 0)} failed, "
+              f"{counts.get('pending', 0)} pending, {counts.get('leased', 0)} leased")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def worker_path(path, worker_id):
+    """Per-worker name of an output file: insights_output.csv -> insights_output_worker3.csv."""
+    stem, ext = os.path.splitext(path)
+    return f"{stem}_worker{worker_id}{ext}"
+
+
+def run_workers(target, count):
+    """
+    Runs `target(worker_id)` in `count` fresh processes and waits for them.
+
+    Workers are spawned rather than forked so none of them inherits open
+    SQLite connections, and each gets JOB_WORKER_ID in its environment. The
+    shared API limits (OPENAI_RPM, ...) are divided between the workers,
+    since every process keeps its own limiter.
+    """
+    for name in DEFAULT_LIMITS:
+        limiter = get_limiter(name)
+        prefix = name.upper()
+        os.environ[f"{prefix}_RPM"] = str(max(1, limiter.rpm // count))
+        os.environ[f"{prefix}_TPM"] = str(limiter.tpm // count)
+        os.environ[f"{prefix}_MAX_CONCURRENCY"] = str(max(1, limiter.max_concurrency // count))
+    context = multiprocessing.get_context("spawn")
+    processes = []
+    for worker_id in range(count):
+        os.environ["JOB_WORKER_ID"] = str(worker_id)
+        process = context.Process(target=target, args=(worker_id,), name=f"worker-{worker_id}")
+        process.start()
+        processes.append(process)
+    del os.environ["JOB_WORKER_ID"]
+    for process in processes:
+        process.join()
+        if process.exitcode:
+            print(f"[QUEUE] {process.name} exited with code {process.exitcode}")
@@ -0,0 +1,314 @@
+import os
+import re
+import sys
+import json
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from insight_store import STRUCTURED_COLUMNS
+
+# Load environment variables
+load_dotenv()
+
+KPI_PARSER = os.getenv("KPI_PARSER", "1") == "1"                                    # 0 = every row goes to the LLM
+KPI_PARSER_MIN_CONFIDENCE = float(os.getenv("KPI_PARSER_MIN_CONFIDENCE", "0.75"))   # rows below go to the LLM
+KPI_BRANDS_FILE = os.getenv("KPI_BRANDS_FILE")                                      # JSON {brand: [aliases]} added to BRANDS
+
+# Canonical brand -> spellings seen in insights. All-caps aliases of up to 4 letters match case-sensitively.
+BRANDS = {
+    "Hindustan Unilever": ["Hindustan Unilever", "HUL"],
+    "Unilever": ["Unilever"],
+    "Nestlé": ["Nestlé", "Nestle"],
+    "ITC": ["ITC"],
+    "Dabur": ["Dabur"],
+    "Marico": ["Marico"],
+    "Britannia": ["Britannia"],
+    "Godrej Consumer Products": ["Godrej Consumer Products", "Godrej Consumer", "GCPL"],
+    "Colgate-Palmolive": ["Colgate-Palmolive", "Colgate Palmolive", "Colgate"],
+    "Procter & Gamble": ["Procter & Gamble", "Procter and Gamble", "P&G"],
+    "Tata Consumer Products": ["Tata Consumer Products", "Tata Consumer"],
+    "Emami": ["Emami"],
+    "Patanjali": ["Patanjali"],
+    "Amul": ["Amul"],
+    "Parle": ["Parle"],
+    "Jyothy Labs": ["Jyothy Labs", "Jyothy"],
+    "Henkel": ["Henkel"],
+    "Beiersdorf": ["Beiersdorf", "Nivea"],
+    "Dr. Oetker": ["Dr. Oetker", "Oetker"],
+    "Haribo": ["Haribo"],
+    "Ferrero": ["Ferrero"],
+    "Coca-Cola": ["Coca-Cola", "Coca Cola", "Coke"],
+    "PepsiCo": ["PepsiCo", "Pepsi"],
+    "Reckitt": ["Reckitt Benckiser", "Reckitt"],
+    "L'Oréal": ["L'Oréal", "L'Oreal", "Loreal"],
+    "Danone": ["Danone"],
+    "Mondelez": ["Mondelez"],
+    "Cadbury": ["Cadbury"],
+    "Kellogg's": ["Kellogg's", "Kellogg"],
+    "Mars": ["Mars Inc", "Mars Wrigley"],
+}
+
+COUNTRIES = {
+    "India": ["India", "Indian"],
+    "Germany": ["Germany", "German"],
+    "United States": ["United States", "USA", "US", "America", "American"],
+    "United Kingdom": ["United Kingdom", "UK", "Britain", "British"],
+    "France": ["France", "French"],
+    "China": ["China", "Chinese"],
+    "Japan": ["Japan", "Japanese"],
+    "Indonesia": ["Indonesia", "Indonesian"],
+    "Brazil": ["Brazil", "Brazilian"],
+    "Bangladesh": ["Bangladesh"],
+    "Sri Lanka": ["Sri Lanka"],
+}
+
+# First matching pattern names the metric, so specific ones come first
+METRICS = [
+    ("Market Share", r"market share|share of (?:the )?market"),
+    ("E-commerce Share", r"e-?commerce|online|quick commerce"),
+    ("EBITDA Margin", r"ebitda"),
+    ("Gross Margin", r"gross margin"),
+    ("Operating Margin", r"operating margin|\bmargins?\b"),
+    ("Net Profit", r"net profit|profit after tax|\bpat\b|net income|\bprofit"),
+    ("Volume Growth", r"\bvolumes?\b"),
+    ("Average Selling Price", r"\basp\b|average selling price|\bprice"),
+    ("Inventory Level", r"inventory|dealer stock|stock levels?|days of stock"),
+    ("Customer Retention", r"retention|repeat (?:purchase|customer)|churn|loyal"),
+    ("Promotion Impact", r"promotion|promotional|discount"),
+    ("Cost Savings", r"cost (?:saving|reduction|optimi[sz]ation)|savings"),
+    ("Sales Growth", r"\bgr[eo]w|growth|increase|\brose\b|jump|decline|\bfell\b"),
+    ("Sales Revenue", r"revenue|sales|turnover|top ?line"),
+]
+METRIC_CATEGORIES = {
+    "Market Share": "Market Share & ASP",
+    "Average Selling Price": "Market Share & ASP",
+    "E-commerce Share": "Channel-wise Performance",
+    "EBITDA Margin": "Cost Optimization",
+    "Gross Margin": "Cost Optimization",
+    "Operating Margin": "Cost Optimization",
+    "Cost Savings": "Cost Optimization",
+    "Net Profit": "Total Sales Performance",
+    "Volume Growth": "Total Sales Performance",
+    "Sales Growth": "Total Sales Performance",
+    "Sales Revenue": "Total Sales Performance",
+    "Inventory Level": "Demand & Inventory",
+    "Customer Retention": "Customer Retention",
+    "Promotion Impact": "Promotions Impact",
+}
+
+# Currency symbols and words -> ISO code; count words -> 'units'
+UNITS = {
+    "₹": "INR", "rs": "INR", "rs.": "INR", "inr": "INR", "rupees": "INR", "rupee": "INR",
+    "$": "USD", "us$": "USD", "usd": "USD", "dollars": "USD",
+    "€": "EUR", "eur": "EUR", "euro": "EUR", "euros": "EUR",
+    "£": "GBP", "gbp": "GBP", "pounds": "GBP",
+    "unit": "units", "units": "units",
+}
+MULTIPLIERS = {
+    "%": 1, "percent": 1, "per cent": 1,
+    "k": 1e3, "thousand": 1e3,
+    "lakh": 1e5, "lakhs": 1e5, "lac": 1e5, "lacs": 1e5,
+    "m": 1e6, "mn": 1e6, "million": 1e6,
+    "cr": 1e7, "crore": 1e7, "crores": 1e7,
+    "b": 1e9, "bn": 1e9, "billion": 1e9,
+    "tn": 1e12, "trillion": 1e12,
+}
+# Indian number words imply rupees when no currency is given
+INR_MULTIPLIERS = {"lakh", "lakhs", "lac", "lacs", "cr", "crore", "crores"}
+
+# A number with optional currency before/after and an optional multiplier or percent sign.
+# The lookbehind keeps 'Q3', 'FY23' and '1.5' inside other tokens from matching.
+VALUE_RE = re.compile(
+    r"(?<![\w.])(?P<prefix>₹|rs\.?|inr|us\$|\$|usd|€|eur|£|gbp)?\s?"
+    r"(?P<number>\d{1,3}(?:,\d{2,3})+(?:\.\d+)?|\d+(?:\.\d+)?)\s?"
+    r"(?P<mult>%|per ?cent|crores?|cr|lakhs?|lacs?|billion|bn|b|million|mn|m|thousand|k|trillion|tn)?(?![a-z])\s?"
+    r"(?P<suffix>rupees?|inr|usd|dollars|euros?|eur|gbp|pounds|units?)?(?![a-z])",
+    re.IGNORECASE,
+)
+YEAR_LIKE_RE = r"^(?:19|20)\d{2}$"
+PERIOD_RE = re.compile(r"(?P<quarter>[QH][1-4])?\s*(?P<year>FY\s*'?\d{2,4}|CY\s*'?\d{2,4}|(?:19|20)\d{2})", re.IGNORECASE)
+
+# Confidence weights of the parts found in a row; they add up to 1
+WEIGHTS = {"value": 0.35, "metric": 0.3, "year": 0.15, "brand": 0.2}
+BARE_NUMBER_WEIGHT = 0.15     # a number without currency, multiplier or % might be anything
+AMBIGUITY_PENALTY = 0.3       # several different amounts: let the LLM pick the right one
+# Rows missing one of these are never confident: the final clean drops rows without a brand,
+# so only the LLM can still rescue them
+REQUIRED_COLUMNS = ["Brand", "Metric"]
+
+
+def _alias_pattern(table):
+    """Two regexes over all aliases: case-insensitive names and case-sensitive acronyms."""
+    names, acronyms = [], []
+    for aliases in table.values():
+        for alias in aliases:
+            (acronyms if alias.isupper() and len(alias) <= 4 else names).append(alias)
+
+    def compile_(aliases, flags):
+        if not aliases:
+            return None
+        body = "|".join(re.escape(alias) for alias in sorted(aliases, key=len, reverse=True))
+        return re.compile(rf"(?<![\w])({body})(?![\w])", flags)
+    return compile_(names, re.IGNORECASE), compile_(acronyms, 0)
+
+
+def _alias_lookup(table):
+    return {alias.lower(): canonical for canonical, aliases in table.items() for alias in aliases}
+
+
+def _load_brands():
+    brands = dict(BRANDS)
+    if KPI_BRANDS_FILE and os.path.exists(KPI_BRANDS_FILE):
+        with open(KPI_BRANDS_FILE, "r", encoding="utf-8") as f:
+            brands.update(json.load(f))
+    return brands
+
+
+_BRANDS = _load_brands()
+_BRAND_PATTERNS = _alias_pattern(_BRANDS)
+BRAND_LOOKUP = _alias_lookup(_BRANDS)
+_COUNTRY_PATTERNS = _alias_pattern(COUNTRIES)
+COUNTRY_LOOKUP = _alias_lookup(COUNTRIES)
+
+
+def _find_alias(texts, patterns, lookup):
+    found = pd.Series(np.nan, index=texts.index, dtype=object)
+    for pattern in patterns:
+        if pattern is not None:
+            found = found.fillna(texts.str.extract(pattern, expand=False))
+    return found.str.lower().map(lookup)
+
+
+def _format_number(value):
+    return f"{value:.6f}".rstrip("0").rstrip(".")
+
+
+def extract_values(texts):
+    """
+    The KPI amount of each text, vectorized over all rows.
+
+    Every number is matched with its currency and multiplier; bare numbers
+    that look like years are ignored. The first number with a currency,
+    multiplier or percent sign wins, else the first bare number.
+
+    Returns:
+        pd.DataFrame: value (float, in base units: '₹5000 Cr' -> 5e10),
+        multiplier (float applied, 1 when none was written), unit ('%', ISO
+        currency, 'units' or ''), strong (bool), ambiguous (bool), per row.
+    """
+    result = pd.DataFrame({
+        "value": np.nan, "multiplier": 1.0, "unit": "", "strong": False, "ambiguous": False,
+    }, index=texts.index)
+    matches = texts.str.extractall(VALUE_RE)
+    if matches.empty:
+        return result
+    prefix = matches["prefix"].str.lower().str.strip()
+    suffix = matches["suffix"].str.lower().str.strip()
+    mult = matches["mult"].str.lower().str.replace(r"\s+", " ", regex=True)
+    number = pd.to_numeric(matches["number"].str.replace(",", "", regex=False), errors="coerce")
+    strong = prefix.notna() | suffix.notna() | mult.notna()
+    multiplier = mult.map(MULTIPLIERS).fillna(1)
+    candidates = pd.DataFrame({
+        "value": number * multiplier,
+        "multiplier": multiplier,
+        "unit": prefix.map(UNITS).fillna(suffix.map(UNITS)),
+        "percent": mult.isin(["%", "percent", "per cent"]),
+        "inr_words": mult.isin(INR_MULTIPLIERS),
+        "strong": strong,
+    })
+    candidates = candidates[strong | ~matches["number"].str.match(YEAR_LIKE_RE)]
+    candidates = candidates[candidates["value"].notna()]
+    if candidates.empty:
+        return result
+    # Strong candidates sort before bare ones, keeping text order within each group
+    ranked = candidates.assign(order=~candidates["strong"]).sort_values("order", kind="stable")
+    best = ranked.groupby(level=0).head(1).droplevel(1)
+    unit = np.where(best["percent"], "%",
+                    best["unit"].fillna(pd.Series(np.where(best["inr_words"], "INR", ""), index=best.index)))
+    distinct_amounts = candidates[candidates["strong"]].groupby(level=0)["value"].nunique()
+    result.loc[best.index, "value"] = best["value"]
+    result.loc[best.index, "multiplier"] = best["multiplier"]
+    result.loc[best.index, "unit"] = unit
+    result.loc[best.index, "strong"] = best["strong"]
+    result.loc[distinct_amounts.index, "ambiguous"] = distinct_amounts > 1
+    return result
+
+
+def extract_periods(texts):
+    """Cleaned period of each text ('2023', 'FY23', 'Q3 FY24'), NaN where there is none."""
+    found = texts.str.extract(PERIOD_RE)
+    year = found["year"].str.upper().str.replace(r"[\s']", "", regex=True)
+    quarter = found["quarter"].str.upper()
+    return (quarter + " " + year).fillna(year)
+
+
+def extract_metrics(texts):
+    """Metric name of each text from METRICS, NaN where none matches."""
+    lowered = texts.str.lower()
+    conditions = [lowered.str.contains(pattern, regex=True) for _, pattern in METRICS]
+    names = np.select(conditions, [name for name, _ in METRICS], default="")
+    return pd.Series(names, index=texts.index).replace("", np.nan)
+
+
+def parse_insights(df, category=None, default_country=None):
+    """
+    Structures insight rows without an LLM.
+
+    Args:
+        df (pd.DataFrame): Rows with 'Insight' and 'Year' (and 'Source URL').
+        category (str): Category the rows were exported under; it becomes the
+            'Metric Category' (None = derived from the metric).
+        default_country (str): Country of rows that name none (e.g. the
+            partition's country; None = left empty).
+
+    Returns:
+        pd.DataFrame: STRUCTURED_COLUMNS plus 'Confidence' (0-1) per row, same index.
+    """
+    insights = df["Insight"].fillna("").astype(str)
+    years = df["Year"].fillna("").astype(str)
+    values = extract_values(insights)
+    periods = extract_periods(years).fillna(extract_periods(insights))
+    metrics = extract_metrics(insights)
+    brands = _find_alias(insights, _BRAND_PATTERNS, BRAND_LOOKUP)
+    countries = _find_alias(insights, _COUNTRY_PATTERNS, COUNTRY_LOOKUP)
+
+    value_score = np.where(values["strong"], WEIGHTS["value"],
+                           np.where(values["value"].notna(), BARE_NUMBER_WEIGHT, 0.0))
+    confidence = (
+        value_score
+        + WEIGHTS["metric"] * metrics.notna()
+        + WEIGHTS["year"] * periods.notna()
+        + WEIGHTS["brand"] * brands.notna()
+        - AMBIGUITY_PENALTY * values["ambiguous"]
+    ).clip(0, 1)
+
+    parsed = pd.DataFrame(index=df.index)
+    parsed["Source URL"] = df["Source URL"] if "Source URL" in df.columns else ""
+    parsed["Insight"] = insights
+    parsed["Summary"] = insights.str.strip()
+    parsed["Year"] = periods.fillna(years)
+    parsed["Brand"] = brands
+    parsed["Metric"] = metrics
+    parsed["Metric Category"] = category if category else metrics.map(METRIC_CATEGORIES)
+    parsed["Value"] = values["value"].map(_format_number, na_action="ignore")
+    parsed["Unit"] = values["unit"]
+    parsed["Country"] = countries.fillna(default_country) if default_country else countries
+    parsed["Confidence"] = confidence.round(2)
+    return parsed[STRUCTURED_COLUMNS + ["Confidence"]]
+
+
+def confident_rows(parsed, min_confidence=KPI_PARSER_MIN_CONFIDENCE):
+    """Mask of the parse_insights rows that can skip the LLM: confident enough and with every REQUIRED_COLUMNS part."""
+    return (parsed["Confidence"] >= min_confidence) & parsed[REQUIRED_COLUMNS].notna().all(axis=1)
+
+
+if __name__ == "__main__":
+    # python kpi_parser.py filtered_exports/Total_Sales_Performance.csv -> parsed rows and confidence
+    for path in sys.argv[1:]:
+        df = pd.read_csv(path, dtype=str, keep_default_na=False)
+        category = os.path.splitext(os.path.basename(path))[0].replace("_", " ")
+        parsed = parse_insights(df, category)
+        confident = confident_rows(parsed)
+        print(f"{path}: {confident.sum()}/{len(parsed)} rows at or above confidence {KPI_PARSER_MIN_CONFIDENCE}")
+        with pd.option_context("display.max_colwidth", 40, "display.width", 200):
+            print(parsed[["Insight", "Year", "Brand", "Metric", "Value", "Unit", "Country", "Confidence"]].to_string())
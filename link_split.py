@@ -1,32 +1,39 @@
 # json_link_extractor.py
 
+import sys
 import json
+from sharding import SHARD_BY, split_links_file
 
 def extract_links_range(
     input_json_path: str,
     output_json_path: str = "India_links_150_250.json",
     start: int = 0,
-    end: int = 100
+    end: int = 100,
+    country: str = "Germany"
 ) -> None:
     """
-    Extracts links from the 'Germany' key in a JSON file, from index `start` to `end`,
+    Extracts links from the `country` key in a JSON file, from index `start` to `end`,
     and saves them into a new JSON file.
 
+    For splitting work between several workers use sharding.py instead
+    (SHARD_COUNT / SHARD_INDEX in main.py, or `python link_split.py <file> <shards>`).
+
     Parameters:
         input_json_path (str): Path to the original JSON file.
         output_json_path (str): Path to save the sliced JSON file.
         start (int): Starting index (inclusive).
         end (int): Ending index (exclusive).
+        country (str): Key of the country whose links are sliced.
     """
     try:
         with open(input_json_path, "r") as infile:
             data = json.load(infile)
 
-        if "Germany" not in data or not isinstance(data["Germany"], list):
-            raise ValueError("The 'Germany' key is missing or is not a list.")
+        if country not in data or not isinstance(data[country], list):
+            raise ValueError(f"The '{country}' key is missing or is not a list.")
 
-        sliced_links = data["Germany"][start:end]
-        output_data = {"Germany": sliced_links}
+        sliced_links = data[country][start:end]
+        output_data = {country: sliced_links}
 
         with open(output_json_path, "w") as outfile:
             json.dump(output_data, outfile, indent=4)
@@ -36,4 +43,8 @@ def extract_links_range(
     except Exception as e:
         print(f"❌ Error: {e}")
 
-extract_links_range("i4.json")
\ No newline at end of file
+if __name__ == "__main__":
+    # python link_split.py i4.json 4 [hash|domain] -> shards/i4_shard0of4.json ...
+    input_file = sys.argv[1] if len(sys.argv) > 1 else "i4.json"
+    shard_count = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    split_links_file(input_file, shard_count, sys.argv[3] if len(sys.argv) > 3 else SHARD_BY)
\ No newline at end of file
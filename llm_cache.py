@@ -0,0 +1,113 @@
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", ".llm_cache.sqlite")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "200000"))
+LLM_CACHE_MAX_AGE_DAYS = float(os.getenv("LLM_CACHE_MAX_AGE_DAYS", "90"))
+LLM_CACHE_BYPASS = os.getenv("LLM_CACHE_BYPASS", "0") == "1"   # ignore cached replies, store fresh ones
+
+# Eviction runs every N writes instead of on every write
+EVICT_EVERY = 200
+
+
+def prompt_key(model, prompt):
+    """Cache key for one request: hash of the model name and the full prompt."""
+    return hashlib.sha256(f"{model}\n{prompt}".encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    Persistent cache of LLM replies keyed by model + prompt hash.
+
+    Backed by SQLite in WAL mode behind a lock, so async tasks, threads and
+    several worker processes can read and write it at the same time.
+
+    Args:
+        path (str): SQLite file holding the cache.
+        max_entries (int): Oldest replies are dropped beyond this many rows.
+        max_age_days (float): Replies older than this are dropped.
+        bypass (bool): Skip lookups (always call the model) but still store the new replies.
+    """
+    def __init__(self, path=LLM_CACHE_PATH, max_entries=LLM_CACHE_MAX_ENTRIES,
+                 max_age_days=LLM_CACHE_MAX_AGE_DAYS, bypass=LLM_CACHE_BYPASS):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age_days * 86400
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS replies (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                reply TEXT,
+                created_at REAL,
+                last_access REAL
+            )
+        """)
+        self._db.commit()
+
+    def get(self, model, prompt):
+        """Returns the cached reply or None. Counts a miss when bypassed."""
+        if self.bypass:
+            self.misses += 1
+            return None
+        key = prompt_key(model, prompt)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT reply, created_at FROM replies WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or time.time() - row[1] > self.max_age:
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE replies SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+        self.hits += 1
+        return row[0]
+
+    def put(self, model, prompt, reply):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO replies VALUES (?, ?, ?, ?, ?)",
+                (prompt_key(model, prompt), model, reply, now, now)
+            )
+            self._db.commit()
+            self._writes += 1
+            if self._writes % EVICT_EVERY == 0:
+                self._evict()
+
+    def _evict(self):
+        """Drops expired replies, then the least recently used ones above `max_entries`."""
+        self._db.execute("DELETE FROM replies WHERE created_at < ?", (time.time() - self.max_age,))
+        self._db.execute("""
+            DELETE FROM replies WHERE key IN (
+                SELECT key FROM replies ORDER BY last_access DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.max_entries,))
+        self._db.commit()
+
+    def stats(self):
+        total = self.hits + self.misses
+        rate = (self.hits / total * 100) if total else 0.0
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": round(rate, 1)}
+
+    def report(self):
+        s = self.stats()
+        print(f"[CACHE] LLM cache: {s['hits']} hits, {s['misses']} misses ({s['hit_rate']}% hit rate)")
+
+    def close(self):
+        with self._lock:
+            self._evict()
+            self._db.close()
@@ -0,0 +1,203 @@
+import os
+import time
+import random
+import asyncio
+import aiohttp
+import openai
+import requests
+from dotenv import load_dotenv
+from llm_cache import LLMCache
+from rate_limiter import get_limiter
+
+try:
+    import tiktoken
+except ImportError:  # token counts fall back to a characters/4 estimate
+    tiktoken = None
+
+# Load environment variables
+load_dotenv()
+openai.api_key = os.getenv("OPENAI_API_KEY")
+
+# One cache shared by every caller in the process, opened on first use
+_cache = None
+_hook_installed = False
+
+MAX_RETRIES = 6
+EXPECTED_REPLY_TOKENS = 600   # reply size assumed when reserving tokens-per-minute budget
+RETRYABLE_ERRORS = (
+    openai.error.APIError,
+    openai.error.Timeout,
+    openai.error.TryAgain,
+    openai.error.APIConnectionError,
+    openai.error.ServiceUnavailableError,
+)
+
+
+def get_llm_cache():
+    global _cache
+    if _cache is None:
+        _cache = LLMCache()
+    return _cache
+
+
+_encodings = {}
+
+
+def count_tokens(text, model="gpt-4o-mini"):
+    """Number of tokens `text` uses for `model` (estimated when tiktoken is missing)."""
+    if tiktoken is not None and model not in _encodings:
+        try:
+            try:
+                _encodings[model] = tiktoken.encoding_for_model(model)
+            except KeyError:
+                _encodings[model] = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            # tiktoken downloads its encodings on first use, which fails offline
+            print(f"[WARN] Could not load tokenizer for {model}, estimating token counts: {e}")
+            _encodings[model] = None
+    encoding = _encodings.get(model) if tiktoken is not None else None
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def _is_valid(validate, reply):
+    try:
+        validate(reply)
+        return True
+    except Exception:
+        return False
+
+
+def _reply_text(response):
+    return response['choices'][0]['message']['content'].strip()
+
+
+def _estimated_tokens(prompt, model, kwargs):
+    return count_tokens(prompt, model) + kwargs.get("max_tokens", EXPECTED_REPLY_TOKENS)
+
+
+def _used_tokens(response):
+    usage = response.get("usage") or {}
+    return usage.get("total_tokens")
+
+
+def _retry_delay(limiter, error, attempt):
+    """
+    Decides what to do after a failed call: returns seconds to sleep before
+    the next attempt, or re-raises when the error is not worth retrying.
+    """
+    if attempt >= MAX_RETRIES:
+        raise error
+    if isinstance(error, openai.error.RateLimitError):
+        if getattr(error, "code", None) == "insufficient_quota":
+            raise error
+        # The limiter pauses every caller until the retry-after hint has passed
+        limiter.on_rate_limited(getattr(error, "headers", None))
+        return 0
+    if isinstance(error, RETRYABLE_ERRORS):
+        delay = min(60, 2 ** attempt + random.uniform(0, 1))
+        print(f"[RETRY] {error}. Retrying in {delay:.1f}s (attempt {attempt + 1}/{MAX_RETRIES})...")
+        return delay
+    raise error
+
+
+def _install_header_hook():
+    """Feeds the x-ratelimit-* headers of every blocking OpenAI response to the shared limiter."""
+    global _hook_installed
+    if _hook_installed:
+        return
+    _hook_installed = True
+    session = requests.Session()
+    limiter = get_limiter("openai")
+    session.hooks["response"].append(lambda response, *args, **kwargs: limiter.update_from_headers(response.headers))
+    openai.requestssession = session
+
+
+def _header_trace(limiter):
+    """aiohttp trace that feeds the x-ratelimit-* headers of every async OpenAI response to the limiter."""
+    async def on_request_end(session, context, params):
+        limiter.update_from_headers(params.response.headers)
+    trace = aiohttp.TraceConfig()
+    trace.on_request_end.append(on_request_end)
+    return trace
+
+
+def chat_completion(prompt, model, validate=None, **kwargs):
+    """
+    Blocking single-prompt chat call that goes through the LLM cache and the
+    shared OpenAI rate limiter. Rate limits, timeouts and server errors are
+    retried; other errors are raised.
+
+    Args:
+        prompt (str): User message sent to the model.
+        model (str): OpenAI model name.
+        validate (callable): Optional check (e.g. json.loads); replies that fail it are not cached.
+        **kwargs: Passed on to openai.ChatCompletion.create.
+
+    Returns:
+        str: The stripped reply text.
+    """
+    cache = get_llm_cache()
+    cached = cache.get(model, prompt)
+    if cached is not None:
+        return cached
+    _install_header_hook()
+    limiter = get_limiter("openai")
+    estimated = _estimated_tokens(prompt, model, kwargs)
+    attempt = 0
+    while True:
+        limiter.acquire_sync(estimated)
+        try:
+            response = openai.ChatCompletion.create(
+                model=model,
+                messages=[{"role": "user", "content": prompt}],
+                **kwargs
+            )
+        except Exception as e:
+            limiter.release(estimated, success=False)
+            time.sleep(_retry_delay(limiter, e, attempt))
+            attempt += 1
+            continue
+        limiter.release(estimated, _used_tokens(response))
+        break
+    reply = _reply_text(response)
+    if validate is None or _is_valid(validate, reply):
+        cache.put(model, prompt, reply)
+    return reply
+
+
+async def achat_completion(prompt, model, validate=None, **kwargs):
+    """Async version of chat_completion."""
+    cache = get_llm_cache()
+    cached = cache.get(model, prompt)
+    if cached is not None:
+        return cached
+    limiter = get_limiter("openai")
+    estimated = _estimated_tokens(prompt, model, kwargs)
+    attempt = 0
+    while True:
+        await limiter.acquire(estimated)
+        try:
+            # openai opens a session per async request anyway; this one also reports the headers
+            async with aiohttp.ClientSession(trace_configs=[_header_trace(limiter)]) as session:
+                token = openai.aiosession.set(session)
+                try:
+                    response = await openai.ChatCompletion.acreate(
+                        model=model,
+                        messages=[{"role": "user", "content": prompt}],
+                        **kwargs
+                    )
+                finally:
+                    openai.aiosession.reset(token)
+        except Exception as e:
+            limiter.release(estimated, success=False)
+            await asyncio.sleep(_retry_delay(limiter, e, attempt))
+            attempt += 1
+            continue
+        limiter.release(estimated, _used_tokens(response))
+        break
+    reply = _reply_text(response)
+    if validate is None or _is_valid(validate, reply):
+        cache.put(model, prompt, reply)
+    return reply
@@ -2,26 +2,68 @@
 import asyncio
 import openai
 import json
-import csv
 import os
-from bs4 import BeautifulSoup
+import glob
+import socket
+from text_cleaning import clean_text
 from dotenv import load_dotenv
 from crawl4ai import AsyncWebCrawler 
-from category_filter import export_category_data
-from category_cleaning import process_csv 
+from category_filter import export_categories
+from category_cleaning import process_csv, process_store
 from manual_clean import clean_csv 
-from final_combine import combine_and_deduplicate_csv
+from final_combine import combine_and_deduplicate_csv, combine_and_deduplicate_store
+from final_dataset import FINAL_DATASET, merge_into_final_dataset
+from pipeline import DomainThrottle, FetchFailed, get_domain, run_pipeline
+from page_cache import PageCache
+from url_index import URLIndex
+from boilerplate import BoilerplateStore
+from pdf_documents import PdfReader, fetch_pdf, is_pdf_url
+from sharding import SHARD_BY, SHARD_COUNT, SHARD_INDEX, mark_shard_done, merge_csv_files, merge_shard_outputs, select_shard, shard_path
+from job_queue import JobQueue, run_workers, worker_path
+from output_writer import InsightWriter
+from insight_store import INSIGHT_STORE, RUN_ID, InsightStore
+from llm_client import achat_completion, count_tokens, get_llm_cache
+from chunking import chunk_budget, chunk_text
+from relevance import RelevanceFilter
 # Load environment variables
 load_dotenv()
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
-# Create or reset CSV file with headers
-with open("insights_output.csv", "w", newline='', encoding='utf-8') as csvfile:
-    writer = csv.writer(csvfile)
-    writer.writerow(["Source URL", "Category", "Insight", "Year"])
+# Crawl concurrency settings
+MAX_CONCURRENT_CRAWLS = int(os.getenv("MAX_CONCURRENT_CRAWLS", "8"))          # pages in flight at once
+MAX_CRAWLS_PER_DOMAIN = int(os.getenv("MAX_CRAWLS_PER_DOMAIN", "2"))          # politeness: parallel hits per host
+DOMAIN_DELAY_SECONDS = float(os.getenv("DOMAIN_DELAY_SECONDS", "1.0"))        # politeness: gap between hits per host
+MAX_CONCURRENT_EXTRACTIONS = int(os.getenv("MAX_CONCURRENT_EXTRACTIONS", "4"))  # chunks being sent to the LLM at once
+MAX_CLEAN_WORKERS = int(os.getenv("MAX_CLEAN_WORKERS", "2"))                  # pages being cleaned at once
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "0"))                              # 0 = one process, N = N worker processes
+JOB_WORKER_ID = os.getenv("JOB_WORKER_ID")                                    # set inside the worker processes
+MODEL = "gpt-4o-mini"
+LINKS_FILE = os.getenv("LINKS_FILE", "Germany_links_0_100.json")
+INSIGHTS_CSV = "insights_output.csv"
+INSIGHTS_TXT = "insights_output.txt"
+INSIGHTS_HEADER = ["Source URL", "Category", "Insight", "Year"]
+# Each shard writes its own files; they are merged into INSIGHTS_CSV when all shards are done
+SHARD_CSV = shard_path(INSIGHTS_CSV)
+SHARD_TXT = shard_path(INSIGHTS_TXT)
+# Worker processes write to their own files, collected into the shard files when all workers exit
+OUTPUT_CSV = SHARD_CSV if JOB_WORKER_ID is None else worker_path(SHARD_CSV, JOB_WORKER_ID)
+OUTPUT_TXT = SHARD_TXT if JOB_WORKER_ID is None else worker_path(SHARD_TXT, JOB_WORKER_ID)
+# Structured category files written by category_cleaning.py
+CLEANED_DIR = "cleaned_category"
+FINAL_OUTPUT = os.getenv(
+    "FINAL_OUTPUT", f"Final_Data/FMCG_{os.path.splitext(os.path.basename(LINKS_FILE))[0]}.csv"
+)
+
+# Shared record of which links were already processed, across countries and runs
+url_index = URLIndex()
+
+# Buffered writer for OUTPUT_CSV / OUTPUT_TXT, opened by main(). The CSV is kept
+# between runs: links already processed are skipped via the URL index, so
+# their rows must stay in the file.
+insight_writer = None
 
 # Load links from JSON file
-def load_links_from_json(filepath="Germany_links_0_100.json"):
+def load_links_from_json(filepath=LINKS_FILE):
     with open(filepath, "r") as f:
         data = json.load(f)
     all_links = []
@@ -32,15 +74,14 @@ def load_links_from_json(filepath="Germany_links_0_100.json"):
 
 # Pre-clean HTML content
 def pre_clean_html(raw_html):
-    soup = BeautifulSoup(raw_html, "html.parser")
-    for tag in soup(["nav", "footer", "aside", "script", "style"]):
-        tag.decompose()
-    text = soup.get_text(separator="\n")
-    return "\n".join(line.strip() for line in text.splitlines() if line.strip())
+    # Markdown takes a line-based fast path; HTML is parsed with lxml (process pool for big pages)
+    return clean_text(raw_html)
 
-# Split long content into chunks
-def split_text(text, chunk_size=5000):
-    return [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+# Split long content into token-sized chunks that keep sentences, headings and tables whole
+def split_text(text, max_tokens=None):
+    if max_tokens is None:
+        max_tokens = chunk_budget(MODEL, count_tokens(build_prompt(""), MODEL))
+    return chunk_text(text, max_tokens, model=MODEL)
 
 # Prompt for extracting insights
 def build_prompt(text):
@@ -84,74 +125,233 @@ Now analyze and extract from the following content:
 # Call OpenAI API to extract insights
 async def extract_insights_from_chunk(text_chunk):
     prompt = build_prompt(text_chunk)
-    response = await openai.ChatCompletion.acreate(
-        model="gpt-4o-mini",
-        # model="gpt-4o",
-        messages=[{"role": "user", "content": prompt}]
+    # Identical prompts are answered from the local LLM cache
+    return await achat_completion(
+        prompt,
+        model=MODEL,
+        validate=json.loads
     )
-    return response['choices'][0]['message']['content'].strip()
 
-# Save extracted insights to CSV and TXT
-async def save_insights(insights_json: str, url: str):
-    # Save raw to TXT
-    with open("insights_output.txt", "a", encoding='utf-8') as f:
-        f.write(f"\n[Source] {url}\n{insights_json}\n{'-'*80}\n")
+# Queue extracted insights for the CSV and TXT; on_flushed runs once they are on disk
+async def save_insights(insights_json: str, url: str, on_flushed=None):
+    # Raw reply for the TXT
+    text = f"\n[Source] {url}\n{insights_json}\n{'-'*80}\n"
 
-    # Parse and save to CSV
+    # Parse into CSV rows
+    rows = []
     try:
         data = json.loads(insights_json)
-        with open("insights_output.csv", "a", newline='', encoding='utf-8') as csvfile:
-            writer = csv.writer(csvfile)
-            for category, insights in data.items():
-                for item in insights:
-                    if isinstance(item, dict):
-                        insight_text = item.get("insight", "")
-                        year = item.get("year", "")
-                    else:
-                        insight_text = item
-                        year = ""
-                    writer.writerow([url, category, insight_text, year])
+        for category, insights in data.items():
+            for item in insights:
+                if isinstance(item, dict):
+                    insight_text = item.get("insight", "")
+                    year = item.get("year", "")
+                else:
+                    insight_text = item
+                    year = ""
+                rows.append([url, category, insight_text, year])
     except Exception as e:
         print(f"[WARN] Could not parse insights JSON from {url}: {e}")
+    insight_writer.write(rows, text, on_flushed)
+
+# Crawl a single page under the per-domain politeness limits, reusing the page cache when possible
+async def crawl_page(crawler, url, throttle, cache, index=None, boilerplate=None):
+    failure = None
+
+    async def fetch(url):
+        nonlocal failure
+        domain = get_domain(url)
+        await throttle.acquire(domain)
+        try:
+            # PDFs are streamed to disk and only their KPI pages are kept (needs pypdf)
+            if PdfReader is not None and is_pdf_url(url):
+                return await fetch_pdf(url)
+            result = await crawler.arun(url=url)
+        finally:
+            throttle.release(domain)
+        if not result.success or not result.markdown:
+            failure = getattr(result, "error_message", None) or "crawler returned no content"
+        return result.markdown, getattr(result, "response_headers", None)
+
+    markdown = await cache.fetch(url, fetch)
+    # Failed crawls and offline cache misses stay unprocessed, so a later run tries them again
+    if markdown is None and cache.offline:
+        return FetchFailed("not in the page cache (offline mode)")
+    if failure is not None:
+        return FetchFailed(failure)
+    # The same document reached through another URL or host was already extracted
+    if markdown and index is not None and not index.claim_content(url, markdown):
+        return None
+    # Menus, cookie notices and sidebars this website repeats on every page cost tokens on every chunk
+    if markdown and boilerplate is not None:
+        markdown = boilerplate.strip(url, markdown)
+    return markdown
+
+# Merge the replies of all chunks of one URL and save them
+async def write_page(url, results):
+    all_insights = {}
+    for chunk_index, insights in results:
+        if not insights:
+            continue
+        # Merge JSON results if multiple chunks
+        try:
+            chunk_data = json.loads(insights)
+            for cat, val in chunk_data.items():
+                if cat not in all_insights:
+                    all_insights[cat] = []
+                all_insights[cat].extend(val)
+        except Exception as e:
+            print(f"[ERROR] Parsing chunk failed: {e}")
+
+    # Save all insights for this URL
+    final_json = json.dumps(all_insights, indent=2)
+    await save_insights(final_json, url)
+
+# Links of this shard that still need work
+def load_pending_links():
+    # Links processed in earlier runs or listed twice (tracking params, www., http/https) are skipped
+    links = select_shard(load_links_from_json(), SHARD_INDEX, SHARD_COUNT, SHARD_BY)
+    links = url_index.pending(links, os.path.basename(LINKS_FILE))
+    print(f"[INFO] Shard {SHARD_INDEX + 1}/{SHARD_COUNT}: {len(links)} links to process")
+    return links
 
 # Main logic
-async def main():
-    links = load_links_from_json()
+async def main(links=None, done_fn=None):
+    global insight_writer
+    if links is None:
+        links = load_pending_links()
+    throttle = DomainThrottle(MAX_CRAWLS_PER_DOMAIN, DOMAIN_DELAY_SECONDS)
+    workers = {
+        "crawl": MAX_CONCURRENT_CRAWLS,
+        "clean": MAX_CLEAN_WORKERS,
+        "extract": MAX_CONCURRENT_EXTRACTIONS,
+    }
+    cache = PageCache()
+    boilerplate = BoilerplateStore()
+    insight_writer = InsightWriter(OUTPUT_CSV, OUTPUT_TXT, INSIGHTS_HEADER)
+    # Chunks without KPI signals (menus, cookie banners, history) never reach the model
+    relevance = RelevanceFilter(model=MODEL, prompt_overhead=count_tokens(build_prompt(""), MODEL))
+
+    def url_done(url, error):
+        # Written pages, and pages with nothing to extract (duplicate content or every chunk filtered out),
+        # count as processed once everything written before them is flushed to disk. Failed fetches and
+        # pages the model failed on come with an error and stay pending for the next run
+        if error is None:
+            insight_writer.after_flush(lambda: url_index.mark_processed(url))
+        if done_fn is not None:
+            done_fn(url, error)
+
     async with AsyncWebCrawler() as crawler:
-        for idx, (country, url) in enumerate(links):
-            try:
-                print(f"[INFO] ({idx+1}/{len(links)}) Crawling: {url}")
-                result = await crawler.arun(url=url)
-                raw_text = result.markdown
-                clean_text = pre_clean_html(raw_text)
-                limited_text = clean_text[:15000]
-                chunks = split_text(limited_text, chunk_size=5000)
-
-                all_insights = {}
-                for i, chunk in enumerate(chunks):
-                    print(f"  [INFO] Processing chunk {i+1}/{len(chunks)}")
-                    insights = await extract_insights_from_chunk(chunk)
-
-                    # Merge JSON results if multiple chunks
-                    try:
-                        chunk_data = json.loads(insights)
-                        for cat, val in chunk_data.items():
-                            if cat not in all_insights:
-                                all_insights[cat] = []
-                            all_insights[cat].extend(val)
-                    except Exception as e:
-                        print(f"[ERROR] Parsing chunk failed: {e}")
-
-                # Save all insights for this URL
-                final_json = json.dumps(all_insights, indent=2)
-                await save_insights(final_json, url)
-
-            except Exception as e:
-                print(f"[ERROR] Failed for {url}: {e}")
+        async def crawl(url):
+            return await crawl_page(crawler, url, throttle, cache, url_index, boilerplate)
+
+        await run_pipeline(
+            links,
+            crawl_fn=crawl,
+            clean_fn=pre_clean_html,
+            chunk_fn=split_text,
+            extract_fn=extract_insights_from_chunk,
+            write_fn=write_page,
+            workers=workers,
+            chunk_filter=relevance.keep,
+            done_fn=url_done,
+        )
+    # Flushes the last batch and runs its callbacks (URL index, job acks)
+    insight_writer.close()
+    cache.close()
+    boilerplate.report()
+    boilerplate.close()
+    get_llm_cache().report()
+    relevance.report()
+    url_index.report()
+
+# One job queue per links file and shard
+def job_queue():
+    return JobQueue(os.path.basename(shard_path(LINKS_FILE)))
+
+# Hands out leased links until no job is pending or leased by anyone
+async def lease_links(queue, owner, in_flight):
+    while True:
+        job = queue.lease(owner)
+        if job is None:
+            if queue.unfinished() == 0:
+                return
+            # Other workers still hold leases; wait in case one of them dies
+            await asyncio.sleep(5)
+            continue
+        job_id, payload = job
+        country, url = json.loads(payload)
+        in_flight[url] = job_id
+        yield country, url
+
+# One worker process: runs the pipeline on links leased from the shared job queue
+async def run_worker(worker_id):
+    queue = job_queue()
+    owner = f"{socket.gethostname()}-{os.getpid()}"
+    in_flight = {}
+
+    async def renew_leases():
+        while True:
+            await asyncio.sleep(queue.lease_seconds / 3)
+            queue.renew(list(in_flight.values()), owner)
+
+    def done(url, error):
+        job_id = in_flight.pop(url, None)
+        if job_id is None:
+            return
+        # Failed fetches and extractions are retried by a later lease, up to JOB_MAX_ATTEMPTS
+        queue.settle(job_id, owner, error, insight_writer.after_flush)
+
+    renewer = asyncio.create_task(renew_leases())
+    try:
+        await main(lease_links(queue, owner, in_flight), done)
+    finally:
+        renewer.cancel()
+        queue.close()
+
+def worker_main(worker_id):
+    asyncio.run(run_worker(worker_id))
+
+# Enqueues the pending links, runs JOB_WORKERS processes on them and collects their output files
+def run_job_workers():
+    queue = job_queue()
+    added = queue.enqueue(json.dumps([country, url]) for country, url in load_pending_links())
+    print(f"[QUEUE] {added} new jobs, starting {JOB_WORKERS} workers")
+    run_workers(worker_main, JOB_WORKERS)
+    queue.report()
+    queue.close()
+    worker_csvs = glob.glob(worker_path(SHARD_CSV, "*"))
+    merge_csv_files(worker_csvs, SHARD_CSV)
+    worker_txts = glob.glob(worker_path(SHARD_TXT, "*"))
+    with open(SHARD_TXT, "a", encoding='utf-8') as out:
+        for path in worker_txts:
+            with open(path, "r", encoding='utf-8') as f:
+                out.write(f.read())
+    for path in worker_csvs + worker_txts:
+        os.remove(path)
+
+# Cleaning steps on the Parquet insight store: one parse of the insights CSV,
+# then every stage reads only its run, category and columns
+def run_store_stages(input_csv_file, categories, run=RUN_ID):
+    store = InsightStore()
+    countries = {url: country for country, url in load_links_from_json()}
+    store.import_csv(input_csv_file, countries, run)
+    process_store(store, categories, run)
+    combined = combine_and_deduplicate_store(store, FINAL_OUTPUT, run)
+    if FINAL_DATASET and combined is not None:
+        merge_into_final_dataset(combined, FINAL_OUTPUT)
 
 if __name__ == "__main__":
-    asyncio.run(main())  
-    input_csv_file = "insights_output.csv"
+    if JOB_WORKERS > 0:
+        run_job_workers()
+    else:
+        asyncio.run(main())  
+    if SHARD_COUNT > 1:
+        mark_shard_done(INSIGHTS_CSV)
+        # The last shard to finish merges all shard outputs and runs the cleaning steps
+        if not merge_shard_outputs(INSIGHTS_CSV, SHARD_COUNT):
+            raise SystemExit(0)
+    input_csv_file = INSIGHTS_CSV
 
     # List of categories to process
     categories = [
@@ -166,21 +366,25 @@ if __name__ == "__main__":
         "Dealer Stock",
         "Brand-wise Sales"
     ]
+    if INSIGHT_STORE:
+        run_store_stages(input_csv_file, categories)
+        raise SystemExit(0)
 
-    # Loop through all categories and export their data
-    for category in categories:
-        export_category_data(input_csv_file, category)
-    print(f"[INFO] Exported data for category: {category}")
+    # One pass over the insights exports every category (CATEGORY_INCREMENTAL=1: only rows added since last time)
+    export_categories(input_csv_file, categories)
+    print(f"[INFO] Exported data for {len(categories)} categories")
     process_csv()
-    OUTPUT_CSV = "cleaned_category"
     # ## Clean each output CSV file individually ##
-    for filename in os.listdir(OUTPUT_CSV):
+    for filename in os.listdir(CLEANED_DIR):
         if filename.endswith(".csv"):
-            output_file_path = os.path.join(OUTPUT_CSV, filename)
+            output_file_path = os.path.join(CLEANED_DIR, filename)
             print(f"[INFO] Cleaning file: {filename}")
             clean_csv(output_file_path)
     
-    combine_and_deduplicate_csv(
-    folder_path="cleaned_category",
-    output_file="Final_Data/FMCG_India_250.csv" #change name for each country (e.g. FMCG_India_0-250.csv, FMCG_Germany_0-100.csv, etc.
-    )
\ No newline at end of file
+    combined = combine_and_deduplicate_csv(
+    folder_path=CLEANED_DIR,
+    output_file=FINAL_OUTPUT # named after LINKS_FILE, e.g. Final_Data/FMCG_Germany_links_0_100.csv
+    )
+    # Only the facts not yet in the all-country dataset are appended to it
+    if FINAL_DATASET and combined is not None:
+        merge_into_final_dataset(combined, FINAL_OUTPUT)
\ No newline at end of file
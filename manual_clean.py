@@ -1,12 +1,38 @@
 import pandas as pd
+from value_normalization import normalize_values
 
-def clean_csv(input_file):
+def clean_frame(df):
     """
-    Cleans the CSV file by removing rows where:
+    Cleans structured insight rows by removing rows where:
     - The 'Brand' column is empty or NaN.
-    - The 'Value' column contains null, empty, or text values.
+    - The 'Value' column holds no number at all.
     - If 'Country' is empty, replace it with 'India'.
-    Saves the cleaned DataFrame back to the same file.
+    Values like '₹5000 Cr', '$6.83B' or '12%' are kept: they are parsed into
+    the canonical 'Value Num', 'Currency', 'Is Percent' and 'Value USD'
+    columns (see value_normalization.py). Rows from the insight store
+    already carry these columns and are not parsed again.
+
+    Args:
+        df (pd.DataFrame): Rows with at least Brand, Value and Country.
+
+    Returns:
+        pd.DataFrame: The cleaned rows.
+    """
+    # Replace empty 'Country' values with 'India'
+    df['Country'] = df['Country'].replace('', pd.NA).fillna('India')
+
+    # Remove rows where the 'Brand' column is empty or NaN
+    df_cleaned = df[df['Brand'].notna() & (df['Brand'] != '')]
+
+    # Parse the values into canonical numeric columns, then remove rows without a number
+    if 'Value Num' not in df_cleaned.columns:
+        df_cleaned = normalize_values(df_cleaned)
+    return df_cleaned[df_cleaned['Value Num'].notna()]
+
+def clean_csv(input_file):
+    """
+    Cleans the CSV file with `clean_frame` and saves the cleaned DataFrame
+    back to the same file.
 
     Args:
         input_file (str): The path to the CSV file to clean.
@@ -15,15 +41,7 @@ def clean_csv(input_file):
         # Load the CSV file into a DataFrame
         df = pd.read_csv(input_file)
 
-        # Replace empty 'Country' values with 'India'
-        df['Country'] = df['Country'].fillna('India')
-
-        # Remove rows where the 'Brand' column is empty or NaN
-        df_cleaned = df[df['Brand'].notna() & (df['Brand'] != '')]
-
-        # Remove rows where the 'Value' column is null, empty, or contains text
-        df_cleaned = df_cleaned[df_cleaned['Value'].notna() & (df_cleaned['Value'] != '')]
-        df_cleaned = df_cleaned[pd.to_numeric(df_cleaned['Value'], errors='coerce').notna()]
+        df_cleaned = clean_frame(df)
 
         # Save the cleaned DataFrame back to the same CSV file
         df_cleaned.to_csv(input_file, index=False)
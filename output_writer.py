@@ -0,0 +1,171 @@
+import io
+import os
+import csv
+import json
+import time
+import queue
+import threading
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+WRITER_FLUSH_ROWS = int(os.getenv("WRITER_FLUSH_ROWS", "200"))          # flush once this many rows are waiting
+WRITER_FLUSH_SECONDS = float(os.getenv("WRITER_FLUSH_SECONDS", "5"))    # ... or this long after the first one
+
+# Marks the end of the writer queue
+_CLOSE = object()
+
+
+class InsightWriter:
+    """
+    Buffers insight rows (and the raw reply log) in memory and appends them
+    to disk from one background thread, in batches.
+
+    `write` never blocks the event loop: it only puts the rows on a queue.
+    The thread flushes when `flush_rows` rows are waiting or `flush_seconds`
+    after the first one arrived. Every flush is written in one go and
+    fsynced, and the committed file sizes are recorded next to the files,
+    starting with the sizes found on open; if the process dies mid-flush,
+    the next writer on the same files cuts them back to the last committed
+    size, and a flush that fails is cut back right away, so a batch is
+    either fully on disk or not at all.
+
+    Callbacks given to `write` / `after_flush` run on the writer thread
+    once everything submitted before them is on disk, e.g. to mark a URL
+    as processed only after its rows are safe.
+
+    Args:
+        csv_path (str): CSV file the rows are appended to.
+        txt_path (str): Optional text log appended alongside.
+        header (list): CSV header, written up front when the file is new or empty.
+        flush_rows (int): Rows that trigger a flush.
+        flush_seconds (float): Longest time a row waits in memory.
+    """
+    def __init__(self, csv_path, txt_path=None, header=None,
+                 flush_rows=WRITER_FLUSH_ROWS, flush_seconds=WRITER_FLUSH_SECONDS):
+        self.csv_path = csv_path
+        self.txt_path = txt_path
+        self.header = header
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.commit_path = csv_path + ".committed"
+        self.rows_written = 0
+        self.flushes = 0
+        self._inbox = queue.Queue()
+        self._recover()
+        if header and (not os.path.exists(csv_path) or os.path.getsize(csv_path) == 0):
+            self._append(csv_path, self._encode([header]))
+        # Committed before the first flush, so a crash during it is recovered as well
+        self._committed = self._commit()
+        self._thread = threading.Thread(target=self._run, name="insight-writer", daemon=True)
+        self._thread.start()
+
+    def _paths(self):
+        return [path for path in (self.csv_path, self.txt_path) if path]
+
+    def _recover(self):
+        """Cuts the files back to their last committed size after a crash during a flush."""
+        if not os.path.exists(self.commit_path):
+            return
+        with open(self.commit_path, "r") as f:
+            sizes = json.load(f)
+        self._truncate(sizes, "has a partial batch from an interrupted run")
+
+    def _truncate(self, sizes, reason):
+        for path in self._paths():
+            size = sizes.get(path)
+            if size is not None and os.path.exists(path) and os.path.getsize(path) > size:
+                print(f"[WRITER] {path} {reason}, truncating it")
+                with open(path, "r+b") as f:
+                    f.truncate(size)
+
+    def write(self, rows, text=None, on_flushed=None):
+        """Queues CSV rows (and an optional text block) for the next flush."""
+        self._inbox.put((rows, text, on_flushed))
+
+    def after_flush(self, callback):
+        """Runs `callback` once everything written so far is on disk."""
+        self._inbox.put(([], None, callback))
+
+    def _run(self):
+        rows, texts, callbacks = [], [], []
+        deadline = None
+        closing = False
+        while not closing:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._inbox.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is _CLOSE:
+                closing = True
+            elif item is not None:
+                item_rows, text, callback = item
+                rows.extend(item_rows)
+                if text:
+                    texts.append(text)
+                if callback:
+                    callbacks.append(callback)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_seconds
+            due = deadline is not None and time.monotonic() >= deadline
+            if closing or due or len(rows) >= self.flush_rows:
+                if rows or texts or callbacks:
+                    self._flush(rows, texts, callbacks)
+                rows, texts, callbacks = [], [], []
+                deadline = None
+
+    def _flush(self, rows, texts, callbacks):
+        try:
+            if rows:
+                self._append(self.csv_path, self._encode(rows))
+            if texts and self.txt_path:
+                self._append(self.txt_path, "".join(texts))
+            self._committed = self._commit()
+            self.rows_written += len(rows)
+            self.flushes += 1
+        except Exception as e:
+            print(f"[WRITER] Flush of {len(rows)} rows to {self.csv_path} failed: {e}")
+            # Bytes of a half-appended batch must not be counted by the next commit
+            try:
+                self._truncate(self._committed, "has a partial batch from the failed flush")
+            except OSError as e:
+                print(f"[WRITER] Could not cut back {self.csv_path}: {e}")
+            return
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"[WRITER] Flush callback failed: {e}")
+
+    def _encode(self, rows):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue()
+
+    def _append(self, path, data):
+        with open(path, "ab") as f:
+            f.write(data.encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _commit(self):
+        """Records the current file sizes (0 for files not created yet) as the last consistent state."""
+        sizes = {path: os.path.getsize(path) if os.path.exists(path) else 0 for path in self._paths()}
+        tmp_path = self.commit_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(sizes, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.commit_path)
+        return sizes
+
+    def close(self):
+        """Flushes what is left, runs the pending callbacks and stops the thread."""
+        self._inbox.put(_CLOSE)
+        self._thread.join()
+        # A clean shutdown leaves nothing to recover
+        if os.path.exists(self.commit_path):
+            os.remove(self.commit_path)
+        print(f"[WRITER] {self.rows_written} rows written to {self.csv_path} in {self.flushes} flushes")
@@ -0,0 +1,251 @@
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+import aiohttp
+from dotenv import load_dotenv
+from url_index import normalize_url
+
+# Load environment variables
+load_dotenv()
+
+PAGE_CACHE_DIR = os.getenv("PAGE_CACHE_DIR", ".page_cache")
+PAGE_CACHE_TTL_HOURS = float(os.getenv("PAGE_CACHE_TTL_HOURS", "168"))   # re-check pages older than a week
+PAGE_CACHE_MAX_MB = float(os.getenv("PAGE_CACHE_MAX_MB", "1024"))        # least recently used pages go first
+PAGE_CACHE_OFFLINE = os.getenv("PAGE_CACHE_OFFLINE", "0") == "1"         # never touch the network
+# Eviction frees space down to this share of the cap, so a full cache does not evict on every put
+EVICT_TARGET = 0.9
+EVICT_BATCH = 100
+
+class PageCache:
+    """
+    On-disk cache of crawled pages.
+
+    Page markdown is stored once per content hash under `<cache_dir>/blobs`,
+    so identical pages reached through different URLs share one file. A
+    SQLite index maps each normalized URL to its blob together with the fetch
+    time and the ETag / Last-Modified headers used to revalidate stale pages.
+
+    Args:
+        cache_dir (str): Folder holding the index and the blobs.
+        ttl_hours (float): Age after which a page is revalidated or re-crawled.
+        max_mb (float): Size cap for the blobs; least recently used pages are evicted.
+        offline (bool): Serve only from the cache (stale pages included), never crawl.
+    """
+    def __init__(self, cache_dir=PAGE_CACHE_DIR, ttl_hours=PAGE_CACHE_TTL_HOURS,
+                 max_mb=PAGE_CACHE_MAX_MB, offline=PAGE_CACHE_OFFLINE):
+        self.cache_dir = cache_dir
+        self.blob_dir = os.path.join(cache_dir, "blobs")
+        self.ttl = ttl_hours * 3600
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.offline = offline
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.blob_dir, exist_ok=True)
+        # WAL and a generous timeout let several worker processes share the cache
+        self._db = sqlite3.connect(os.path.join(cache_dir, "index.sqlite"), timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url_key TEXT PRIMARY KEY,
+                url TEXT,
+                content_hash TEXT,
+                size INTEGER,
+                fetched_at REAL,
+                last_access REAL,
+                etag TEXT,
+                last_modified TEXT
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS pages_content_hash ON pages (content_hash)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS pages_last_access ON pages (last_access)")
+        # Running size of the blobs, kept with every write instead of summed per put
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)")
+        self._db.execute("""
+            INSERT OR IGNORE INTO meta
+            SELECT 'blob_bytes', COALESCE(SUM(size), 0) FROM (SELECT DISTINCT content_hash, size FROM pages)
+        """)
+        self._db.commit()
+
+    def _blob_path(self, content_hash):
+        return os.path.join(self.blob_dir, content_hash[:2], content_hash + ".md")
+
+    # The helpers below run under self._lock inside a write transaction
+
+    def _total(self):
+        return self._db.execute("SELECT value FROM meta WHERE key = 'blob_bytes'").fetchone()[0]
+
+    def _add_bytes(self, delta):
+        self._db.execute("UPDATE meta SET value = value + ? WHERE key = 'blob_bytes'", (delta,))
+
+    def _in_use(self, content_hash):
+        return self._db.execute("SELECT 1 FROM pages WHERE content_hash = ? LIMIT 1", (content_hash,)).fetchone() is not None
+
+    def _forget(self, url_key, content_hash, size, remove_blob=True):
+        """Deletes one page row; a blob no other URL uses leaves the size total (and the disk)."""
+        self._db.execute("DELETE FROM pages WHERE url_key = ?", (url_key,))
+        if self._in_use(content_hash):
+            return 0
+        if remove_blob:
+            try:
+                os.remove(self._blob_path(content_hash))
+            except FileNotFoundError:
+                pass
+        self._add_bytes(-size)
+        return size
+
+    def get(self, url):
+        """Returns the cached entry for `url` as a dict (with a 'stale' flag), or None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT content_hash, size, fetched_at, etag, last_modified FROM pages WHERE url_key = ?",
+                (normalize_url(url),)
+            ).fetchone()
+            if row is None:
+                return None
+            content_hash, size, fetched_at, etag, last_modified = row
+            try:
+                with open(self._blob_path(content_hash), "r", encoding="utf-8") as f:
+                    markdown = f.read()
+            except FileNotFoundError:
+                # Blob was removed by hand, forget the entry
+                self._db.execute("BEGIN IMMEDIATE")
+                self._forget(normalize_url(url), content_hash, size, remove_blob=False)
+                self._db.commit()
+                return None
+            self._db.execute(
+                "UPDATE pages SET last_access = ? WHERE url_key = ?",
+                (time.time(), normalize_url(url))
+            )
+            self._db.commit()
+        return {
+            "markdown": markdown,
+            "fetched_at": fetched_at,
+            "etag": etag,
+            "last_modified": last_modified,
+            "stale": time.time() - fetched_at > self.ttl,
+        }
+
+    def put(self, url, markdown, etag=None, last_modified=None):
+        """Stores a freshly crawled page and evicts old pages if the cache is over its size cap."""
+        data = markdown.encode("utf-8")
+        content_hash = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(content_hash)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temp file first so a crash never leaves half a page behind
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        now = time.time()
+        url_key = normalize_url(url)
+        with self._lock:
+            # IMMEDIATE: worker processes sharing the cache update the size total one at a time
+            self._db.execute("BEGIN IMMEDIATE")
+            previous = self._db.execute("SELECT content_hash, size FROM pages WHERE url_key = ?", (url_key,)).fetchone()
+            if not self._in_use(content_hash):
+                self._add_bytes(len(data))
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url_key, url, content_hash, len(data), now, now, etag, last_modified)
+            )
+            if previous and previous[0] != content_hash and not self._in_use(previous[0]):
+                # The page changed and its old version is used by no other URL
+                try:
+                    os.remove(self._blob_path(previous[0]))
+                except FileNotFoundError:
+                    pass
+                self._add_bytes(-previous[1])
+            self._db.commit()
+            over = self._total() > self.max_bytes
+        if over:
+            self.evict()
+
+    def touch(self, url):
+        """Marks a stale page as fresh again after the server confirmed it did not change."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE pages SET fetched_at = ? WHERE url_key = ?",
+                (time.time(), normalize_url(url))
+            )
+            self._db.commit()
+
+    def evict(self):
+        """
+        Drops least recently used pages until the blobs fit under
+        EVICT_TARGET of `max_bytes`, reading the oldest pages a batch at a time.
+        """
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            total = self._total()
+            if total <= self.max_bytes:
+                self._db.commit()
+                return
+            target = self.max_bytes * EVICT_TARGET
+            while total > target:
+                rows = self._db.execute(
+                    "SELECT url_key, content_hash, size FROM pages ORDER BY last_access ASC LIMIT ?", (EVICT_BATCH,)
+                ).fetchall()
+                if not rows:
+                    break
+                for url_key, content_hash, size in rows:
+                    if total <= target:
+                        break
+                    total -= self._forget(url_key, content_hash, size)
+            self._db.commit()
+        print(f"[CACHE] Evicted pages, cache is now {total / (1024 * 1024):.1f} MB")
+
+    async def _unchanged_on_server(self, url, entry):
+        """Asks the server whether a stale page changed, using its ETag / Last-Modified."""
+        headers = {}
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        if not headers:
+            return False
+        try:
+            timeout = aiohttp.ClientTimeout(total=15)
+            async with aiohttp.ClientSession(timeout=timeout) as session:
+                async with session.head(url, headers=headers, allow_redirects=True) as response:
+                    if response.status == 304:
+                        return True
+                    etag = response.headers.get("ETag")
+                    return bool(etag) and etag == entry["etag"]
+        except Exception as e:
+            print(f"[CACHE] Revalidation failed for {url}: {e}")
+            return False
+
+    async def fetch(self, url, crawl_fn):
+        """
+        Returns the page markdown for `url`, crawling only when needed.
+
+        `crawl_fn(url)` must return (markdown, response_headers). In offline
+        mode a missing page returns None instead of being crawled.
+        """
+        entry = self.get(url)
+        if entry and (not entry["stale"] or self.offline):
+            self.hits += 1
+            return entry["markdown"]
+        if self.offline:
+            self.misses += 1
+            print(f"[CACHE] Offline mode, no cached copy of {url}")
+            return None
+        if entry and await self._unchanged_on_server(url, entry):
+            self.hits += 1
+            self.touch(url)
+            return entry["markdown"]
+
+        self.misses += 1
+        markdown, headers = await crawl_fn(url)
+        if markdown:
+            headers = {key.lower(): value for key, value in (headers or {}).items()}
+            self.put(url, markdown, headers.get("etag"), headers.get("last-modified"))
+        return markdown
+
+    def close(self):
+        print(f"[CACHE] Page cache: {self.hits} hits, {self.misses} misses")
+        self._db.close()
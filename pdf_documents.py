@@ -0,0 +1,146 @@
+import os
+import re
+import sys
+import heapq
+import asyncio
+import tempfile
+from urllib.parse import urlparse, unquote
+import aiohttp
+from dotenv import load_dotenv
+from relevance import KPI_RELEVANCE_THRESHOLD, score_chunk
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # PDFs go through the crawler like any other page
+    PdfReader = None
+
+# Load environment variables
+load_dotenv()
+
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "25"))                 # pages of one PDF sent on to extraction
+PDF_MIN_PAGE_SCORE = float(os.getenv("PDF_MIN_PAGE_SCORE", str(KPI_RELEVANCE_THRESHOLD)))
+PDF_MAX_MB = float(os.getenv("PDF_MAX_MB", "200"))                    # larger downloads are abandoned
+DOWNLOAD_CHUNK_BYTES = 64 * 1024
+
+# Section titles of annual reports and filings that hold the headline numbers
+HIGHLIGHTS_RE = re.compile(
+    r"financial highlights|key (figures|highlights|metrics)|at a glance|performance (summary|highlights)|"
+    r"income statement|statement of (profit|operations)|segment (results|information)|"
+    r"(five|ten)[- ]year (summary|record)|management'?s discussion",
+    re.IGNORECASE
+)
+NUMBER_RE = re.compile(r"\d[\d,.]*")
+
+
+def is_pdf_url(url):
+    return urlparse(url).path.lower().endswith(".pdf")
+
+
+def page_score(text):
+    """
+    KPI likelihood of one PDF page: the chunk relevance score, plus a bonus
+    for highlight / results section titles and for table-like lines
+    (three or more numbers on one line).
+    """
+    score = score_chunk(text)
+    if not score:
+        return 0.0
+    if HIGHLIGHTS_RE.search(text):
+        score += 0.3
+    lines = [line for line in text.splitlines() if line.strip()]
+    if lines:
+        table_lines = sum(1 for line in lines if len(NUMBER_RE.findall(line)) >= 3)
+        score += 0.2 * min(1.0, table_lines / max(5, len(lines) * 0.2))
+    return round(score, 3)
+
+
+def iter_pdf_pages(path):
+    """Yields (page number, text) one page at a time, so only the current page's text is held."""
+    reader = PdfReader(path)
+    for number, page in enumerate(reader.pages, start=1):
+        try:
+            text = page.extract_text() or ""
+        except Exception as e:
+            print(f"[PDF] Could not read page {number} of {path}: {e}")
+            text = ""
+        yield number, text
+
+
+def select_kpi_pages(pages, max_pages=PDF_MAX_PAGES, min_score=PDF_MIN_PAGE_SCORE):
+    """
+    Keeps the `max_pages` best scoring pages above `min_score` from a stream
+    of (page number, text) pairs, using a heap so memory stays bounded by
+    `max_pages` pages however long the document is.
+
+    Returns:
+        tuple: ([(page number, text, score)] in page order, number of pages read)
+    """
+    best = []
+    total = 0
+    for number, text in pages:
+        total += 1
+        score = page_score(text)
+        if score < min_score:
+            continue
+        entry = (score, -number, text)
+        if len(best) < max_pages:
+            heapq.heappush(best, entry)
+        elif entry > best[0]:
+            heapq.heapreplace(best, entry)
+    selected = sorted(((-neg_number, text, score) for score, neg_number, text in best))
+    return selected, total
+
+
+def pdf_to_markdown(path, max_pages=PDF_MAX_PAGES, min_score=PDF_MIN_PAGE_SCORE, label=None):
+    """Markdown of the selected KPI pages of a local PDF, one '## Page N' section per page."""
+    selected, total = select_kpi_pages(iter_pdf_pages(path), max_pages, min_score)
+    print(f"[PDF] {label or path}: kept {len(selected)} of {total} pages")
+    return "\n\n".join(f"## Page {number}\n{text}" for number, text, _ in selected)
+
+
+async def download_pdf(url, dest, max_mb=PDF_MAX_MB):
+    """Streams a PDF to `dest` in small chunks and returns the response headers."""
+    max_bytes = int(max_mb * 1024 * 1024)
+    size = 0
+    timeout = aiohttp.ClientTimeout(total=600)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        async with session.get(url, allow_redirects=True) as response:
+            response.raise_for_status()
+            with open(dest, "wb") as f:
+                async for block in response.content.iter_chunked(DOWNLOAD_CHUNK_BYTES):
+                    size += len(block)
+                    if size > max_bytes:
+                        raise ValueError(f"PDF larger than {max_mb} MB")
+                    f.write(block)
+            return dict(response.headers)
+
+
+async def fetch_pdf(url):
+    """
+    Returns (markdown of the KPI pages, response headers) for a PDF URL,
+    a file:// URL or a local path. Remote files are streamed to a temp file
+    and parsed in a worker thread, then deleted.
+    """
+    parts = urlparse(url)
+    if parts.scheme == "file" or os.path.exists(url):
+        path = unquote(parts.path) if parts.scheme == "file" else url
+        return await asyncio.to_thread(pdf_to_markdown, path), None
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    os.close(fd)
+    try:
+        headers = await download_pdf(url, path)
+        markdown = await asyncio.to_thread(pdf_to_markdown, path, PDF_MAX_PAGES, PDF_MIN_PAGE_SCORE, url)
+        return markdown, headers
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    # python pdf_documents.py report.pdf -> prints the pages that would be sent to extraction
+    if PdfReader is None:
+        raise SystemExit("pypdf is not installed: pip install pypdf")
+    for target in sys.argv[1:]:
+        selected, total = select_kpi_pages(iter_pdf_pages(target))
+        print(f"{target}: {len(selected)} of {total} pages selected")
+        for number, text, score in selected:
+            print(f"  page {number}: score {score}, {len(text)} chars")
@@ -0,0 +1,267 @@
+import asyncio
+import time
+from urllib.parse import urlparse
+
+# Default worker pool size per stage. The LLM stage is usually the slowest,
+# so it gets the most workers; the writer stays single so rows never interleave.
+DEFAULT_WORKERS = {
+    "crawl": 8,
+    "clean": 2,
+    "chunk": 1,
+    "extract": 4,
+    "write": 1,
+}
+
+STAGES = ["crawl", "clean", "chunk", "extract", "write"]
+
+# Marks the end of a queue
+_DONE = object()
+
+
+class FetchFailed(Exception):
+    """
+    Returned (not raised) by a crawl_fn for a page it could not fetch, so the
+    URL leaves the pipeline with this as its error. An empty result instead
+    means the page was fetched and has nothing to extract.
+    """
+
+
+def get_domain(url):
+    netloc = urlparse(url).netloc.lower()
+    return netloc[4:] if netloc.startswith("www.") else netloc
+
+
+class DomainThrottle:
+    """
+    Limits how many requests hit the same domain at once and enforces a
+    minimum gap between consecutive requests to that domain.
+    """
+    def __init__(self, max_per_domain=2, delay=1.0):
+        self.max_per_domain = max_per_domain
+        self.delay = delay
+        self._slots = {}
+        self._locks = {}
+        self._last_hit = {}
+
+    async def acquire(self, domain):
+        if domain not in self._slots:
+            self._slots[domain] = asyncio.Semaphore(self.max_per_domain)
+            self._locks[domain] = asyncio.Lock()
+        await self._slots[domain].acquire()
+        # Space out request starts for this domain
+        async with self._locks[domain]:
+            wait = self._last_hit.get(domain, 0) + self.delay - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._last_hit[domain] = time.monotonic()
+
+    def release(self, domain):
+        self._slots[domain].release()
+
+
+async def _call(fn, *args):
+    """Await async stage functions; run blocking ones in a thread so the loop keeps moving."""
+    if asyncio.iscoroutinefunction(fn):
+        return await fn(*args)
+    return await asyncio.to_thread(fn, *args)
+
+
+async def _run_stage(name, worker_count, inbox, outbox, next_workers, handle, on_error=None):
+    """
+    Runs `worker_count` workers that pull from `inbox`, call `handle(item)` and
+    push every returned item into `outbox`. Once all workers are finished the
+    next stage is told to stop as well. `on_error(item, error)` hears about
+    items dropped because `handle` raised.
+    """
+    async def worker():
+        while True:
+            item = await inbox.get()
+            if item is _DONE:
+                break
+            try:
+                results = await handle(item)
+            except Exception as e:
+                print(f"[ERROR] {name} stage failed for {item[0]}: {e}")
+                if on_error is not None:
+                    await on_error(item, e)
+                continue
+            if outbox is not None:
+                for result in results:
+                    await outbox.put(result)
+
+    await asyncio.gather(*(worker() for _ in range(worker_count)))
+    if outbox is not None:
+        for _ in range(next_workers):
+            await outbox.put(_DONE)
+
+
+async def run_pipeline(links, crawl_fn, clean_fn, chunk_fn, extract_fn, write_fn,
+                       workers=None, queue_size=None, skip_chunk=None, chunk_filter=None, done_fn=None):
+    """
+    Streams links through crawl -> clean -> chunk -> extract -> write with a
+    bounded queue between every stage, so memory stays flat however many links
+    are loaded and the slowest stage always has work waiting.
+
+    Parameters:
+    - links (list or async iterable): (country, url) pairs
+    - crawl_fn (url) -> raw page text, or a FetchFailed for a page that
+      could not be fetched
+    - clean_fn (raw_text) -> clean text
+    - chunk_fn (clean_text) -> list of text chunks
+    - extract_fn (chunk) -> LLM reply string (None on failure)
+    - write_fn (url, results) -> called once per URL with a list of
+      (chunk_index, reply) pairs for all its chunks, in chunk order
+    - workers (dict): worker pool size per stage, overrides DEFAULT_WORKERS
+    - queue_size (int): max items waiting between two stages
+      (defaults to twice the size of the consuming pool)
+    - skip_chunk (url, chunk_index) -> bool: drop chunks that are already done
+    - chunk_filter (text) -> bool: only chunks it accepts reach extract_fn
+    - done_fn (url, error) -> called once per URL when it leaves the pipeline,
+      with error None if it was written or had nothing to extract, and the
+      error otherwise (failed fetch, failed stage, every chunk failed at extract_fn)
+
+    Functions may be sync or async; sync ones run in a worker thread.
+    """
+    sizes = dict(DEFAULT_WORKERS)
+    sizes.update(workers or {})
+
+    queues = {
+        stage: asyncio.Queue(maxsize=queue_size or sizes[stage] * 2)
+        for stage in STAGES
+    }
+    total = len(links) if hasattr(links, "__len__") else "?"
+
+    async def finish(url, error=None):
+        if done_fn is not None:
+            await _call(done_fn, url, error)
+
+    async def crawl(item):
+        url, idx = item
+        print(f"[INFO] ({idx+1}/{total}) Crawling: {url}")
+        raw_text = await _call(crawl_fn, url)
+        if isinstance(raw_text, FetchFailed):
+            print(f"[ERROR] Could not fetch {url}: {raw_text}")
+            await finish(url, raw_text)
+            return []
+        if not raw_text:
+            await finish(url)
+            return []
+        return [(url, raw_text)]
+
+    async def clean(item):
+        url, raw_text = item
+        return [(url, await _call(clean_fn, raw_text))]
+
+    async def chunk(item):
+        url, clean_text = item
+        chunks = await _call(chunk_fn, clean_text)
+        keep = [
+            (i, text) for i, text in enumerate(chunks)
+            if not (skip_chunk and skip_chunk(url, i))
+            and (chunk_filter is None or chunk_filter(text))
+        ]
+        if not keep:
+            await finish(url)
+        return [(url, i, len(keep), text) for i, text in keep]
+
+    async def extract(item):
+        url, chunk_index, chunk_count, text = item
+        print(f"  [INFO] Processing chunk {chunk_index+1} of {url}")
+        try:
+            reply, error = await _call(extract_fn, text), None
+        except Exception as e:
+            # A failed chunk still has to reach the writer so its URL completes
+            print(f"[ERROR] Failed chunk: {url}, chunk {chunk_index} - {e}")
+            reply, error = None, e
+        return [(url, chunk_index, chunk_count, reply, error)]
+
+    # Replies are grouped per URL and written once every chunk has arrived
+    pending = {}
+
+    async def write(item):
+        url, chunk_index, chunk_count, reply, error = item
+        results = pending.setdefault(url, {})
+        results[chunk_index] = (reply, error)
+        if len(results) == chunk_count:
+            del pending[url]
+            errors = [error for _, error in results.values() if error is not None]
+            if len(errors) == chunk_count:
+                # Nothing came back from the model; the URL stays open for a retry
+                await finish(url, errors[-1])
+                return []
+            await _call(write_fn, url, [(i, reply) for i, (reply, _) in sorted(results.items())])
+            await finish(url)
+        return []
+
+    async def on_error(item, error):
+        await finish(item[0], error)
+
+    async def feed():
+        if hasattr(links, "__aiter__"):
+            idx = 0
+            async for country, url in links:
+                await queues["crawl"].put((url, idx))
+                idx += 1
+        else:
+            for idx, (country, url) in enumerate(links):
+                await queues["crawl"].put((url, idx))
+        for _ in range(sizes["crawl"]):
+            await queues["crawl"].put(_DONE)
+
+    handlers = {"crawl": crawl, "clean": clean, "chunk": chunk, "extract": extract, "write": write}
+    runners = []
+    for i, stage in enumerate(STAGES):
+        next_stage = STAGES[i + 1] if i + 1 < len(STAGES) else None
+        runners.append(_run_stage(
+            stage,
+            sizes[stage],
+            queues[stage],
+            queues[next_stage] if next_stage else None,
+            sizes[next_stage] if next_stage else 0,
+            handlers[stage],
+            on_error,
+        ))
+
+    await asyncio.gather(feed(), *runners)
+    print(f"[INFO] Pipeline finished for {total} links.")
+
+
+async def run_ordered(items, worker_fn, on_result, concurrency=8):
+    """
+    Runs `worker_fn(item)` for every item with at most `concurrency` calls in
+    flight, and hands each result to `on_result(index, item, result)` in input
+    order. A failing item is logged and reported with result None; it never
+    stops the others.
+    """
+    inbox = asyncio.Queue(maxsize=concurrency * 2)
+    done = {}
+    next_index = 0
+
+    async def feed():
+        for index, item in enumerate(items):
+            await inbox.put((index, item))
+        for _ in range(concurrency):
+            await inbox.put(_DONE)
+
+    async def worker():
+        nonlocal next_index
+        while True:
+            entry = await inbox.get()
+            if entry is _DONE:
+                break
+            index, item = entry
+            try:
+                result = await _call(worker_fn, item)
+            except Exception as e:
+                print(f"[ERROR] Item {index + 1} failed: {e}")
+                result = None
+            done[index] = (item, result)
+            # Release every finished item that is next in line
+            while next_index in done:
+                ready_item, ready_result = done.pop(next_index)
+                outcome = on_result(next_index, ready_item, ready_result)
+                if asyncio.iscoroutine(outcome):
+                    await outcome
+                next_index += 1
+
+    await asyncio.gather(feed(), *(worker() for _ in range(concurrency)))
@@ -0,0 +1,115 @@
+import os
+from dotenv import load_dotenv
+from url_index import normalize_url
+
+# Load environment variables
+load_dotenv()
+
+QUERY_PRUNING = os.getenv("QUERY_PRUNING", "1") == "1"
+QUERY_PRUNE_MIN_SAMPLES = int(os.getenv("QUERY_PRUNE_MIN_SAMPLES", "8"))    # queries before a value can be pruned
+QUERY_PRUNE_MIN_YIELD = float(os.getenv("QUERY_PRUNE_MIN_YIELD", "0.15"))   # new URLs per query to stay in the plan
+
+DIMENSIONS = ("template", "source", "year")
+
+
+class QueryPlanner:
+    """
+    Orders the Bing queries of one country by how many new URLs their
+    template, source and year have been bringing in, and drops the ones
+    that keep returning URLs we already have.
+
+    Each finished query is recorded with its URLs; a URL counts as new the
+    first time its normalized form is seen for the country. A template, source or year
+    whose yield (new URLs per query) stays below `min_yield` after
+    `min_samples` queries is pruned, and its remaining queries are skipped.
+    The rest are issued best-first, with a smoothed yield so values that
+    were not tried yet still get their turn.
+
+    Args:
+        plan (list): (query, template, source, year) tuples in generation order.
+        min_samples (int): Queries a value needs before it can be pruned.
+        min_yield (float): New URLs per query below which a value is pruned.
+        enabled (bool): When False every query is issued in generation order.
+    """
+    def __init__(self, plan, min_samples=QUERY_PRUNE_MIN_SAMPLES, min_yield=QUERY_PRUNE_MIN_YIELD,
+                 enabled=QUERY_PRUNING):
+        self.min_samples = min_samples
+        self.min_yield = min_yield
+        self.enabled = enabled
+        self.dims = {}
+        self.order = {}
+        for query, template, source, year in plan:
+            if query not in self.dims:
+                self.dims[query] = dict(zip(DIMENSIONS, (template, source, year)))
+                self.order[query] = len(self.order)
+        self.pending = set(self.dims)
+        self.seen = set()
+        self.issued = 0
+        self.skipped = 0
+        # (dimension, value) -> [queries issued, new URLs, queries skipped]
+        self.stats = {}
+
+    def _stat(self, dimension, value):
+        return self.stats.setdefault((dimension, value), [0, 0, 0])
+
+    def record(self, query, urls):
+        """Counts the new URLs a finished query brought in for its template, source and year."""
+        self.pending.discard(query)
+        self.issued += 1
+        new = 0
+        for url in urls:
+            key = normalize_url(url)
+            if key not in self.seen:
+                self.seen.add(key)
+                new += 1
+        for dimension, value in self.dims[query].items():
+            stat = self._stat(dimension, value)
+            stat[0] += 1
+            stat[1] += new
+
+    def drop(self, query):
+        """Takes a failed query out of this run's plan."""
+        self.pending.discard(query)
+
+    def _pruned(self, dimension, value):
+        issued, new, _ = self._stat(dimension, value)
+        return issued >= self.min_samples and new / issued < self.min_yield
+
+    def _score(self, query):
+        score = 1.0
+        for dimension, value in self.dims[query].items():
+            issued, new, _ = self._stat(dimension, value)
+            score *= (new + 1) / (issued + 2)
+        return score
+
+    def next_batch(self, size):
+        """Skips queries of pruned values and returns the `size` most promising pending queries."""
+        if not self.enabled:
+            return sorted(self.pending, key=self.order.get)[:size]
+        for query in list(self.pending):
+            pruned = [(d, v) for d, v in self.dims[query].items() if self._pruned(d, v)]
+            if pruned:
+                self.pending.discard(query)
+                self.skipped += 1
+                for dimension, value in pruned:
+                    self._stat(dimension, value)[2] += 1
+        ranked = sorted(self.pending, key=lambda query: (-self._score(query), self.order[query]))
+        return ranked[:size]
+
+    def _values(self, dimension):
+        return {dims[dimension] for dims in self.dims.values()}
+
+    def report(self, label=""):
+        print(f"[PLAN] {label}: {self.issued}/{len(self.dims)} queries issued, {self.skipped} skipped as low-yield, "
+              f"{len(self.seen)} unique URLs")
+        for dimension in DIMENSIONS:
+            rows = []
+            for value in self._values(dimension):
+                issued, new, skipped = self._stat(dimension, value)
+                rows.append((new / issued if issued else 0.0, value, issued, new, skipped))
+            rows.sort(key=lambda row: (-row[0], str(row[1])))
+            print(f"[PLAN]   by {dimension}:")
+            for rate, value, issued, new, skipped in rows:
+                flag = " (pruned)" if self.enabled and self._pruned(dimension, value) else ""
+                print(f"[PLAN]     {value}: {issued} queries, {new} new URLs, "
+                      f"yield {rate:.2f}, {skipped} skipped{flag}")
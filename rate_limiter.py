@@ -0,0 +1,215 @@
+import os
+import re
+import time
+import asyncio
+import threading
+from email.utils import parsedate_to_datetime
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Defaults per provider, override in .env (e.g. OPENAI_RPM=3500)
+DEFAULT_LIMITS = {
+    "openai": {"rpm": 500, "tpm": 200000, "max_concurrency": 16},
+    "gemini": {"rpm": 60, "tpm": 1000000, "max_concurrency": 4},
+    "bing": {"rpm": 180, "tpm": 0, "max_concurrency": 8},
+}
+
+# How long to wait for a free concurrency slot before checking again
+SLOT_POLL_SECONDS = 0.05
+
+
+def parse_duration(value):
+    """Turns rate-limit reset values like '1s', '6m0s', '20ms' or '0.5' into seconds."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    units = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    parts = re.findall(r"([\d.]+)(ms|s|m|h)", value)
+    if not parts:
+        return None
+    return sum(float(number) * units[unit] for number, unit in parts)
+
+
+def retry_after_seconds(headers):
+    """Reads 'retry-after-ms' / 'retry-after' (seconds or HTTP date) from response headers."""
+    if not headers:
+        return None
+    headers = {key.lower(): value for key, value in headers.items()}
+    if "retry-after-ms" in headers:
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+class AdaptiveRateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute token buckets plus an AIMD
+    concurrency limit, shared by every caller of one API.
+
+    Callers reserve a slot (and an estimate of the tokens they will use)
+    before each request and release it afterwards. Successful calls slowly
+    raise the allowed concurrency; a 429 halves it and pauses everyone until
+    the retry-after hint has passed. Rate-limit headers, when the caller has
+    them, re-sync the buckets with what the server reports.
+
+    Works from async code (`acquire`) and from plain threads (`acquire_sync`).
+    """
+    def __init__(self, name, rpm, tpm=0, max_concurrency=8, min_concurrency=1):
+        self.name = name
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.concurrency = max(min_concurrency, max_concurrency / 2)
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.rate_limited = 0
+        self._request_level = float(rpm)
+        self._token_level = float(tpm)
+        self._refilled_at = time.monotonic()
+        self._consecutive_429 = 0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self._refilled_at
+        self._refilled_at = now
+        self._request_level = min(self.rpm, self._request_level + elapsed * self.rpm / 60)
+        if self.tpm:
+            self._token_level = min(self.tpm, self._token_level + elapsed * self.tpm / 60)
+
+    def _try_reserve(self, tokens):
+        """Reserves a slot and returns 0, or returns how many seconds to wait before trying again."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now < self.paused_until:
+                return self.paused_until - now
+            if self.in_flight >= int(self.concurrency):
+                return SLOT_POLL_SECONDS
+            tokens = min(tokens, self.tpm) if self.tpm else 0
+            waits = [0.0]
+            if self._request_level < 1:
+                waits.append((1 - self._request_level) * 60 / self.rpm)
+            if tokens and self._token_level < tokens:
+                waits.append((tokens - self._token_level) * 60 / self.tpm)
+            wait = max(waits)
+            if wait > 0:
+                return wait
+            self._request_level -= 1
+            self._token_level -= tokens
+            self.in_flight += 1
+            return 0
+
+    async def acquire(self, tokens=0):
+        while True:
+            wait = self._try_reserve(tokens)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def acquire_sync(self, tokens=0):
+        while True:
+            wait = self._try_reserve(tokens)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def release(self, estimated_tokens=0, used_tokens=None, success=True):
+        """
+        Frees the slot. On success the concurrency grows by about one slot per
+        round of calls, and the token estimate is corrected with the real usage.
+        """
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+            if self.tpm and used_tokens is not None:
+                self._token_level = min(self.tpm, self._token_level + estimated_tokens - used_tokens)
+            if success:
+                self._consecutive_429 = 0
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+
+    def on_rate_limited(self, headers=None):
+        """Called on a 429: halves the concurrency and pauses until the retry-after hint has passed."""
+        retry_after = retry_after_seconds(headers)
+        with self._lock:
+            self.rate_limited += 1
+            self._consecutive_429 += 1
+            self.concurrency = max(self.min_concurrency, self.concurrency / 2)
+            if retry_after is None:
+                retry_after = min(60, 2 ** self._consecutive_429)
+            self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+        self.update_from_headers(headers)
+        print(f"[LIMIT] {self.name}: rate limited, pausing {retry_after:.1f}s, concurrency now {int(self.concurrency)}")
+
+    def update_from_headers(self, headers):
+        """Syncs the buckets with x-ratelimit-* headers (limits, remaining and reset times)."""
+        if not headers:
+            return
+        headers = {key.lower(): value for key, value in headers.items()}
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            for kind in ("requests", "tokens"):
+                limit = headers.get(f"x-ratelimit-limit-{kind}")
+                remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+                try:
+                    limit = int(limit) if limit is not None else None
+                    remaining = int(remaining) if remaining is not None else None
+                except ValueError:
+                    continue
+                if kind == "requests":
+                    if limit:
+                        self.rpm = limit
+                    if remaining is not None:
+                        self._request_level = min(self._request_level, remaining)
+                elif self.tpm:
+                    if limit:
+                        self.tpm = limit
+                    if remaining is not None:
+                        self._token_level = min(self._token_level, remaining)
+                if remaining == 0 and reset:
+                    self.paused_until = max(self.paused_until, now + reset)
+
+    def stats(self):
+        return {
+            "concurrency": int(self.concurrency),
+            "in_flight": self.in_flight,
+            "rate_limited": self.rate_limited,
+        }
+
+
+# One limiter per API, shared by every caller in the process
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(name):
+    """Returns the shared limiter for `name` (e.g. 'openai', 'gemini'), configured from .env."""
+    with _limiters_lock:
+        if name not in _limiters:
+            defaults = DEFAULT_LIMITS.get(name, {"rpm": 60, "tpm": 0, "max_concurrency": 4})
+            prefix = name.upper()
+            _limiters[name] = AdaptiveRateLimiter(
+                name,
+                rpm=int(os.getenv(f"{prefix}_RPM", defaults["rpm"])),
+                tpm=int(os.getenv(f"{prefix}_TPM", defaults["tpm"])),
+                max_concurrency=int(os.getenv(f"{prefix}_MAX_CONCURRENCY", defaults["max_concurrency"])),
+            )
+        return _limiters[name]
@@ -0,0 +1,120 @@
+import os
+import re
+from dotenv import load_dotenv
+from llm_client import count_tokens, EXPECTED_REPLY_TOKENS
+
+# Load environment variables
+load_dotenv()
+
+KPI_RELEVANCE_THRESHOLD = float(os.getenv("KPI_RELEVANCE_THRESHOLD", "0.35"))  # 0 = send every chunk
+RELEVANCE_WINDOW_WORDS = int(os.getenv("RELEVANCE_WINDOW_WORDS", "300"))       # words scored together
+
+# Keywords per performance category of the extraction prompt
+KPI_KEYWORDS = {
+    "Total Sales Performance": ["sales", "revenue", "turnover", "net sales", "topline", "growth", "volume"],
+    "Channel-wise Performance": ["channel", "e-commerce", "ecommerce", "online", "modern trade", "general trade",
+                                 "retail", "quick commerce", "distribution"],
+    "Promotions Impact": ["promotion", "promotional", "discount", "offer", "campaign", "advertising", "ad spend"],
+    "Customer Retention": ["retention", "repeat", "loyalty", "churn", "household penetration", "consumers"],
+    "Market Share & ASP": ["market share", "share", "asp", "average selling price", "price", "pricing", "premium"],
+    "Innovation & Features": ["launch", "innovation", "new product", "portfolio", "variant", "sku"],
+    "Demand & Inventory": ["demand", "inventory", "stock", "supply", "consumption", "rural", "urban"],
+    "Cost Optimization": ["cost", "margin", "ebitda", "savings", "efficiency", "inflation", "input cost"],
+    "Dealer Stock": ["dealer", "distributor", "stockist", "wholesale", "channel inventory"],
+    "Brand-wise Sales": ["brand", "brands", "segment", "category", "portfolio"],
+}
+
+NUMBER_RE = re.compile(r"\d[\d,.]*")
+CURRENCY_RE = re.compile(r"[₹$€£¥]|\b(inr|usd|eur|gbp|rs\.?|crore|cr|lakh|billion|million|bn|mn)\b", re.IGNORECASE)
+PERCENT_RE = re.compile(r"%|\bper ?cent\b|\bbps\b|\bbasis points\b", re.IGNORECASE)
+PERIOD_RE = re.compile(r"\b(19|20)\d{2}\b|\bfy ?'?\d{2,4}\b|\bq[1-4]\b|\bh[12]\b", re.IGNORECASE)
+WORD_RE = re.compile(r"\w+")
+
+_KEYWORD_RES = {
+    category: re.compile(r"\b(" + "|".join(re.escape(word) for word in words) + r")\b", re.IGNORECASE)
+    for category, words in KPI_KEYWORDS.items()
+}
+
+
+def _score_window(text):
+    """score_chunk of a text no longer than one window."""
+    words = len(WORD_RE.findall(text))
+    if not words or not NUMBER_RE.search(text):
+        return 0.0
+    numbers = len(NUMBER_RE.findall(text))
+    measures = len(CURRENCY_RE.findall(text)) + len(PERCENT_RE.findall(text))
+    periods = len(PERIOD_RE.findall(text))
+    keyword_hits = 0
+    categories = 0
+    for pattern in _KEYWORD_RES.values():
+        hits = len(pattern.findall(text))
+        keyword_hits += hits
+        categories += 1 if hits else 0
+    # Dates alone (copyright lines, founding years) are not KPIs
+    if not measures and not keyword_hits:
+        return 0.0
+
+    # Each signal is "full" at a density per word, but short text needs a few absolute hits too
+    numeric = min(1.0, numbers / max(3, words * 0.05))
+    kpi_patterns = min(1.0, (measures + periods) / max(2, words * 0.02))
+    keywords = min(1.0, keyword_hits / max(2, words * 0.015)) * min(1.0, 0.5 + categories / 6)
+    return round(0.3 * numeric + 0.35 * kpi_patterns + 0.35 * keywords, 3)
+
+
+def score_chunk(text, window_words=RELEVANCE_WINDOW_WORDS):
+    """
+    Cheap local estimate (0..1) of how likely a chunk holds KPI insights.
+
+    Combines numeric density, currency / percent / period mentions and the
+    KPI category keywords, all measured per word. Text without a single
+    digit scores 0, since every insight must carry a number.
+
+    Densities are taken over windows of `window_words` words (half
+    overlapping) and the best window counts, so a few KPI sentences inside
+    a long chunk are not diluted by the text around them.
+    """
+    if not NUMBER_RE.search(text):
+        return 0.0
+    starts = [match.start() for match in WORD_RE.finditer(text)]
+    if len(starts) <= window_words:
+        return _score_window(text)
+    best = 0.0
+    step = max(1, window_words // 2)
+    for first in range(0, len(starts) - window_words // 2, step):
+        last = first + window_words
+        end = starts[last] if last < len(starts) else len(text)
+        best = max(best, _score_window(text[starts[first]:end]))
+    return best
+
+
+class RelevanceFilter:
+    """
+    Decides which chunks are worth an LLM call and counts what the skipped
+    ones would have cost.
+
+    Args:
+        threshold (float): Minimum score_chunk value for a chunk to reach the model.
+        model (str): Model used to count the saved tokens.
+        prompt_overhead (int): Tokens the prompt template adds to every chunk.
+    """
+    def __init__(self, threshold=KPI_RELEVANCE_THRESHOLD, model="gpt-4o-mini", prompt_overhead=0):
+        self.threshold = threshold
+        self.model = model
+        self.prompt_overhead = prompt_overhead
+        self.seen = 0
+        self.skipped = 0
+        self.prompt_tokens_saved = 0
+
+    def keep(self, text):
+        self.seen += 1
+        if self.threshold <= 0 or score_chunk(text) >= self.threshold:
+            return True
+        self.skipped += 1
+        self.prompt_tokens_saved += self.prompt_overhead + count_tokens(text, self.model)
+        return False
+
+    def report(self):
+        reply_tokens = self.skipped * EXPECTED_REPLY_TOKENS
+        print(f"[FILTER] {self.skipped}/{self.seen} chunks skipped as irrelevant "
+              f"(threshold {self.threshold}): saved {self.skipped} LLM calls, "
+              f"~{self.prompt_tokens_saved} prompt tokens and ~{reply_tokens} reply tokens.")
@@ -0,0 +1,65 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+SEARCH_STORE_PATH = os.getenv("SEARCH_STORE_PATH", ".search_store.sqlite")
+
+
+class SearchStore:
+    """
+    Persistent record of every finished Bing query and the URLs it returned.
+
+    get_links writes each result as soon as the query completes, so a
+    crashed or stopped run resumes from the last finished query instead of
+    searching the whole country again. Failed searches are not stored and
+    are retried on the next run.
+
+    Args:
+        path (str): SQLite file holding the results.
+    """
+    def __init__(self, path=SEARCH_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS queries (
+                query TEXT,
+                count INTEGER,
+                location TEXT,
+                urls TEXT,
+                searched_at REAL,
+                PRIMARY KEY (query, count)
+            )
+        """)
+        self._db.commit()
+
+    def done(self, queries, count):
+        """Returns {query: urls} for the queries that already have a stored result."""
+        results = {}
+        with self._lock:
+            for query in queries:
+                row = self._db.execute(
+                    "SELECT urls FROM queries WHERE query = ? AND count = ?", (query, count)
+                ).fetchone()
+                if row is not None:
+                    results[query] = json.loads(row[0])
+        return results
+
+    def put(self, query, count, location, urls):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO queries VALUES (?, ?, ?, ?, ?)",
+                (query, count, location, json.dumps(urls), time.time())
+            )
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,148 @@
+import os
+import sys
+import csv
+import json
+import hashlib
+from dotenv import load_dotenv
+from pipeline import get_domain
+from url_index import normalize_url
+
+# Load environment variables
+load_dotenv()
+
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "1"))      # workers the links are split between
+SHARD_INDEX = int(os.getenv("SHARD_INDEX", "0"))      # which shard this process works on (0-based)
+SHARD_BY = os.getenv("SHARD_BY", "domain")            # 'domain' keeps a website on one worker, 'hash' spreads evenly
+SHARD_DIR = "shards"
+
+
+def shard_of(url, shard_count, by=SHARD_BY):
+    """
+    Shard number of a URL. Stable across runs, processes and machines: it
+    only depends on the normalized URL (or its domain) and the shard count.
+    """
+    key = get_domain(normalize_url(url)) if by == "domain" else normalize_url(url)
+    return int(hashlib.sha1(key.encode("utf-8")).hexdigest(), 16) % shard_count
+
+
+def select_shard(links, shard_index=SHARD_INDEX, shard_count=SHARD_COUNT, by=SHARD_BY):
+    """Keeps the (country, url) pairs that belong to `shard_index`."""
+    if shard_count <= 1:
+        return links
+    return [(country, url) for country, url in links if shard_of(url, shard_count, by) == shard_index]
+
+
+def shard_path(path, shard_index=SHARD_INDEX, shard_count=SHARD_COUNT):
+    """Per-shard name of an output file: insights_output.csv -> insights_output_shard2of4.csv."""
+    if shard_count <= 1:
+        return path
+    stem, ext = os.path.splitext(path)
+    return f"{stem}_shard{shard_index}of{shard_count}{ext}"
+
+
+def split_links_file(links_file, shard_count, by=SHARD_BY, output_dir=SHARD_DIR):
+    """
+    Writes one {country: [urls]} file per shard into `output_dir`, for
+    copying to machines that should not see the whole links file.
+    """
+    with open(links_file, "r") as f:
+        data = json.load(f)
+    os.makedirs(output_dir, exist_ok=True)
+    shards = [{country: [] for country in data} for _ in range(shard_count)]
+    for country, urls in data.items():
+        for url in urls:
+            shards[shard_of(url, shard_count, by)][country].append(url)
+    paths = []
+    for index, shard in enumerate(shards):
+        path = shard_path(os.path.join(output_dir, os.path.basename(links_file)), index, shard_count)
+        with open(path, "w") as f:
+            json.dump(shard, f, indent=4)
+        print(f"✅ Shard {index}: {sum(len(urls) for urls in shard.values())} links saved to '{path}'")
+        paths.append(path)
+    return paths
+
+
+def merge_csv_files(sources, path):
+    """
+    Merges CSV files with the same header into `path`, keeping the rows
+    already in `path` and dropping duplicate rows. The result is written to a
+    temp file and swapped in. Returns the number of rows written.
+    """
+    header = None
+    rows = {}
+    for source in [path] + list(sources):
+        if not os.path.exists(source):
+            continue
+        with open(source, "r", newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            file_header = next(reader, None)
+            if file_header is None:
+                continue
+            header = header or file_header
+            for row in reader:
+                rows.setdefault(tuple(row), None)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        if header:
+            writer.writerow(header)
+        writer.writerows(rows)
+    os.replace(tmp_path, path)
+    return len(rows)
+
+
+def mark_shard_done(path, shard_index=SHARD_INDEX, shard_count=SHARD_COUNT):
+    """Marks the shard output `path` as complete so the merge can pick it up."""
+    with open(shard_path(path, shard_index, shard_count) + ".done", "w") as f:
+        f.write("done\n")
+
+
+def _done_markers(path, shard_count):
+    return [shard_path(path, index, shard_count) + ".done" for index in range(shard_count)]
+
+
+def merge_shard_outputs(path, shard_count=SHARD_COUNT):
+    """
+    Merges the per-shard CSV outputs into `path` once every shard is marked
+    done. Rows already in `path` are kept, duplicate rows are dropped and the
+    result is written to a temp file and swapped in, so a crash never leaves
+    a half-written file. A lock file makes sure only one process merges.
+
+    Returns:
+        bool: True if this call merged, False if shards are missing or
+        another process is merging (or already merged) them.
+    """
+    markers = _done_markers(path, shard_count)
+    missing = [marker for marker in markers if not os.path.exists(marker)]
+    if missing:
+        print(f"[SHARD] {len(missing)}/{shard_count} shards of {path} not finished yet, not merging.")
+        return False
+    lock = path + ".merge.lock"
+    try:
+        fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        print(f"[SHARD] Another process is merging {path}.")
+        return False
+    os.close(fd)
+    try:
+        # Checked again under the lock: a merge that just finished consumed the markers
+        if not all(os.path.exists(marker) for marker in markers):
+            return False
+        sources = [shard_path(path, index, shard_count) for index in range(shard_count)]
+        rows = merge_csv_files(sources, path)
+        for marker in markers:
+            os.remove(marker)
+        print(f"[SHARD] Merged {shard_count} shards into {path} ({rows} rows).")
+        return True
+    finally:
+        os.remove(lock)
+
+
+if __name__ == "__main__":
+    # python sharding.py split <links.json> <shard count> [hash|domain]
+    # python sharding.py merge <output.csv> <shard count>
+    command, target, count = sys.argv[1], sys.argv[2], int(sys.argv[3])
+    if command == "split":
+        split_links_file(target, count, sys.argv[4] if len(sys.argv) > 4 else SHARD_BY)
+    elif command == "merge":
+        merge_shard_outputs(target, count)
@@ -0,0 +1,125 @@
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+import batch_api
+import llm_client
+from llm_cache import LLMCache
+
+
+class StubOpenAI:
+    """In-memory stand-in for the OpenAI files and batches endpoints."""
+    def __init__(self):
+        self.files = {}
+        self.batches = {}
+        self.polls = {}
+        self.fail_create = set()   # create calls (1-based) answered with a 500
+        self.creates = 0
+        self.submitted_ids = []
+
+    def reply_for(self, custom_id):
+        return json.dumps({"answer": custom_id})
+
+    def handle(self, method, path, body):
+        if method == "POST" and path == "/files":
+            lines = re.findall(rb'^\{"custom_id".*$', body, re.MULTILINE)
+            file_id = f"file-{len(self.files)}"
+            self.files[file_id] = [json.loads(line) for line in lines]
+            return 200, {"id": file_id}
+        if method == "POST" and path == "/batches":
+            self.creates += 1
+            if self.creates in self.fail_create:
+                return 500, {"error": "stub failure"}
+            input_file_id = json.loads(body)["input_file_id"]
+            batch_id = f"batch-{len(self.batches)}"
+            self.batches[batch_id] = input_file_id
+            self.submitted_ids += [request["custom_id"] for request in self.files[input_file_id]]
+            return 200, {"id": batch_id, "status": "validating"}
+        match = re.fullmatch(r"/batches/([\w-]+)", path)
+        if method == "GET" and match:
+            batch_id = match.group(1)
+            self.polls[batch_id] = self.polls.get(batch_id, 0) + 1
+            if self.polls[batch_id] < 2:
+                return 200, {"id": batch_id, "status": "in_progress", "request_counts": {"total": 1}}
+            output_id = f"out-{batch_id}"
+            self.files[output_id] = [
+                {"custom_id": request["custom_id"],
+                 "response": {"status_code": 200, "body": {"choices": [
+                     {"message": {"content": self.reply_for(request["custom_id"])}}]}}}
+                for request in self.files[self.batches[batch_id]]
+            ]
+            return 200, {"id": batch_id, "status": "completed", "output_file_id": output_id}
+        match = re.fullmatch(r"/files/([\w-]+)/content", path)
+        if method == "GET" and match:
+            return 200, "\n".join(json.dumps(line) for line in self.files[match.group(1)])
+        return 404, {"error": path}
+
+
+@pytest.fixture
+def stub(tmp_path, monkeypatch):
+    state = StubOpenAI()
+
+    class Handler(BaseHTTPRequestHandler):
+        def _respond(self, method):
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            status, payload = state.handle(method, self.path, body)
+            data = payload if isinstance(payload, str) else json.dumps(payload)
+            self.send_response(status)
+            self.end_headers()
+            self.wfile.write(data.encode("utf-8"))
+
+        def do_GET(self):
+            self._respond("GET")
+
+        def do_POST(self):
+            self._respond("POST")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(batch_api, "OPENAI_API_BASE", f"http://127.0.0.1:{server.server_port}")
+    monkeypatch.setattr(llm_client, "_cache", LLMCache(str(tmp_path / "llm_cache.sqlite")))
+    yield state
+    server.shutdown()
+    llm_client._cache.close()
+
+
+def _jobs(count):
+    return [(f"row-{i}", f"prompt {i}") for i in range(count)]
+
+
+def test_results_are_merged_by_custom_id(stub):
+    results = batch_api.run_batch_job(_jobs(3), "gpt-test", "job", validate=json.loads, poll_seconds=0)
+    assert results == {f"row-{i}": stub.reply_for(f"row-{i}") for i in range(3)}
+    assert stub.polls == {"batch-0": 2}
+    assert batch_api.os.path.exists("batch_jobs/job.json.done")
+
+
+def test_cached_prompts_are_not_submitted(stub):
+    llm_client._cache.put("gpt-test", "prompt 1", "cached reply")
+    results = batch_api.run_batch_job(_jobs(3), "gpt-test", "job", poll_seconds=0)
+    assert results["row-1"] == "cached reply"
+    assert sorted(stub.submitted_ids) == ["row-0", "row-2"]
+    # Replies that came back are cached for the next run, which submits nothing
+    stub.submitted_ids.clear()
+    assert batch_api.run_batch_job(_jobs(3), "gpt-test", "job2", poll_seconds=0) == results
+    assert stub.submitted_ids == []
+
+
+def test_interrupted_submission_only_submits_missing_parts(stub, monkeypatch):
+    monkeypatch.setattr(batch_api, "MAX_REQUESTS_PER_BATCH", 2)
+    stub.fail_create = {2}
+    with pytest.raises(requests.HTTPError):
+        batch_api.run_batch_job(_jobs(5), "gpt-test", "job", poll_seconds=0)
+    assert stub.submitted_ids == ["row-0", "row-1"]
+
+    results = batch_api.run_batch_job(_jobs(5), "gpt-test", "job", poll_seconds=0)
+    assert stub.submitted_ids == ["row-0", "row-1", "row-2", "row-3", "row-4"]
+    assert results == {f"row-{i}": stub.reply_for(f"row-{i}") for i in range(5)}
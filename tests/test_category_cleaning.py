@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+import category_cleaning
+
+ROWS = [
+    ("1", "u1", "Hindustan Unilever net sales grew to ₹15,000 crore in FY23.", "2023"),
+    ("2", "u2", "Sales were strong this year at ₹200 crore.", "2023"),
+    ("3", "u3", "Dabur market share reached 12% in 2023.", "2023"),
+    ("4", "u4", "Something vague happened to the business.", "2022"),
+    ("5", "u5", "Nestle revenue rose to ₹4,000 crore in 2023.", "2023"),
+]
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """LLM stand-in that answers rows out of order and records what it was sent."""
+    sent = []
+
+    async def extract_structured_batch(rows):
+        sent.extend(row_id for row_id, *_ in rows)
+        # Later batches finish first, run_ordered still hands them over in order
+        await asyncio.sleep(0.01 * (10 - int(rows[0][0])))
+        return [{"Source URL": url, "Insight": insight, "Brand": "LLM", "Country": "India"}
+                for row_id, url, insight, year in rows]
+
+    monkeypatch.setattr(category_cleaning, "extract_structured_batch", extract_structured_batch)
+    monkeypatch.setattr(category_cleaning, "KPI_PARSER", True)
+    return sent
+
+
+def _structure(rows, **kwargs):
+    written = []
+    asyncio.run(category_cleaning.structure_rows_async(rows, "test", written.append, concurrency=4,
+                                                       token_budget=0, **kwargs))
+    return written
+
+
+def test_rows_without_brand_go_to_the_llm(fake_llm):
+    local = category_cleaning.parse_rows_locally(ROWS, "Total Sales Performance")
+    # Row 2 has value, metric and year (0.8) but no brand
+    assert local[1] is None and local[3] is None
+    assert local[0]["Brand"] and local[2]["Brand"] and local[4]["Brand"]
+    _structure(ROWS)
+    assert fake_llm == ["2", "4"]
+
+
+def test_parsed_and_llm_rows_keep_input_order(fake_llm):
+    written = _structure(ROWS)
+    assert [row["Source URL"] for row in written] == ["u1", "u2", "u3", "u4", "u5"]
+    assert [row["Brand"] == "LLM" for row in written] == [False, True, False, True, False]
+
+
+def test_partition_country_fills_rows_without_one(fake_llm):
+    local = category_cleaning.parse_rows_locally(ROWS, "Total Sales Performance", country="Germany")
+    assert local[0]["Country"] == "Germany"
+    local = category_cleaning.parse_rows_locally(
+        [("1", "u1", "Nestle India revenue rose to ₹4,000 crore in 2023.", "2023")], country="Germany"
+    )
+    assert local[0]["Country"] == "India"
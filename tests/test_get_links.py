@@ -0,0 +1,99 @@
+import asyncio
+import importlib.util
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import aiohttp
+import pytest
+
+from search_store import SearchStore
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+spec = importlib.util.spec_from_file_location("get_links", os.path.join(ROOT, "get_links-1.py"))
+get_links = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(get_links)
+
+PLAN = [(f"FMCG {template} {year} Germany", template, "Source", year)
+        for year in range(2015, 2020) for template in ("report", "insights")]
+
+
+class StubBing:
+    """Local stand-in for the Bing search endpoint; one URL per query."""
+    def __init__(self):
+        self.queries = []
+        self.rejected = set()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def search(self, query):
+        with self.lock:
+            self.queries.append(query)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.02)
+        with self.lock:
+            self.in_flight -= 1
+        if any(word in query for word in self.rejected):
+            return 400, {}
+        return 200, {"webPages": {"value": [{"url": "https://example.com/" + query.replace(" ", "-")}]}}
+
+
+@pytest.fixture
+def bing(tmp_path, monkeypatch):
+    stub = StubBing()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            query = parse_qs(urlparse(self.path).query)["q"][0]
+            status, payload = stub.search(query)
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(json.dumps(payload).encode("utf-8"))
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(get_links, "BING_SEARCH_URL", f"http://127.0.0.1:{server.server_port}/v7.0/search")
+    yield stub
+    server.shutdown()
+
+
+def _search(store, concurrency=3):
+    async def run():
+        async with aiohttp.ClientSession() as session:
+            return await get_links.search_all(session, store, PLAN, "Germany", concurrency=concurrency)
+    return asyncio.run(run())
+
+
+def test_queries_run_concurrently_and_are_stored(bing, tmp_path):
+    store = SearchStore(str(tmp_path / "search.sqlite"))
+    results = _search(store, concurrency=3)
+    queries = [query for query, _, _, _ in PLAN]
+    assert sorted(results) == sorted(queries)
+    assert sorted(bing.queries) == sorted(queries)
+    assert 1 < bing.max_in_flight <= 3
+    assert store.done(queries, 1) == results
+    store.close()
+
+
+def test_resume_only_searches_unfinished_queries(bing, tmp_path):
+    store = SearchStore(str(tmp_path / "search.sqlite"))
+    bing.rejected = {"2016"}
+    first = _search(store)
+    assert not any("2016" in query for query in first)
+    assert len(first) == len(PLAN) - 2
+
+    bing.queries.clear()
+    bing.rejected = set()
+    second = _search(store)
+    assert sorted(bing.queries) == ["FMCG insights 2016 Germany", "FMCG report 2016 Germany"]
+    assert len(second) == len(PLAN)
+    store.close()
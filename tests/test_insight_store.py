@@ -0,0 +1,47 @@
+import csv
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from insight_store import InsightStore
+
+HEADER = ["Source URL", "Category", "Insight", "Year"]
+
+
+def _append_rows(path, rows, header=False):
+    with open(path, "a", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        if header:
+            writer.writerow(HEADER)
+        writer.writerows(rows)
+
+
+def test_each_run_imports_only_new_rows(tmp_path):
+    insights = tmp_path / "insights_output.csv"
+    _append_rows(insights, [("https://a.de/1", "Dealer Stock", "Stock up 5%", "2023"),
+                            ("https://b.in/1", "Dealer Stock", "Stock down 2%", "2023")], header=True)
+    countries = {"https://a.de/1": "Germany", "https://b.in/1": "India", "https://a.de/2": "Germany"}
+    store = InsightStore(str(tmp_path / "store"))
+
+    assert store.import_csv(str(insights), countries, run="r1") == 2
+    assert store.import_csv(str(insights), countries, run="r2") == 0
+
+    _append_rows(insights, [("https://a.de/2", "Promotions Impact", "Discounts cut 3%", "2024")])
+    assert store.import_csv(str(insights), countries, run="r3") == 1
+    r3 = store.read("insights", run="r3")
+    assert r3["Source URL"].tolist() == ["https://a.de/2"]
+    assert r3["country"].tolist() == ["Germany"]
+    assert len(store.read("insights")) == 3
+
+
+def test_rewritten_csv_is_imported_again(tmp_path):
+    insights = tmp_path / "insights_output.csv"
+    _append_rows(insights, [("https://a.de/1", "Dealer Stock", "Stock up 5%", "2023")], header=True)
+    store = InsightStore(str(tmp_path / "store"))
+    store.import_csv(str(insights), {}, run="r1")
+
+    insights.unlink()
+    _append_rows(insights, [("https://c.de/1", "Dealer Stock", "Stock up 9%", "2024")], header=True)
+    assert store.import_csv(str(insights), {}, run="r2") == 1
+    assert store.read("insights", run="r2")["Source URL"].tolist() == ["https://c.de/1"]
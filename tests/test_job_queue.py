@@ -0,0 +1,23 @@
+from job_queue import JobQueue
+
+
+def test_failed_jobs_are_retried_and_successful_ones_acked_after_flush(tmp_path):
+    queue = JobQueue("links", str(tmp_path / "jobs.sqlite"), max_attempts=2)
+    queue.enqueue(["a", "b"])
+    flushed = []
+
+    job_a, _ = queue.lease("w1")
+    job_b, _ = queue.lease("w1")
+    queue.settle(job_a, "w1", RuntimeError("model unavailable"), flushed.append)
+    queue.settle(job_b, "w1", None, flushed.append)
+    # The failed job is handed out again; the successful one waits for its rows to be flushed
+    assert queue.counts() == {"pending": 1, "leased": 1}
+    for callback in flushed:
+        callback()
+    assert queue.counts() == {"pending": 1, "done": 1}
+
+    assert queue.lease("w2") == (job_a, "a")
+    queue.settle(job_a, "w2", RuntimeError("model unavailable"), flushed.append)
+    assert queue.counts() == {"failed": 1, "done": 1}
+    assert queue.lease("w2") is None
+    queue.close()
@@ -0,0 +1,72 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import openai
+import pytest
+
+import llm_client
+from llm_cache import LLMCache
+from rate_limiter import AdaptiveRateLimiter
+
+RATE_LIMIT_HEADERS = {
+    "x-ratelimit-limit-requests": "100",
+    "x-ratelimit-remaining-requests": "7",
+    "x-ratelimit-limit-tokens": "5000",
+    "x-ratelimit-remaining-tokens": "1234",
+    "x-ratelimit-reset-requests": "1s",
+}
+
+
+class ChatHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        body = json.dumps({
+            "id": "chatcmpl-stub", "object": "chat.completion",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": " {\"ok\": true} "}}],
+            "usage": {"total_tokens": 50},
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        for name, value in RATE_LIMIT_HEADERS.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def limiter(tmp_path, monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ChatHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    limiter = AdaptiveRateLimiter("openai", rpm=500, tpm=200000)
+    monkeypatch.setattr(openai, "api_base", f"http://127.0.0.1:{server.server_port}/v1")
+    monkeypatch.setattr(openai, "api_key", "test")
+    monkeypatch.setattr(openai, "requestssession", None)
+    monkeypatch.setattr(llm_client, "_hook_installed", False)
+    monkeypatch.setattr(llm_client, "get_limiter", lambda name: limiter)
+    monkeypatch.setattr(llm_client, "_cache", LLMCache(str(tmp_path / "llm_cache.sqlite")))
+    yield limiter
+    server.shutdown()
+    llm_client._cache.close()
+
+
+def _assert_synced(limiter):
+    assert limiter.rpm == 100
+    assert limiter.tpm == 5000
+    assert limiter._request_level <= 7
+    assert limiter._token_level < 200000
+
+
+def test_async_calls_sync_the_limiter_with_response_headers(limiter):
+    reply = asyncio.run(llm_client.achat_completion("prompt", "gpt-test", validate=json.loads))
+    assert reply == '{"ok": true}'
+    _assert_synced(limiter)
+
+
+def test_blocking_calls_sync_the_limiter_with_response_headers(limiter):
+    assert llm_client.chat_completion("prompt", "gpt-test") == '{"ok": true}'
+    _assert_synced(limiter)
@@ -0,0 +1,56 @@
+import os
+import json
+
+from output_writer import InsightWriter
+
+HEADER = ["Source URL", "Category", "Insight", "Year"]
+
+
+def _read(path):
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        return f.read()
+
+
+def test_crash_during_the_first_flush_is_cut_back(tmp_path):
+    csv_path, txt_path = str(tmp_path / "out.csv"), str(tmp_path / "out.txt")
+    with open(csv_path, "w", encoding="utf-8") as f:
+        f.write("Source URL,Category,Insight,Year\nhttps://a.com,Sales,old row,2023\n")
+    InsightWriter(csv_path, txt_path, HEADER).close()
+    size = os.path.getsize(csv_path)
+
+    # A new run opens the files and dies halfway through its first flush
+    writer = InsightWriter(csv_path, txt_path, HEADER)
+    with open(writer.commit_path, "r") as f:
+        assert json.load(f) == {csv_path: size, txt_path: 0}
+    with open(csv_path, "a", encoding="utf-8") as f:
+        f.write("https://b.com,Sales,half a ro")
+    with open(txt_path, "a", encoding="utf-8") as f:
+        f.write("[Source] https://b.com")
+
+    InsightWriter(csv_path, txt_path, HEADER).close()
+    assert _read(csv_path) == "Source URL,Category,Insight,Year\nhttps://a.com,Sales,old row,2023\n"
+    assert _read(txt_path) == ""
+
+
+def test_failed_flush_is_not_committed(tmp_path, monkeypatch):
+    csv_path, txt_path = str(tmp_path / "out.csv"), str(tmp_path / "out.txt")
+    writer = InsightWriter(csv_path, txt_path, HEADER, flush_rows=1)
+    flushed = []
+    append = writer._append
+    failures = []
+
+    def failing_append(path, data):
+        # The CSV part of the first batch lands, then the disk fills up
+        if path == txt_path and not failures:
+            failures.append(path)
+            raise OSError("No space left on device")
+        append(path, data)
+
+    monkeypatch.setattr(writer, "_append", failing_append)
+    writer.write([["https://a.com", "Sales", "lost row", "2023"]], "[Source] https://a.com\n", lambda: flushed.append("a"))
+    writer.write([["https://b.com", "Sales", "kept row", "2024"]], "[Source] https://b.com\n", lambda: flushed.append("b"))
+    writer.close()
+
+    assert flushed == ["b"]
+    assert _read(csv_path) == "Source URL,Category,Insight,Year\r\nhttps://b.com,Sales,kept row,2024\r\n"
+    assert _read(txt_path) == "[Source] https://b.com\n"
@@ -0,0 +1,67 @@
+import os
+
+import pytest
+
+import page_cache
+from page_cache import PageCache
+
+
+def _blob_bytes(cache):
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(cache.blob_dir) for name in names)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    # 0.01 MB cap: about ten 1000-byte pages
+    cache = PageCache(str(tmp_path / "cache"), max_mb=0.01)
+    yield cache
+    cache.close()
+
+
+def test_total_follows_puts_replacements_and_shared_blobs(cache):
+    cache.put("https://a.com/1", "a" * 1000)
+    cache.put("https://www.a.com/1/", "a" * 1000)      # same URL after normalization
+    cache.put("https://b.com/1", "a" * 1000)           # same content, one shared blob
+    assert cache._total() == 1000 == _blob_bytes(cache)
+    cache.put("https://a.com/1", "b" * 500)             # page changed
+    assert cache._total() == 1500 == _blob_bytes(cache)
+    cache.put("https://b.com/1", "c" * 200)             # old blob no longer used by anyone
+    assert cache._total() == 700 == _blob_bytes(cache)
+
+
+def test_least_recently_used_pages_are_evicted_below_the_cap(cache, monkeypatch):
+    def at(seconds):
+        monkeypatch.setattr(page_cache.time, "time", lambda: seconds)
+
+    for i in range(10):
+        at(1000.0 + i)
+        cache.put(f"https://a.com/{i}", str(i) * 1000)
+    at(2000.0)
+    cache.get("https://a.com/0")                        # recently used again
+    at(2001.0)
+    cache.put("https://a.com/new", "n" * 1000)
+    assert cache._total() <= cache.max_bytes * page_cache.EVICT_TARGET
+    assert cache._total() == _blob_bytes(cache)
+    assert cache.get("https://a.com/0") is not None
+    assert cache.get("https://a.com/1") is None
+    assert cache.get("https://a.com/new") is not None
+
+
+def test_put_does_not_scan_the_whole_table(cache):
+    for i in range(20):
+        cache.put(f"https://a.com/{i}", f"page {i}")
+    statements = []
+    cache._db.set_trace_callback(statements.append)
+    cache.put("https://a.com/next", "next page")
+    assert not any("SUM(" in statement for statement in statements)
+    cache._db.set_trace_callback(None)
+
+
+def test_total_survives_reopening(tmp_path):
+    cache = PageCache(str(tmp_path / "cache"))
+    cache.put("https://a.com/1", "x" * 300)
+    cache.close()
+    reopened = PageCache(str(tmp_path / "cache"))
+    assert reopened._total() == 300
+    reopened.close()
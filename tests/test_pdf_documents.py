@@ -0,0 +1,121 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("pypdf")
+
+import pdf_documents
+
+COVER = ["Annual Report 2023", "Building a better tomorrow together", "Copyright 2023. All rights reserved."]
+HIGHLIGHTS = [
+    "Financial Highlights",
+    "Net sales grew 11% to USD 15,000 million in 2023, led by rural demand.",
+    "EBITDA margin improved 120 bps to 19.8% on lower input cost.",
+    "Segment    2021    2022    2023",
+    "Home Care    4,100    4,600    5,200",
+    "Beauty    3,900    4,200    4,700",
+]
+MARKET_SHARE = [
+    "Market share of the noodles brand rose to 60% in 2023 as volume growth recovered.",
+    "E-commerce channel revenue reached USD 1,200 million, 14% of sales.",
+]
+STORY = ["Our people and communities", "The company works with partners across many communities."]
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(pages):
+    """Minimal PDF with one Helvetica text page per list of lines."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for lines in pages:
+        stream = "BT /F1 10 Tf 14 TL 50 780 Td " + " ".join(f"({_escape(line)}) Tj T*" for line in lines) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    return out
+
+
+@pytest.fixture
+def report_pdf(tmp_path):
+    path = tmp_path / "report.pdf"
+    path.write_bytes(make_pdf([COVER, STORY, HIGHLIGHTS, STORY, MARKET_SHARE, STORY]))
+    return path
+
+
+def test_pages_are_read_one_at_a_time(report_pdf):
+    pages = pdf_documents.iter_pdf_pages(str(report_pdf))
+    number, text = next(pages)
+    assert number == 1 and "Annual Report" in text
+    assert len(list(pages)) == 5
+
+
+def test_only_kpi_pages_are_selected_in_page_order(report_pdf):
+    selected, total = pdf_documents.select_kpi_pages(pdf_documents.iter_pdf_pages(str(report_pdf)))
+    assert total == 6
+    assert [number for number, _, _ in selected] == [3, 5]
+    # The highlights page with its table outranks the plain KPI page
+    assert selected[0][2] > selected[1][2]
+
+    best_only, _ = pdf_documents.select_kpi_pages(pdf_documents.iter_pdf_pages(str(report_pdf)), max_pages=1)
+    assert [number for number, _, _ in best_only] == [3]
+
+
+def test_local_pdf_becomes_page_sections(report_pdf):
+    markdown, headers = asyncio.run(pdf_documents.fetch_pdf(str(report_pdf)))
+    assert headers is None
+    assert markdown.startswith("## Page 3\n")
+    assert "## Page 5\n" in markdown and "Annual Report" not in markdown
+
+
+@pytest.fixture
+def pdf_server(report_pdf):
+    data = report_pdf.read_bytes()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/pdf")
+            self.send_header("Content-Length", str(len(data)))
+            self.send_header("ETag", '"v1"')
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}/files/report.pdf"
+    server.shutdown()
+
+
+def test_remote_pdf_is_streamed_and_removed(pdf_server, monkeypatch, tmp_path):
+    monkeypatch.setattr(pdf_documents.tempfile, "tempdir", str(tmp_path / "downloads"))
+    (tmp_path / "downloads").mkdir()
+    markdown, headers = asyncio.run(pdf_documents.fetch_pdf(pdf_server))
+    # Passed on to the page cache, which revalidates stale pages with the ETag
+    assert {key.lower(): value for key, value in headers.items()}["etag"] == '"v1"'
+    assert "## Page 3" in markdown
+    assert list((tmp_path / "downloads").iterdir()) == []
+
+
+def test_oversized_download_is_abandoned(pdf_server, tmp_path):
+    with pytest.raises(ValueError):
+        asyncio.run(pdf_documents.download_pdf(pdf_server, str(tmp_path / "big.pdf"), max_mb=0.0005))
@@ -0,0 +1,49 @@
+import asyncio
+
+from pipeline import FetchFailed, run_pipeline
+from url_index import URLIndex
+
+
+def test_failed_fetches_and_extracts_are_not_marked_processed(tmp_path):
+    index = URLIndex(str(tmp_path / "urls.sqlite"))
+    links = [("India", "https://a.com/empty"), ("India", "https://a.com/llm-down"),
+             ("India", "https://a.com/duplicate"), ("India", "https://a.com/ok")]
+    index.pending(links, "links.json")
+    pages = {
+        "https://a.com/empty": FetchFailed("crawler returned no content"),
+        "https://a.com/llm-down": "fail one\n\nfail two",
+        "https://a.com/duplicate": None,
+        "https://a.com/ok": "good one\n\nfail three",
+    }
+    written = {}
+    errors = {}
+
+    def extract(text):
+        if text.startswith("fail"):
+            raise RuntimeError("model unavailable")
+        return '{"Sales": []}'
+
+    def done(url, error):
+        # Same rule as main.url_done
+        errors[url] = error
+        if error is None:
+            index.mark_processed(url)
+
+    asyncio.run(run_pipeline(
+        links,
+        crawl_fn=lambda url: pages[url],
+        clean_fn=lambda text: text,
+        chunk_fn=lambda text: text.split("\n\n"),
+        extract_fn=extract,
+        write_fn=lambda url, results: written.setdefault(url, results),
+        done_fn=done,
+    ))
+
+    assert isinstance(errors["https://a.com/empty"], FetchFailed)
+    assert isinstance(errors["https://a.com/llm-down"], RuntimeError)
+    assert errors["https://a.com/duplicate"] is None
+    # One chunk still answered, so the page is written with the failed chunk left empty
+    assert errors["https://a.com/ok"] is None
+    assert written == {"https://a.com/ok": [(0, '{"Sales": []}'), (1, None)]}
+    assert index.pending(links, "links.json") == [("India", "https://a.com/empty"), ("India", "https://a.com/llm-down")]
+    index.close()
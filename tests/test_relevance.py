@@ -0,0 +1,44 @@
+import random
+
+from relevance import KPI_RELEVANCE_THRESHOLD, RelevanceFilter, score_chunk
+
+KPI_SENTENCES = [
+    "Hindustan Unilever net sales grew 11% to ₹15,000 crore in FY23, led by rural demand.",
+    "Nestle India's market share in noodles rose to 60% in 2023 as volume growth recovered.",
+    "Dabur's EBITDA margin improved 120 bps to 19.8% in Q4 on lower input cost.",
+    "E-commerce channel revenue for Marico reached ₹1,200 crore in 2023, 14% of sales.",
+    "Britannia cut promotional discount spend by 8% while ad spend rose to ₹500 crore.",
+]
+FILLER_WORDS = ("the company said that its people and teams continue to work with partners across "
+                "many communities where it operates and believes in long term values").split()
+
+
+def _long_chunk(words, kpi_sentences, seed=0):
+    rng = random.Random(seed)
+    filler = [" ".join(rng.choice(FILLER_WORDS) for _ in range(20)) + "." for _ in range(words // 20)]
+    for position, sentence in enumerate(kpi_sentences):
+        filler.insert((position + 1) * len(filler) // (len(kpi_sentences) + 1), sentence)
+    return " ".join(filler)
+
+
+def test_short_kpi_text_passes():
+    assert score_chunk(" ".join(KPI_SENTENCES)) >= KPI_RELEVANCE_THRESHOLD
+
+
+def test_text_without_numbers_or_measures_scores_zero():
+    assert score_chunk(" ".join(FILLER_WORDS)) == 0.0
+    assert score_chunk("Copyright 2023. All rights reserved. Founded in 1998.") == 0.0
+
+
+def test_long_chunk_with_kpis_is_kept():
+    for words, sentences in ((2000, KPI_SENTENCES[:3]), (7500, KPI_SENTENCES), (11000, KPI_SENTENCES * 2)):
+        text = _long_chunk(words, sentences)
+        assert score_chunk(text) >= KPI_RELEVANCE_THRESHOLD, words
+        assert RelevanceFilter().keep(text)
+
+
+def test_long_chunk_without_kpis_is_skipped():
+    relevance = RelevanceFilter()
+    text = _long_chunk(8000, []) + " Copyright 2023."
+    assert not relevance.keep(text)
+    assert relevance.skipped == 1 and relevance.prompt_tokens_saved > 0
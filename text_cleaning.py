@@ -0,0 +1,103 @@
+import os
+import re
+import html
+import atexit
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from bs4 import BeautifulSoup
+from dotenv import load_dotenv
+
+try:
+    import lxml.html
+except ImportError:  # HTML falls back to BeautifulSoup's html.parser
+    lxml = None
+
+# Load environment variables
+load_dotenv()
+
+CLEAN_POOL_MIN_CHARS = int(os.getenv("CLEAN_POOL_MIN_CHARS", "500000"))   # bigger HTML pages go to the process pool
+CLEAN_PROCESSES = int(os.getenv("CLEAN_PROCESSES", "0"))                  # 0 = one per core
+
+# Tags removed with everything inside them
+DROP_TAGS = ["nav", "footer", "aside", "script", "style"]
+
+# Real markup, not a stray '<' in markdown text (e.g. "growth <5%")
+HTML_TAG_RE = re.compile(r"</?[a-zA-Z][a-zA-Z0-9]*(\s[^<>]*)?/?>")
+# Named and numeric character references, as BeautifulSoup would decode them
+ENTITY_RE = re.compile(r"&(#\d+|#[xX][0-9a-fA-F]+|[a-zA-Z][a-zA-Z0-9]*);?")
+
+_pool = None
+
+
+def looks_like_html(text):
+    """True when the text contains HTML markup, False for plain text / markdown."""
+    return HTML_TAG_RE.search(text) is not None
+
+
+def _strip_lines(text):
+    return "\n".join(line.strip() for line in text.splitlines() if line.strip())
+
+
+def clean_markdown(text):
+    """Fast path for Crawl4AI markdown: decode entities and drop blank lines, no parsing."""
+    if "&" in text and ENTITY_RE.search(text):
+        text = html.unescape(text)
+    return _strip_lines(text)
+
+
+def _clean_html_lxml(raw_html):
+    root = lxml.html.document_fromstring(raw_html)
+    for element in root.iter(*DROP_TAGS):
+        element.drop_tree()
+    return _strip_lines("\n".join(root.itertext()))
+
+
+def _clean_html_bs4(raw_html):
+    soup = BeautifulSoup(raw_html, "html.parser")
+    for tag in soup(DROP_TAGS):
+        tag.decompose()
+    return _strip_lines(soup.get_text(separator="\n"))
+
+
+def clean_html(raw_html):
+    """Removes nav/footer/aside/script/style and returns the remaining text lines."""
+    if lxml is not None:
+        try:
+            return _clean_html_lxml(raw_html)
+        except Exception:
+            # lxml rejects some inputs (e.g. encoding declarations in str), html.parser copes
+            pass
+    return _clean_html_bs4(raw_html)
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        # Spawned, not forked: the caller is a pipeline thread in a process holding SQLite connections
+        _pool = ProcessPoolExecutor(
+            max_workers=CLEAN_PROCESSES or os.cpu_count(),
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        atexit.register(_pool.shutdown)
+    return _pool
+
+
+def clean_text(raw_text):
+    """
+    Turns a crawled page into clean text lines.
+
+    Markdown (what Crawl4AI returns) takes a cheap line-based path. Pages
+    that contain HTML are parsed with lxml, and those over
+    CLEAN_POOL_MIN_CHARS in a process pool so several big reports use
+    several cores. Without lxml, HTML goes through BeautifulSoup's
+    html.parser in place as before; the pool does not pay for itself there.
+    """
+    if not raw_text:
+        return ""
+    if not looks_like_html(raw_text):
+        return clean_markdown(raw_text)
+    if lxml is None:
+        return _clean_html_bs4(raw_text)
+    if len(raw_text) >= CLEAN_POOL_MIN_CHARS:
+        return _get_pool().submit(clean_html, raw_text).result()
+    return clean_html(raw_text)
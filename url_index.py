@@ -0,0 +1,205 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+URL_INDEX_PATH = os.getenv("URL_INDEX_PATH", ".url_index.sqlite")
+
+# Query parameters that only track the visitor and never change the page
+TRACKING_PARAMS = {"gclid", "fbclid", "msclkid", "mc_cid", "mc_eid", "ref", "_ga"}
+
+
+def normalize_url(url):
+    """
+    Canonical form of a URL: lower-case host without 'www.' or default port,
+    no fragment, no tracking parameters, sorted query and no trailing slash.
+    http and https map to the same key.
+    """
+    parts = urlparse(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if host.endswith(":80") or host.endswith(":443"):
+        host = host.rsplit(":", 1)[0]
+    query = [
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not (key.lower().startswith("utm_") or key.lower() in TRACKING_PARAMS)
+    ]
+    path = parts.path.rstrip("/") or "/"
+    return urlunparse(("https", host, path, "", urlencode(sorted(query)), ""))
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class URLIndex:
+    """
+    Persistent index of every link seen by link collection and main.py,
+    across countries and runs.
+
+    Links are stored under their normalize_url key together with the
+    country and links file they first came from. main.py marks a link as
+    processed once its insights are written, and records the hash of the
+    crawled page so the same document reached through another URL or host
+    is not sent to the LLM twice.
+
+    Args:
+        path (str): SQLite file holding the index.
+    """
+    def __init__(self, path=URL_INDEX_PATH):
+        self.path = path
+        self.skipped = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS urls (
+                url_key TEXT PRIMARY KEY,
+                url TEXT,
+                country TEXT,
+                source TEXT,
+                first_seen REAL,
+                content_hash TEXT,
+                processed_at REAL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS urls_content ON urls (content_hash)")
+        self._db.commit()
+
+    def register(self, urls, country, source):
+        """
+        Adds links collected for `country` from `source` (a links file name)
+        and returns the ones still worth crawling, in their original order:
+        one URL per canonical key, leaving out links that were already
+        processed or that an earlier run collected for another country or file.
+        """
+        keep = []
+        seen = set()
+        now = time.time()
+        with self._lock:
+            for url in urls:
+                key = normalize_url(url)
+                if key in seen:
+                    continue
+                seen.add(key)
+                row = self._db.execute(
+                    "SELECT country, source, processed_at FROM urls WHERE url_key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    self._db.execute(
+                        "INSERT INTO urls VALUES (?, ?, ?, ?, ?, NULL, NULL)", (key, url, country, source, now)
+                    )
+                    keep.append(url)
+                elif row[2] is None and (row[0], row[1]) == (country, source):
+                    keep.append(url)
+            self._db.commit()
+        return keep
+
+    def pending(self, links, source):
+        """
+        Filters main.py's (country, url) pairs down to links that were not
+        processed yet, one per canonical URL. New links are registered under
+        `source`; links already registered elsewhere are still crawled here
+        as long as nobody processed them.
+        """
+        keep = []
+        seen = set()
+        now = time.time()
+        with self._lock:
+            for country, url in links:
+                key = normalize_url(url)
+                if key in seen:
+                    self.skipped += 1
+                    continue
+                seen.add(key)
+                row = self._db.execute("SELECT processed_at FROM urls WHERE url_key = ?", (key,)).fetchone()
+                if row is None:
+                    self._db.execute(
+                        "INSERT INTO urls VALUES (?, ?, ?, ?, ?, NULL, NULL)", (key, url, country, source, now)
+                    )
+                elif row[0] is not None:
+                    self.skipped += 1
+                    continue
+                keep.append((country, url))
+            self._db.commit()
+        return keep
+
+    def claim_content(self, url, text):
+        """
+        Records the hash of the crawled page for `url`. Returns False when
+        another URL with identical content was already processed, so this one
+        can be skipped.
+        """
+        digest = content_hash(text)
+        key = normalize_url(url)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT url FROM urls WHERE content_hash = ? AND processed_at IS NOT NULL AND url_key != ? LIMIT 1",
+                (digest, key)
+            ).fetchone()
+            # A duplicate counts as processed too, so later runs do not crawl it again
+            self._db.execute(
+                "UPDATE urls SET content_hash = ?, processed_at = COALESCE(?, processed_at) WHERE url_key = ?",
+                (digest, time.time() if row is not None else None, key)
+            )
+            self._db.commit()
+        if row is not None:
+            self.skipped += 1
+            print(f"[INDEX] {url} has the same content as {row[0]}, skipping")
+            return False
+        return True
+
+    def mark_processed(self, url):
+        with self._lock:
+            self._db.execute(
+                "UPDATE urls SET processed_at = ? WHERE url_key = ?", (time.time(), normalize_url(url))
+            )
+            self._db.commit()
+
+    def report(self):
+        with self._lock:
+            total, processed = self._db.execute(
+                "SELECT COUNT(*), COUNT(processed_at) FROM urls"
+            ).fetchone()
+        print(f"[INDEX] {self.skipped} duplicate or already processed links skipped; "
+              f"index holds {total} links, {processed} processed")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def import_links_files(paths, processed=False):
+    """
+    Seeds the index with links files from earlier runs ({country: [urls]}),
+    optionally marking every link as already processed.
+    """
+    index = URLIndex()
+    for path in paths:
+        with open(path, "r") as f:
+            data = json.load(f)
+        count = 0
+        for country, urls in data.items():
+            count += len(index.register(urls, country, os.path.basename(path)))
+            if processed:
+                for url in urls:
+                    index.mark_processed(url)
+        print(f"[INDEX] {path}: {count} new links")
+    index.report()
+    index.close()
+
+
+if __name__ == "__main__":
+    # python url_index.py [--processed] links/india.json i4.json Germany_links_0_100.json
+    args = sys.argv[1:]
+    mark = "--processed" in args
+    import_links_files([arg for arg in args if arg != "--processed"], processed=mark)
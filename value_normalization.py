@@ -0,0 +1,116 @@
+import os
+import re
+import sys
+import json
+import time
+import pandas as pd
+import requests
+from dotenv import load_dotenv
+from kpi_parser import MULTIPLIERS, UNITS, extract_values
+
+# Load environment variables
+load_dotenv()
+
+FX_RATES_PATH = os.getenv("FX_RATES_PATH", ".fx_rates.json")
+FX_RATES_URL = os.getenv("FX_RATES_URL", "https://open.er-api.com/v6/latest/USD")   # empty = never download
+FX_MAX_AGE_HOURS = float(os.getenv("FX_MAX_AGE_HOURS", "24"))
+
+# USD per unit of each currency, used when the rates cannot be downloaded
+DEFAULT_USD_RATES = {
+    "USD": 1.0, "INR": 0.012, "EUR": 1.08, "GBP": 1.27, "JPY": 0.0067, "CNY": 0.14,
+    "IDR": 0.000062, "BRL": 0.18, "BDT": 0.0083, "LKR": 0.0033,
+}
+
+# Multiplier and currency words inside the Unit column ('INR Crore', 'USD billion', '%')
+UNIT_MULTIPLIER_RE = re.compile(
+    r"(?<![a-z])(crores?|cr|lakhs?|lacs?|billion|bn|million|mn|thousand|trillion|tn)(?![a-z])", re.IGNORECASE
+)
+UNIT_CURRENCY_RE = re.compile(r"(₹|us\$|\$|€|£|(?<![a-z])(?:rs\.?|inr|rupees?|usd|dollars|euros?|eur|gbp|pounds)(?![a-z]))",
+                              re.IGNORECASE)
+PERCENT_RE = re.compile(r"%|percent|per cent", re.IGNORECASE)
+ISO_CURRENCIES = set(DEFAULT_USD_RATES)
+
+_usd_rates = None
+
+
+def _download_rates():
+    response = requests.get(FX_RATES_URL, timeout=10)
+    response.raise_for_status()
+    per_usd = response.json()["rates"]
+    return {code: 1.0 / rate for code, rate in per_usd.items() if rate}
+
+
+def load_usd_rates(path=FX_RATES_PATH, max_age_hours=FX_MAX_AGE_HOURS):
+    """
+    USD per unit of each currency. Rates are downloaded at most once every
+    `max_age_hours` and cached in `path`; a stale cache, or DEFAULT_USD_RATES,
+    is used when the download fails.
+    """
+    global _usd_rates
+    if _usd_rates is not None:
+        return _usd_rates
+    cached = None
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            cached = json.load(f)
+    if cached and time.time() - cached["fetched_at"] < max_age_hours * 3600:
+        _usd_rates = cached["usd_rates"]
+        return _usd_rates
+    if FX_RATES_URL:
+        try:
+            rates = _download_rates()
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"fetched_at": time.time(), "usd_rates": rates}, f)
+            os.replace(tmp_path, path)
+            _usd_rates = rates
+            return _usd_rates
+        except Exception as e:
+            print(f"[FX] Could not download exchange rates, using {'cached' if cached else 'built-in'} rates: {e}")
+    _usd_rates = cached["usd_rates"] if cached else dict(DEFAULT_USD_RATES)
+    return _usd_rates
+
+
+def normalize_values(df):
+    """
+    Canonical numeric columns from the free-text Value / Unit columns,
+    vectorized over all rows:
+    - 'Value Num': the amount in base units ('₹5000 Cr' -> 5e10, '$6.83B' -> 6.83e9, '12%' -> 12)
+    - 'Currency': ISO code, from the value or the Unit column ('INR Crore')
+    - 'Is Percent': the value is a percentage
+    - 'Value USD': currency amounts converted with the cached FX table
+
+    A multiplier named only in the Unit column (Value '5000', Unit 'INR Crore')
+    is applied too. Values that have no number stay null.
+    """
+    values = df["Value"].fillna("").astype(str)
+    units = df["Unit"].fillna("").astype(str) if "Unit" in df.columns else pd.Series("", index=df.index)
+
+    parsed = extract_values(values)
+    # A bare year-like number ('2023 units') is still a number when it is the whole value
+    plain = pd.to_numeric(values.str.replace(",", "", regex=False).str.strip(), errors="coerce")
+    amount = parsed["value"].fillna(plain)
+
+    unit_multiplier = units.str.extract(UNIT_MULTIPLIER_RE, expand=False).str.lower().map(MULTIPLIERS)
+    scale = unit_multiplier.where(parsed["multiplier"] == 1).fillna(1)
+    unit_currency = units.str.extract(UNIT_CURRENCY_RE, expand=False).str.lower().str.strip().map(UNITS)
+    currency = parsed["unit"].where(parsed["unit"].isin(ISO_CURRENCIES)).fillna(unit_currency)
+    currency = currency.where(currency.isin(ISO_CURRENCIES))
+    is_percent = (parsed["unit"] == "%") | units.str.contains(PERCENT_RE)
+
+    usd_per_unit = currency.map(load_usd_rates())
+    df = df.copy()
+    df["Value Num"] = (amount * scale).astype("Float64")
+    df["Currency"] = currency.where(~is_percent).astype("string")
+    df["Is Percent"] = is_percent.astype("boolean")
+    df["Value USD"] = (df["Value Num"] * usd_per_unit.astype("Float64")).where(~is_percent).astype("Float64")
+    return df
+
+
+if __name__ == "__main__":
+    # python value_normalization.py cleaned_category/Total_Sales_Performance.csv -> normalized values
+    for path in sys.argv[1:]:
+        df = normalize_values(pd.read_csv(path, dtype=str, keep_default_na=False))
+        parsed = df["Value Num"].notna().sum()
+        print(f"{path}: {parsed}/{len(df)} values parsed")
+        print(df[["Value", "Unit", "Value Num", "Currency", "Is Percent", "Value USD"]].to_string())